@@ -0,0 +1,129 @@
+"""Acquisizione dei frame in un thread dedicato con buffer dell'ultimo frame.
+
+Il thread legge la sorgente il più velocemente possibile (svuotando il
+buffer interno del driver) e conserva solo il frame più recente; anteprima,
+scatto manuale e analisi automatica leggono da qui senza mai toccare
+direttamente la VideoCapture.
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+from memoria import BUFFER
+from strumentazione import PROFILATORE
+
+
+@dataclass
+class FrameAcquisito:
+    """Frame acquisito, con numero di sequenza e istante di acquisizione."""
+    sequenza: int
+    timestamp: float
+    frame: np.ndarray = field(repr=False)
+
+
+class AcquisitoreFrame:
+    """Legge in continuo da una sorgente e conserva l'ultimo frame disponibile.
+
+    La sorgente è qualunque oggetto con read([image]) -> (ret, frame), ad
+    esempio cv2.VideoCapture(0) per una webcam o cv2.VideoCapture("video.mp4")
+    per un file. Dal secondo frame la lettura avviene in buffer riutilizzati
+    del pool BUFFER (o del buffer indicato, ad esempio un
+    processi.AnelloCondiviso), così l'acquisizione non alloca un frame nuovo
+    ogni volta.
+    al_termine viene chiamata (dal thread di acquisizione) quando la sorgente
+    non restituisce più frame; al_frame, se indicata, dopo ogni nuovo frame
+    (dal thread di acquisizione, senza lock).
+    """
+
+    def __init__(self, sorgente, specchia=True, al_termine=None, al_frame=None, buffer=BUFFER):
+        self.sorgente = sorgente
+        self.buffer = buffer
+        self.specchia = specchia
+        self.al_termine = al_termine
+        self.al_frame = al_frame
+
+        self._condizione = threading.Condition()
+        self._ultimo = None
+        self._sequenza = 0
+        self._attivo = False
+        self._thread = None
+
+    def avvia(self):
+        """Avvia il thread di acquisizione."""
+        self._attivo = True
+        self._thread = threading.Thread(target=self._ciclo, name="acquisizione", daemon=True)
+        self._thread.start()
+
+    def ferma(self, timeout=1.0):
+        """Ferma il thread di acquisizione (la sorgente va rilasciata dal chiamante)."""
+        with self._condizione:
+            self._attivo = False
+            self._condizione.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def attivo(self):
+        return self._attivo
+
+    def ultimo(self):
+        """Restituisce l'ultimo FrameAcquisito (None se non ne è ancora arrivato nessuno)."""
+        with self._condizione:
+            return self._ultimo
+
+    def attendi_nuovo(self, dopo_sequenza=0, timeout=None):
+        """Attende un frame con sequenza maggiore di dopo_sequenza.
+
+        Restituisce None allo scadere del timeout o se l'acquisizione si ferma.
+        """
+        with self._condizione:
+            self._condizione.wait_for(
+                lambda: not self._attivo or
+                (self._ultimo is not None and self._ultimo.sequenza > dopo_sequenza),
+                timeout)
+            if self._ultimo is None or self._ultimo.sequenza <= dopo_sequenza:
+                return None
+            return self._ultimo
+
+    def _ciclo(self):
+        forma = None
+        # Con lo specchiamento si legge sempre nello stesso buffer privato e si specchia in uno del pool
+        grezzo = None
+        while self._attivo:
+            if forma is None:
+                dst = None
+            elif self.specchia:
+                dst = grezzo
+            else:
+                dst = self.buffer.ottieni("frame", forma)
+            with PROFILATORE.stadio("acquisizione"):
+                ret, frame = self.sorgente.read(dst)
+            if not ret:
+                with self._condizione:
+                    fermato = not self._attivo
+                    self._attivo = False
+                    self._condizione.notify_all()
+                if not fermato and self.al_termine is not None:
+                    self.al_termine()
+                return
+
+            timestamp = time.time()
+
+            # Specchia orizzontalmente il frame (più naturale per l'utente)
+            if self.specchia:
+                grezzo = frame
+                with PROFILATORE.stadio("specchia"):
+                    frame = cv2.flip(frame, 1, dst=self.buffer.ottieni("frame", frame.shape))
+            forma = frame.shape
+            PROFILATORE.evento("frame_acquisiti")
+
+            with self._condizione:
+                self._sequenza += 1
+                self._ultimo = FrameAcquisito(self._sequenza, timestamp, frame)
+                self._condizione.notify_all()
+            if self.al_frame is not None:
+                self.al_frame()
@@ -0,0 +1,709 @@
+"""Motore di analisi dei difetti, indipendente dall'interfaccia grafica.
+
+Usa solo NumPy e OpenCV: può girare su macchine senza display e viene
+richiamato sia dalla GUI sia dagli strumenti a riga di comando.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+from memoria import BUFFER
+from componenti import (TIPO_CHIARO, TIPO_SCURO, RegolaVerdetto, estrai_contorni,
+                        in_coordinate_frame, tabella_difetti)
+from strumentazione import PROFILATORE
+
+# Valori predefiniti delle soglie (gli stessi usati dalla GUI)
+SOGLIA_DIFETTI_DEFAULT = 5.0
+SOGLIA_SCURO_DEFAULT = 50
+SOGLIA_CHIARO_DEFAULT = 200
+
+# Dimensione del kernel per l'apertura morfologica
+DIMENSIONE_KERNEL_DEFAULT = 5
+
+STATO_OK = "OK"
+STATO_DIFETTATO = "DIFETTATO"
+
+# Valore di roi per rilevare automaticamente il rettangolo del vassoio
+ROI_AUTOMATICA = "auto"
+
+# Sotto questa dimensione dividere l'immagine in tasselli costa più di quanto fa risparmiare
+PIXEL_MINIMI_TASSELLI = 4_000_000
+
+
+def crea_kernel(dimensione=DIMENSIONE_KERNEL_DEFAULT):
+    """Crea il kernel quadrato per l'apertura morfologica."""
+    return np.ones((dimensione, dimensione), np.uint8)
+
+
+def converti_in_grigio(frame, dst=None):
+    """Converte un frame BGR in scala di grigi (lascia invariati i frame già in grigio).
+
+    dst è un eventuale buffer preallocato della stessa altezza e larghezza.
+    """
+    if frame.ndim == 2:
+        return frame
+    with PROFILATORE.stadio("grigio"):
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=dst)
+
+
+def crea_kernel_scalato(scala, dimensione=DIMENSIONE_KERNEL_DEFAULT):
+    """Kernel equivalente a quello a piena risoluzione per un'analisi in scala ridotta.
+
+    La dimensione viene scalata e arrotondata al dispari più vicino (minimo 1),
+    così l'apertura elimina difetti della stessa grandezza fisica.
+    """
+    dimensione_scalata = max(1, int(round(dimensione * scala)))
+    if dimensione_scalata % 2 == 0:
+        dimensione_scalata += 1
+    return crea_kernel(dimensione_scalata)
+
+
+def rileva_vassoio(frame, larghezza_lavoro=320):
+    """Stima il rettangolo (x, y, w, h) del vassoio, separandolo dallo sfondo con Otsu.
+
+    Lavora su una copia ridotta del frame; se non trova una regione
+    plausibile restituisce l'intero frame.
+    """
+    height, width = frame.shape[:2]
+    intero = (0, 0, width, height)
+
+    # Per stimare il rettangolo basta un ridimensionamento grossolano (e veloce)
+    fattore = min(1.0, larghezza_lavoro / width)
+    small = cv2.resize(frame, None, fx=fattore, fy=fattore, interpolation=cv2.INTER_NEAREST)
+    small = cv2.GaussianBlur(converti_in_grigio(small), (5, 5), 0)
+
+    _, mask = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, crea_kernel(9))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    # Le venature scure possono spezzare il vassoio in più parti: si uniscono
+    # tutte le regioni non trascurabili
+    area_small = small.shape[0] * small.shape[1]
+    regioni = [c for c in contours if cv2.contourArea(c) >= 0.02 * area_small]
+    if not regioni:
+        return intero
+
+    x, y, w, h = cv2.boundingRect(np.concatenate(regioni))
+    # Una regione troppo piccola è quasi certamente un riflesso, non il vassoio
+    if w * h < 0.2 * area_small:
+        return intero
+
+    x0, y0 = int(x / fattore), int(y / fattore)
+    x1, y1 = min(width, int(np.ceil((x + w) / fattore))), min(height, int(np.ceil((y + h) / fattore)))
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def ritaglia_regione(frame, roi):
+    """Restituisce la vista del frame limitata alla roi (x, y, w, h) e la roi effettiva."""
+    if roi == ROI_AUTOMATICA:
+        roi = rileva_vassoio(frame)
+
+    height, width = frame.shape[:2]
+    x, y, w, h = roi
+    x0, y0 = max(0, int(x)), max(0, int(y))
+    x1, y1 = min(width, int(x + w)), min(height, int(y + h))
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError(f"La regione di analisi {roi} è fuori dal frame {width}x{height}")
+    return frame[y0:y1, x0:x1], (x0, y0, x1 - x0, y1 - y0)
+
+
+def _soglia_e_apertura(gray_image, threshold, tipo, kernel, dst=None):
+    """Soglia e apertura morfologica senza misurarne i tempi (per le fasce dei tasselli)."""
+    _, threshold_image = cv2.threshold(gray_image, threshold, 255, tipo, dst=dst)
+    return cv2.morphologyEx(threshold_image, cv2.MORPH_OPEN, kernel, dst=threshold_image)
+
+
+def maschera_zone_scure(gray_image, threshold, kernel, dst=None):
+    """Restituisce la maschera (0/255) delle zone scure dopo l'apertura morfologica."""
+    with PROFILATORE.stadio("soglia"):
+        _, threshold_image = cv2.threshold(gray_image, threshold, 255, cv2.THRESH_BINARY_INV, dst=dst)
+    with PROFILATORE.stadio("morfologia"):
+        # L'apertura lavora sul posto: nessuna seconda maschera
+        return cv2.morphologyEx(threshold_image, cv2.MORPH_OPEN, kernel, dst=threshold_image)
+
+
+def maschera_zone_chiare(gray_image, threshold, kernel, dst=None):
+    """Restituisce la maschera (0/255) delle zone chiare dopo l'apertura morfologica."""
+    with PROFILATORE.stadio("soglia"):
+        _, threshold_image = cv2.threshold(gray_image, threshold, 255, cv2.THRESH_BINARY, dst=dst)
+    with PROFILATORE.stadio("morfologia"):
+        # L'apertura lavora sul posto: nessuna seconda maschera
+        return cv2.morphologyEx(threshold_image, cv2.MORPH_OPEN, kernel, dst=threshold_image)
+
+
+def percentuale_area(mask):
+    """Calcola la percentuale di pixel non nulli della maschera."""
+    total_pixels = mask.shape[0] * mask.shape[1]
+    return (cv2.countNonZero(mask) / total_pixels) * 100
+
+
+def maschere_disgiunte(soglia_scuro, soglia_chiaro):
+    """Indica se, con queste soglie, nessun pixel può essere sia scuro sia chiaro.
+
+    Scuro significa gray <= soglia_scuro e chiaro gray > soglia_chiaro; l'apertura
+    morfologica toglie solo pixel, quindi anche le maschere aperte restano disgiunte.
+    """
+    return soglia_scuro <= soglia_chiaro
+
+
+def calcola_metriche(gray_image, soglia_scuro, soglia_chiaro, kernel, buffer=None):
+    """Calcola solo le percentuali (scura, chiara, totale) senza visualizzazioni.
+
+    Restituisce anche le maschere aperte, già calcolate per il conteggio; la
+    maschera combinata è None quando non è stato necessario costruirla. Con
+    un PoolBuffer le maschere vengono scritte in buffer riutilizzati.
+    """
+    total_pixels = gray_image.shape[0] * gray_image.shape[1]
+
+    def destinazione(posto):
+        return buffer.ottieni(posto, gray_image.shape) if buffer is not None else None
+
+    dark_mask = maschera_zone_scure(gray_image, soglia_scuro, kernel, destinazione("maschera_scure"))
+    bright_mask = maschera_zone_chiare(gray_image, soglia_chiaro, kernel, destinazione("maschera_chiare"))
+    with PROFILATORE.stadio("conteggio"):
+        dark_pixels = cv2.countNonZero(dark_mask)
+        bright_pixels = cv2.countNonZero(bright_mask)
+
+        if maschere_disgiunte(soglia_scuro, soglia_chiaro):
+            # Nessuna sovrapposizione: il totale è la somma, senza OR né terzo conteggio
+            combined_mask = None
+            defect_pixels = dark_pixels + bright_pixels
+        else:
+            combined_mask = cv2.bitwise_or(dark_mask, bright_mask, dst=destinazione("maschera_combinata"))
+            defect_pixels = cv2.countNonZero(combined_mask)
+
+    return (
+        dark_pixels / total_pixels * 100,
+        bright_pixels / total_pixels * 100,
+        defect_pixels / total_pixels * 100,
+        dark_mask,
+        bright_mask,
+        combined_mask,
+    )
+
+
+# Pool di thread per i tasselli, condivisi dagli analizzatori con lo stesso numero di thread
+_ESECUTORI_TASSELLI = {}
+_LOCK_ESECUTORI = threading.Lock()
+
+
+def esecutore_tasselli(numero_thread):
+    """Pool di thread per l'analisi a tasselli, creato al primo uso (None con un solo thread)."""
+    if numero_thread <= 1:
+        return None
+    with _LOCK_ESECUTORI:
+        esecutore = _ESECUTORI_TASSELLI.get(numero_thread)
+        if esecutore is None:
+            esecutore = ThreadPoolExecutor(numero_thread, thread_name_prefix="tasselli")
+            _ESECUTORI_TASSELLI[numero_thread] = esecutore
+        return esecutore
+
+
+def fasce_tasselli(altezza, numero_tasselli, kernel):
+    """Divide le righe in fasce orizzontali per l'analisi a tasselli.
+
+    Restituisce per ogni fascia (y0, y1), le righe da produrre, e (a, b), le
+    righe da elaborare: l'alone aggiunto copre erosione e dilatazione
+    dell'apertura anche con un ancoraggio non centrato, così le righe
+    prodotte coincidono con quelle dell'immagine intera.
+    """
+    alone = 2 * (kernel.shape[0] - 1)
+    numero_tasselli = max(1, min(numero_tasselli, altezza))
+    limiti = [altezza * i // numero_tasselli for i in range(numero_tasselli + 1)]
+    return [((y0, y1), (max(0, y0 - alone), min(altezza, y1 + alone)))
+            for y0, y1 in zip(limiti, limiti[1:])]
+
+
+def calcola_metriche_a_tasselli(gray_image, soglia_scuro, soglia_chiaro, kernel, esecutore,
+                                numero_tasselli, buffer=None):
+    """Come calcola_metriche, ma con soglia, apertura e conteggio per fasce su un pool di thread.
+
+    OpenCV rilascia il GIL, quindi le fasce vengono elaborate in parallelo;
+    maschere e percentuali sono identiche a quelle dell'immagine intera.
+    Il profilatore registra l'intera chiamata come stadio "tasselli": i
+    tempi di fasce eseguite in contemporanea non si possono sommare.
+    """
+    height, width = gray_image.shape
+    total_pixels = height * width
+
+    def destinazione(posto, forma=gray_image.shape):
+        return buffer.ottieni(posto, forma) if buffer is not None else np.empty(forma, np.uint8)
+
+    dark_mask = destinazione("maschera_scure")
+    bright_mask = destinazione("maschera_chiare")
+    disgiunte = maschere_disgiunte(soglia_scuro, soglia_chiaro)
+    combined_mask = None if disgiunte else destinazione("maschera_combinata")
+
+    def elabora(indice, fascia, estesa):
+        (y0, y1), (a, b) = fascia, estesa
+        # Le maschere estese sono provvisorie: si copiano solo le righe della fascia
+        scura = _soglia_e_apertura(gray_image[a:b], soglia_scuro, cv2.THRESH_BINARY_INV, kernel,
+                                   destinazione(f"tassello_scuro_{indice}", (b - a, width)))
+        chiara = _soglia_e_apertura(gray_image[a:b], soglia_chiaro, cv2.THRESH_BINARY, kernel,
+                                    destinazione(f"tassello_chiaro_{indice}", (b - a, width)))
+        dark_mask[y0:y1] = scura[y0 - a:y1 - a]
+        bright_mask[y0:y1] = chiara[y0 - a:y1 - a]
+        dark_pixels = cv2.countNonZero(dark_mask[y0:y1])
+        bright_pixels = cv2.countNonZero(bright_mask[y0:y1])
+        if disgiunte:
+            defect_pixels = dark_pixels + bright_pixels
+        else:
+            cv2.bitwise_or(dark_mask[y0:y1], bright_mask[y0:y1], dst=combined_mask[y0:y1])
+            defect_pixels = cv2.countNonZero(combined_mask[y0:y1])
+        return dark_pixels, bright_pixels, defect_pixels
+
+    fasce = fasce_tasselli(height, numero_tasselli, kernel)
+    with PROFILATORE.stadio("tasselli"):
+        conteggi = list(esecutore.map(elabora, range(len(fasce)), *zip(*fasce)))
+    dark_pixels, bright_pixels, defect_pixels = (sum(c) for c in zip(*conteggi))
+
+    return (
+        dark_pixels / total_pixels * 100,
+        bright_pixels / total_pixels * 100,
+        defect_pixels / total_pixels * 100,
+        dark_mask,
+        bright_mask,
+        combined_mask,
+    )
+
+
+def _indice_soglia(threshold):
+    """Indice 0-255 equivalente a una soglia di cv2.threshold (-1 se nessun pixel è <= soglia)."""
+    # cv2.threshold confronta gray > threshold, quindi conta solo la parte intera
+    return int(min(255, max(-1, np.floor(threshold))))
+
+
+class CacheSoglie:
+    """Istogrammi di un'immagine in grigio che danno le percentuali per qualunque soglia.
+
+    L'apertura di una maschera binaria equivale alla soglia di un'immagine
+    filtrata in scala di grigi: open(gray <= t) coincide con close(gray) <= t
+    e open(gray > t) con open(gray) > t. Con l'istogramma congiunto di
+    close(gray) e open(gray) le percentuali scura, chiara e totale sono
+    quindi esatte per ogni coppia di soglie, senza ricalcolare maschere.
+    """
+
+    def __init__(self, gray_image, kernel):
+        self.total_pixels = gray_image.shape[0] * gray_image.shape[1]
+        with PROFILATORE.stadio("istogrammi"):
+            chiusura = cv2.morphologyEx(gray_image, cv2.MORPH_CLOSE, kernel)
+            apertura = cv2.morphologyEx(gray_image, cv2.MORPH_OPEN, kernel)
+
+            # Istogramma in grigio (prima dell'apertura), utile per la calibrazione
+            self.istogramma = cv2.calcHist([gray_image], [0], None, [256], [0, 256]).ravel().astype(np.int64)
+
+            # congiunto[c, o]: pixel con close(gray) == c e open(gray) == o.
+            # calcHist conta in float32, esatto solo fino a 2**24 pixel per cella
+            if self.total_pixels < 2 ** 24:
+                congiunto = cv2.calcHist([chiusura, apertura], [0, 1], None,
+                                         [256, 256], [0, 256, 0, 256])
+                self.congiunto = congiunto.astype(np.int64)
+            else:
+                indici = chiusura.ravel().astype(np.int32) * 256 + apertura.ravel()
+                self.congiunto = np.bincount(indici, minlength=256 * 256).reshape(256, 256)
+
+        # Conteggi cumulativi: pixel con close(gray) <= t e con open(gray) <= t
+        self._cumulata_chiusura = np.cumsum(self.congiunto.sum(axis=1))
+        self._cumulata_apertura = np.cumsum(self.congiunto.sum(axis=0))
+        self._cumulata_congiunta = None
+
+    def _congiunta(self):
+        # cumulata[c, o]: pixel con close(gray) <= c e open(gray) <= o
+        if self._cumulata_congiunta is None:
+            self._cumulata_congiunta = self.congiunto.cumsum(axis=0).cumsum(axis=1)
+        return self._cumulata_congiunta
+
+    def conteggi(self, soglia_scuro, soglia_chiaro):
+        """Pixel scuri, chiari e difettati (unione) dopo l'apertura, per le soglie indicate."""
+        td = _indice_soglia(soglia_scuro)
+        tb = _indice_soglia(soglia_chiaro)
+        dark_pixels = int(self._cumulata_chiusura[td]) if td >= 0 else 0
+        non_chiari = int(self._cumulata_apertura[tb]) if tb >= 0 else 0
+        bright_pixels = self.total_pixels - non_chiari
+
+        # Pixel né scuri né chiari: close(gray) > td e open(gray) <= tb
+        entrambi = int(self._congiunta()[td, tb]) if td >= 0 and tb >= 0 else 0
+        defect_pixels = self.total_pixels - (non_chiari - entrambi)
+        return dark_pixels, bright_pixels, defect_pixels
+
+    def percentuali(self, soglia_scuro, soglia_chiaro):
+        """Percentuali (scura, chiara, totale) per le soglie indicate."""
+        return tuple(n / self.total_pixels * 100
+                     for n in self.conteggi(soglia_scuro, soglia_chiaro))
+
+    def curve(self):
+        """Percentuali per tutte le soglie 0-255 in un colpo solo.
+
+        Restituisce un dizionario con "scura"[t] e "chiara"[t] (vettori di 256
+        valori) e "totale"[t_scuro, t_chiaro] (matrice 256x256).
+        """
+        non_chiari = self._cumulata_apertura
+        totale = self.total_pixels - (non_chiari[np.newaxis, :] - self._congiunta())
+        fattore = 100.0 / self.total_pixels
+        return {
+            "scura": self._cumulata_chiusura * fattore,
+            "chiara": (self.total_pixels - non_chiari) * fattore,
+            "totale": totale * fattore,
+        }
+
+
+@dataclass
+class RisultatoAnalisi:
+    """Risultato dell'analisi di un frame.
+
+    Le maschere vengono calcolate solo quando richieste e poi memorizzate.
+    """
+    dark_percent: float
+    bright_percent: float
+    total_percent: float
+    is_defective: bool
+    soglia_difetti: float
+    soglia_colore_scuro: int
+    soglia_colore_chiaro: int
+    gray_image: np.ndarray = field(repr=False)
+    kernel: np.ndarray = field(repr=False)
+    # Regione analizzata (x, y, w, h) in coordinate del frame e scala di analisi
+    roi: tuple = None
+    scala: float = 1.0
+    _maschere: dict = field(default_factory=dict, repr=False)
+    # Limiti sui singoli difetti usati per il verdetto (None: solo la percentuale)
+    regola: RegolaVerdetto = None
+    # Durata in ms delle fasi dell'analisi di questo frame (preparazione, metriche, ...)
+    tempi: dict = field(default_factory=dict)
+    # Istogrammi per ricalcolare le percentuali con altre soglie (creati alla prima richiesta)
+    _cache_soglie: CacheSoglie = field(default=None, repr=False)
+    _contorni: dict = field(default_factory=dict, repr=False)
+    _difetti: np.ndarray = field(default=None, repr=False)
+
+    @property
+    def status_text(self):
+        """Verdetto testuale ("OK" o "DIFETTATO")."""
+        return STATO_DIFETTATO if self.is_defective else STATO_OK
+
+    @property
+    def dark_mask(self):
+        """Maschera delle zone scure."""
+        if "scure" not in self._maschere:
+            self._maschere["scure"] = maschera_zone_scure(
+                self.gray_image, self.soglia_colore_scuro, self.kernel)
+        return self._maschere["scure"]
+
+    @property
+    def bright_mask(self):
+        """Maschera delle zone chiare."""
+        if "chiare" not in self._maschere:
+            self._maschere["chiare"] = maschera_zone_chiare(
+                self.gray_image, self.soglia_colore_chiaro, self.kernel)
+        return self._maschere["chiare"]
+
+    @property
+    def combined_mask(self):
+        """Maschera combinata (OR) di zone scure e chiare."""
+        if "combinata" not in self._maschere:
+            self._maschere["combinata"] = cv2.bitwise_or(self.dark_mask, self.bright_mask)
+        return self._maschere["combinata"]
+
+    @property
+    def contorni_scure(self):
+        """Contorni esterni delle zone scure (condivisi da tabella e visualizzazioni)."""
+        if "scure" not in self._contorni:
+            self._contorni["scure"] = estrai_contorni(self.dark_mask)
+        return self._contorni["scure"]
+
+    @property
+    def contorni_chiare(self):
+        """Contorni esterni delle zone chiare (condivisi da tabella e visualizzazioni)."""
+        if "chiare" not in self._contorni:
+            self._contorni["chiare"] = estrai_contorni(self.bright_mask)
+        return self._contorni["chiare"]
+
+    @property
+    def difetti(self):
+        """Tabella dei difetti (array strutturato DTYPE_DIFETTI) in coordinate del frame."""
+        if self._difetti is None:
+            tabella = np.concatenate([
+                tabella_difetti(self.contorni_scure, self.dark_mask, self.gray_image, TIPO_SCURO),
+                tabella_difetti(self.contorni_chiare, self.bright_mask, self.gray_image, TIPO_CHIARO),
+            ])
+            tabella = in_coordinate_frame(tabella, self.roi, self.scala)
+            if self.regola is not None:
+                tabella = self.regola.filtra(tabella)
+            self._difetti = tabella
+        return self._difetti
+
+    def _applica_regola(self):
+        # La tabella dei difetti si calcola solo se la regola la richiede
+        if self.regola is not None and self.regola.attiva and not self.is_defective:
+            self.is_defective = self.regola.violata(self.difetti)
+
+    @property
+    def cache_soglie(self):
+        """Istogrammi del frame per valutare altre soglie senza rianalizzarlo."""
+        if self._cache_soglie is None:
+            self._cache_soglie = CacheSoglie(self.gray_image, self.kernel)
+        return self._cache_soglie
+
+    def ricalcola(self, soglia_difetti=None, soglia_colore_scuro=None, soglia_colore_chiaro=None,
+                  regola=None):
+        """Nuovo risultato per lo stesso frame con soglie diverse, senza rifare l'analisi.
+
+        Le percentuali e il verdetto sono immediati; le maschere delle soglie
+        cambiate vengono ricalcolate solo se richieste (per le visualizzazioni).
+        """
+        if soglia_difetti is None:
+            soglia_difetti = self.soglia_difetti
+        if soglia_colore_scuro is None:
+            soglia_colore_scuro = self.soglia_colore_scuro
+        if soglia_colore_chiaro is None:
+            soglia_colore_chiaro = self.soglia_colore_chiaro
+        if regola is None:
+            regola = self.regola
+
+        dark_percent, bright_percent, total_percent = self.cache_soglie.percentuali(
+            soglia_colore_scuro, soglia_colore_chiaro)
+
+        # Riusa le maschere delle soglie rimaste invariate
+        maschere = {}
+        if soglia_colore_scuro == self.soglia_colore_scuro and "scure" in self._maschere:
+            maschere["scure"] = self._maschere["scure"]
+        if soglia_colore_chiaro == self.soglia_colore_chiaro and "chiare" in self._maschere:
+            maschere["chiare"] = self._maschere["chiare"]
+        if len(maschere) == 2 and "combinata" in self._maschere:
+            maschere["combinata"] = self._maschere["combinata"]
+        contorni = {nome: c for nome, c in self._contorni.items() if nome in maschere}
+
+        risultato = RisultatoAnalisi(
+            dark_percent=dark_percent,
+            bright_percent=bright_percent,
+            total_percent=total_percent,
+            is_defective=total_percent > soglia_difetti,
+            soglia_difetti=soglia_difetti,
+            soglia_colore_scuro=soglia_colore_scuro,
+            soglia_colore_chiaro=soglia_colore_chiaro,
+            gray_image=self.gray_image,
+            kernel=self.kernel,
+            roi=self.roi,
+            scala=self.scala,
+            regola=regola,
+            _maschere=maschere,
+            _cache_soglie=self.cache_soglie,
+            _contorni=contorni,
+        )
+        risultato._applica_regola()
+        return risultato
+
+    def come_dizionario(self):
+        """Restituisce i valori numerici del risultato (senza immagini)."""
+        dizionario = {
+            "dark_percent": self.dark_percent,
+            "bright_percent": self.bright_percent,
+            "total_percent": self.total_percent,
+            "stato": self.status_text,
+            "soglia_difetti": self.soglia_difetti,
+            "soglia_colore_scuro": self.soglia_colore_scuro,
+            "soglia_colore_chiaro": self.soglia_colore_chiaro,
+            "roi": list(self.roi) if self.roi is not None else None,
+            "scala": self.scala,
+        }
+        if self.regola is not None and self.regola.attiva:
+            difetti = self.difetti
+            dizionario["numero_difetti"] = int(difetti.size)
+            dizionario["difetto_massimo"] = int(difetti["area"].max()) if difetti.size else 0
+        return dizionario
+
+
+class AnalizzatoreDifetti:
+    """Analizza i frame e classifica il pezzo come OK o DIFETTATO."""
+
+    def __init__(self, soglia_difetti=SOGLIA_DIFETTI_DEFAULT,
+                 soglia_colore_scuro=SOGLIA_SCURO_DEFAULT,
+                 soglia_colore_chiaro=SOGLIA_CHIARO_DEFAULT,
+                 roi=None, scala_analisi=1.0, regola=None,
+                 dimensione_kernel=DIMENSIONE_KERNEL_DEFAULT, thread_tasselli=1):
+        # Valore soglia difetti (%)
+        self.soglia_difetti = soglia_difetti
+
+        # Valore soglia colore scuro (0-255)
+        self.soglia_colore_scuro = soglia_colore_scuro
+
+        # Valore soglia per zone chiare/rosse (0-255)
+        self.soglia_colore_chiaro = soglia_colore_chiaro
+
+        # Regione di analisi: None (intero frame), (x, y, w, h) o ROI_AUTOMATICA
+        self.roi = roi
+
+        # Fattore di scala dell'analisi (1.0 = piena risoluzione)
+        self.scala_analisi = scala_analisi
+
+        # Limiti su dimensione e numero dei singoli difetti
+        self.regola = regola if regola is not None else RegolaVerdetto()
+
+        # Buffer riutilizzati per immagini in grigio e maschere (None: nuove allocazioni)
+        self.buffer = BUFFER
+
+        # Thread per l'analisi a tasselli delle immagini grandi (1: immagine intera)
+        self.thread_tasselli = thread_tasselli
+
+        # Kernel condiviso per l'apertura morfologica (e versioni per scale ridotte)
+        self.kernel = None
+        self.imposta_kernel(dimensione_kernel)
+
+    def imposta_kernel(self, dimensione):
+        """Cambia la dimensione del kernel (i kernel derivati si ricreano solo se cambia)."""
+        if self.kernel is not None and self.kernel.shape[0] == dimensione:
+            return
+        kernel = crea_kernel(dimensione)
+        # Sostituisce insieme kernel e cache, così i worker non mescolano dimensioni diverse
+        self._kernel_scalati = {1.0: kernel}
+        self.kernel = kernel
+
+    def kernel_per_scala(self, scala):
+        """Kernel da usare per un'analisi alla scala indicata (calcolato una volta sola)."""
+        kernel = self._kernel_scalati.get(scala)
+        if kernel is None:
+            kernel = crea_kernel_scalato(scala, self.kernel.shape[0])
+            self._kernel_scalati[scala] = kernel
+        return kernel
+
+    def prepara(self, frame, riduzione=1):
+        """Ritaglia la regione di analisi, converte in grigio e riduce alla scala di analisi.
+
+        Restituisce (gray_image, roi, scala); roi è None se si analizza l'intero frame.
+        Un frame già ridotto di un fattore riduzione in decodifica (vedi
+        caricamento.decodifica) viene solo completato fino alla scala di
+        analisi; roi e scala restano riferite al frame a piena risoluzione.
+        """
+        roi = self.roi
+        scala = self.scala_analisi
+        buffer = self.buffer
+
+        # Ritaglia prima della conversione, così si converte solo la regione utile
+        if roi is not None:
+            if riduzione != 1 and roi != ROI_AUTOMATICA:
+                roi = tuple(v / riduzione for v in roi)
+            frame, roi = ritaglia_regione(frame, roi)
+            if riduzione != 1:
+                roi = tuple(v * riduzione for v in roi)
+        dst = buffer.ottieni("grigio", frame.shape[:2]) if buffer is not None and frame.ndim == 3 else None
+        gray_image = converti_in_grigio(frame, dst)
+
+        # Scala che resta da applicare dopo la riduzione già fatta in decodifica: una
+        # riduzione più forte della scala andrebbe ingrandita, perdendo risoluzione
+        fattore = scala * riduzione
+        assert fattore <= 1.0 + 1e-9, f"riduzione {riduzione} incompatibile con la scala {scala}"
+        if fattore != 1.0:
+            height, width = gray_image.shape
+            # Stesse dimensioni che cv2.resize ricava da fx e fy
+            forma = (int(round(height * fattore)), int(round(width * fattore)))
+            dst = buffer.ottieni("grigio_scalato", forma) if buffer is not None else None
+            gray_image = cv2.resize(gray_image, None, dst=dst, fx=fattore, fy=fattore,
+                                    interpolation=cv2.INTER_AREA)
+        return gray_image, roi, scala
+
+    def analizza(self, frame, riduzione=1):
+        """Analizza un frame BGR (o già in scala di grigi) nella regione e scala configurate.
+
+        riduzione indica che il frame è stato decodificato a 1/riduzione della
+        risoluzione originale (vedi prepara).
+        """
+        inizio = time.perf_counter()
+        gray_image, roi, scala = self.prepara(frame, riduzione)
+        durata = time.perf_counter() - inizio
+
+        risultato = self.analizza_grigio(gray_image, roi, scala)
+        risultato.tempi["preparazione"] = durata * 1000
+        return risultato
+
+    def curve_soglie(self, frame, riduzione=1):
+        """Curve delle percentuali per tutte le soglie 0-255 (vedi CacheSoglie.curve)."""
+        gray_image, _, scala = self.prepara(frame, riduzione)
+        return CacheSoglie(gray_image, self.kernel_per_scala(scala)).curve()
+
+    def analizza_grigio(self, gray_image, roi=None, scala=1.0):
+        """Analizza un'immagine in scala di grigi già ritagliata e ridotta."""
+        inizio = time.perf_counter()
+
+        # Legge le soglie una sola volta, così il risultato è coerente
+        # anche se vengono modificate da un altro thread
+        soglia_difetti = self.soglia_difetti
+        soglia_scuro = self.soglia_colore_scuro
+        soglia_chiaro = self.soglia_colore_chiaro
+        regola = self.regola
+        kernel = self.kernel_per_scala(scala)
+
+        esecutore = (esecutore_tasselli(self.thread_tasselli)
+                     if gray_image.size >= PIXEL_MINIMI_TASSELLI else None)
+        if esecutore is not None:
+            metriche = calcola_metriche_a_tasselli(gray_image, soglia_scuro, soglia_chiaro, kernel,
+                                                   esecutore, self.thread_tasselli, self.buffer)
+        else:
+            metriche = calcola_metriche(gray_image, soglia_scuro, soglia_chiaro, kernel, self.buffer)
+        (dark_percent, bright_percent, total_percent,
+         dark_mask, bright_mask, combined_mask) = metriche
+
+        maschere = {"scure": dark_mask, "chiare": bright_mask}
+        if combined_mask is not None:
+            maschere["combinata"] = combined_mask
+
+        risultato = RisultatoAnalisi(
+            dark_percent=dark_percent,
+            bright_percent=bright_percent,
+            total_percent=total_percent,
+            is_defective=total_percent > soglia_difetti,
+            soglia_difetti=soglia_difetti,
+            soglia_colore_scuro=soglia_scuro,
+            soglia_colore_chiaro=soglia_chiaro,
+            gray_image=gray_image,
+            kernel=kernel,
+            roi=roi,
+            scala=scala,
+            regola=regola,
+            _maschere=maschere,
+        )
+        risultato._applica_regola()
+        risultato.tempi["metriche"] = (time.perf_counter() - inizio) * 1000
+        return risultato
+
+
+def confronta_con_analisi_completa(frame, analizzatore, ripetizioni=3, frame_ridotto=None, riduzione=1):
+    """Confronta l'analisi con ROI/scala configurate con quella a piena risoluzione sull'intero frame.
+
+    Se l'analisi configurata lavora su un frame decodificato a risoluzione
+    ridotta, frame_ridotto e riduzione indicano quel frame: il confronto
+    misura così lo stesso percorso usato in produzione.
+    Restituisce i tempi mediani, lo speedup e la deriva delle percentuali
+    (in punti percentuali) rispetto all'analisi completa.
+    """
+    if frame_ridotto is None:
+        frame_ridotto, riduzione = frame, 1
+    completo = AnalizzatoreDifetti(analizzatore.soglia_difetti,
+                                   analizzatore.soglia_colore_scuro,
+                                   analizzatore.soglia_colore_chiaro,
+                                   regola=analizzatore.regola)
+
+    def misura(a, frame, riduzione=1):
+        tempi = []
+        for _ in range(ripetizioni):
+            inizio = time.perf_counter()
+            risultato = a.analizza(frame, riduzione)
+            tempi.append(time.perf_counter() - inizio)
+        return risultato, float(np.median(tempi))
+
+    risultato_completo, tempo_completo = misura(completo, frame)
+    risultato_ridotto, tempo_ridotto = misura(analizzatore, frame_ridotto, riduzione)
+
+    return {
+        "tempo_completo_ms": tempo_completo * 1000,
+        "tempo_ridotto_ms": tempo_ridotto * 1000,
+        "speedup": tempo_completo / tempo_ridotto if tempo_ridotto > 0 else float("inf"),
+        "deriva_dark": risultato_ridotto.dark_percent - risultato_completo.dark_percent,
+        "deriva_bright": risultato_ridotto.bright_percent - risultato_completo.bright_percent,
+        "deriva_total": risultato_ridotto.total_percent - risultato_completo.total_percent,
+        "stato_invariato": risultato_ridotto.is_defective == risultato_completo.is_defective,
+        "roi": risultato_ridotto.roi,
+        "scala": risultato_ridotto.scala,
+    }
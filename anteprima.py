@@ -0,0 +1,76 @@
+"""Anteprima su canvas Tk che riusa lo stesso elemento e la stessa PhotoImage.
+
+Va usata solo dal thread principale di Tk.
+"""
+import cv2
+from PIL import Image, ImageTk
+
+# Dimensioni di riserva finché il canvas non è ancora stato renderizzato
+LARGHEZZA_RISERVA = 600
+ALTEZZA_RISERVA = 500
+
+
+class AnteprimaCanvas:
+    """Disegna frame BGR su un canvas aggiornando in place un'unica immagine."""
+
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self._item = None
+        self._photo = None
+
+        # Dimensioni del canvas, aggiornate solo quando viene ridimensionato
+        self._larghezza = LARGHEZZA_RISERVA
+        self._altezza = ALTEZZA_RISERVA
+
+        # Dimensioni di destinazione calcolate per l'ultima combinazione frame/canvas
+        self._chiave_scala = None
+        self._dimensioni = None
+
+        self.canvas.bind("<Configure>", self._al_ridimensionamento)
+
+    def _al_ridimensionamento(self, event):
+        if event.width < 50 or event.height < 50:
+            return
+        self._larghezza = event.width
+        self._altezza = event.height
+        if self._item is not None:
+            self.canvas.coords(self._item, self._larghezza // 2, self._altezza // 2)
+
+    def _dimensioni_destinazione(self, height, width):
+        """Dimensioni del frame adattato al canvas (ricalcolate solo se cambiano frame o canvas)."""
+        chiave = (height, width, self._larghezza, self._altezza)
+        if chiave != self._chiave_scala:
+            scale = min(self._larghezza / width, self._altezza / height)
+            self._dimensioni = (max(1, int(width * scale)), max(1, int(height * scale)))
+            self._chiave_scala = chiave
+        return self._dimensioni
+
+    def mostra(self, frame):
+        """Mostra un frame BGR (o in scala di grigi) adattandolo al canvas."""
+        height, width = frame.shape[:2]
+        new_width, new_height = self._dimensioni_destinazione(height, width)
+
+        # Ridimensiona e converti da BGR a RGB per PIL
+        resized = cv2.resize(frame, (new_width, new_height))
+        conversione = cv2.COLOR_GRAY2RGB if resized.ndim == 2 else cv2.COLOR_BGR2RGB
+        pil_image = Image.fromarray(cv2.cvtColor(resized, conversione))
+
+        if self._photo is not None and (self._photo.width(), self._photo.height()) == (new_width, new_height):
+            # Stesse dimensioni: aggiorna i pixel della PhotoImage esistente
+            self._photo.paste(pil_image)
+        else:
+            self._photo = ImageTk.PhotoImage(image=pil_image)
+            if self._item is not None:
+                self.canvas.itemconfig(self._item, image=self._photo)
+
+        if self._item is None:
+            self.canvas.delete("all")
+            self._item = self.canvas.create_image(
+                self._larghezza // 2, self._altezza // 2, image=self._photo)
+
+    def mostra_messaggio(self, testo):
+        """Sostituisce l'anteprima con un messaggio di testo."""
+        self.canvas.delete("all")
+        self._item = None
+        self.canvas.create_text(self._larghezza // 2, self._altezza // 2,
+                                text=testo, fill="gray", font=("Arial", 14))
@@ -0,0 +1,253 @@
+"""Benchmark della pipeline di rilevamento sulle immagini di esempio e su frame sintetici.
+
+Non richiede webcam né display. Esempio:
+    python benchmark.py
+    python benchmark.py --ripetizioni 20 --json bench_output.json --confronta vecchio.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from analizzatore import (AnalizzatoreDifetti, calcola_metriche_a_tasselli, converti_in_grigio,
+                          esecutore_tasselli, maschera_zone_chiare, maschera_zone_scure,
+                          percentuale_area)
+from sorgenti import frame_sintetico
+from viste import (NOMI_VISTE, VISTA_PREDEFINITA, VisteAnalisi, disegna_difetti_combinati,
+                   disegna_zone_chiare, disegna_zone_scure)
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+CARTELLA_IMMAGINI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+IMMAGINI_BENCHMARK = ["v1.jpg", "v2.jpg", "v3.jpg", "v4.jpg", "v5.jpg", "v1-resized-h-1000.jpg"]
+RISOLUZIONI_SINTETICHE = [(640, 480), (1280, 720), (1920, 1080), (3840, 2160)]
+
+# Dimensioni del canvas usate per misurare la conversione dell'anteprima
+DIMENSIONI_CANVAS = (600, 500)
+
+
+def carica_ingressi(includi_sintetici=True):
+    """Restituisce la lista (nome, frame BGR) delle immagini su cui eseguire il benchmark."""
+    ingressi = []
+    for nome in IMMAGINI_BENCHMARK:
+        frame = cv2.imread(os.path.join(CARTELLA_IMMAGINI, nome), cv2.IMREAD_COLOR)
+        if frame is not None:
+            ingressi.append((nome, frame))
+    if includi_sintetici:
+        for larghezza, altezza in RISOLUZIONI_SINTETICHE:
+            ingressi.append((f"sintetico-{larghezza}x{altezza}", frame_sintetico(larghezza, altezza)))
+    return ingressi
+
+
+def crea_stadi(analizzatore):
+    """Stadi misurati: ciascuno riceve il frame BGR e i dati preparati da prepara_dati."""
+    # Stessa analisi a tasselli su tutti i core (anche sotto PIXEL_MINIMI_TASSELLI)
+    thread_tasselli = max(2, os.cpu_count() or 1)
+    kernel = analizzatore.kernel
+    scuro = analizzatore.soglia_colore_scuro
+    chiaro = analizzatore.soglia_colore_chiaro
+
+    def detect_dark_regions(frame, dati):
+        mask = maschera_zone_scure(dati["gray"], scuro, kernel)
+        percent = percentuale_area(mask)
+        return disegna_zone_scure(dati["gray"], mask, percent, scuro)
+
+    def detect_bright_regions(frame, dati):
+        mask = maschera_zone_chiare(dati["gray"], chiaro, kernel)
+        percent = percentuale_area(mask)
+        return disegna_zone_chiare(dati["gray"], mask, percent, chiaro)
+
+    def combine_defects(frame, dati):
+        combined_mask = cv2.bitwise_or(dati["dark_mask"], dati["bright_mask"])
+        total_percent = percentuale_area(combined_mask)
+        return disegna_difetti_combinati(
+            dati["gray"], dati["dark_mask"], dati["bright_mask"], 0.0, 0.0,
+            total_percent, total_percent > analizzatore.soglia_difetti)
+
+    def process_image(frame, dati):
+        # Come RiconoscitoreDifetti.analyze_frame: metriche + sola vista predefinita
+        views = VisteAnalisi(frame, analizzatore.analizza(frame))
+        return views[VISTA_PREDEFINITA]
+
+    def process_image_tutte_le_viste(frame, dati):
+        views = VisteAnalisi(frame, analizzatore.analizza(frame))
+        return [views[nome] for nome in NOMI_VISTE]
+
+    def display_webcam_frame(frame, dati):
+        # Come AnteprimaCanvas.mostra, esclusa la copia nella PhotoImage (richiede un display)
+        height, width = frame.shape[:2]
+        scale = min(DIMENSIONI_CANVAS[0] / width, DIMENSIONI_CANVAS[1] / height)
+        resized = cv2.resize(frame, (int(width * scale), int(height * scale)))
+        rgb = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
+        return Image.fromarray(rgb) if Image is not None else rgb
+
+    return {
+        # Decodifica del JPEG: a colori e poi in grigio, direttamente in grigio, in grigio a 1/4
+        "decodifica_colore": lambda frame, dati: converti_in_grigio(
+            cv2.imdecode(dati["jpeg"], cv2.IMREAD_COLOR)),
+        "decodifica_grigio": lambda frame, dati: cv2.imdecode(dati["jpeg"], cv2.IMREAD_GRAYSCALE),
+        "decodifica_grigio_ridotta_4": lambda frame, dati: cv2.imdecode(
+            dati["jpeg"], cv2.IMREAD_REDUCED_GRAYSCALE_4),
+        "grayscale": lambda frame, dati: converti_in_grigio(frame),
+        "detect_dark_regions": detect_dark_regions,
+        "detect_bright_regions": detect_bright_regions,
+        "combine_defects": combine_defects,
+        "metriche": lambda frame, dati: analizzatore.analizza(frame),
+        "metriche_tasselli": lambda frame, dati: calcola_metriche_a_tasselli(
+            dati["gray"], scuro, chiaro, kernel, esecutore_tasselli(thread_tasselli), thread_tasselli,
+            analizzatore.buffer),
+        "process_image": process_image,
+        "process_image_tutte_le_viste": process_image_tutte_le_viste,
+        "display_webcam_frame": display_webcam_frame,
+    }
+
+
+def prepara_dati(frame, analizzatore):
+    """Calcola una volta gli ingressi intermedi usati dagli stadi isolati."""
+    gray = converti_in_grigio(frame)
+    _, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 95])
+    return {
+        "jpeg": jpeg,
+        "gray": gray,
+        "dark_mask": maschera_zone_scure(gray, analizzatore.soglia_colore_scuro, analizzatore.kernel),
+        "bright_mask": maschera_zone_chiare(gray, analizzatore.soglia_colore_chiaro, analizzatore.kernel),
+    }
+
+
+def misura_stadio(funzione, frame, dati, ripetizioni):
+    """Restituisce latenza mediana/p95 (ms), throughput (frame/s) e picco di memoria (MB)."""
+    funzione(frame, dati)  # riscaldamento
+
+    tempi = []
+    for _ in range(ripetizioni):
+        inizio = time.perf_counter()
+        funzione(frame, dati)
+        tempi.append(time.perf_counter() - inizio)
+
+    # Il picco di memoria si misura in un'esecuzione separata: tracemalloc rallenta
+    tracemalloc.start()
+    funzione(frame, dati)
+    _, picco = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mediana = float(np.median(tempi))
+    return {
+        "mediana_ms": mediana * 1000,
+        "p95_ms": float(np.percentile(tempi, 95)) * 1000,
+        "frame_al_secondo": 1.0 / mediana if mediana > 0 else float("inf"),
+        "picco_memoria_mb": picco / (1024 * 1024),
+    }
+
+
+def informazioni_ambiente():
+    """Versioni e hardware, per confrontare solo esecuzioni comparabili."""
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "piattaforma": platform.platform(),
+        "cpu": os.cpu_count(),
+        "thread_opencv": cv2.getNumThreads(),
+    }
+
+
+def esegui_benchmark(ripetizioni=10, includi_sintetici=True, stadi_scelti=None):
+    """Esegue tutti gli stadi su tutti gli ingressi e restituisce i risultati strutturati."""
+    analizzatore = AnalizzatoreDifetti()
+    stadi = crea_stadi(analizzatore)
+    if stadi_scelti:
+        sconosciuti = [nome for nome in stadi_scelti if nome not in stadi]
+        if sconosciuti:
+            raise ValueError(f"Stadi sconosciuti: {', '.join(sconosciuti)} "
+                             f"(disponibili: {', '.join(stadi)})")
+        stadi = {nome: stadi[nome] for nome in stadi_scelti}
+
+    risultati = []
+    for nome_ingresso, frame in carica_ingressi(includi_sintetici):
+        dati = prepara_dati(frame, analizzatore)
+        for nome_stadio, funzione in stadi.items():
+            misura = misura_stadio(funzione, frame, dati, ripetizioni)
+            misura.update({
+                "ingresso": nome_ingresso,
+                "risoluzione": f"{frame.shape[1]}x{frame.shape[0]}",
+                "stadio": nome_stadio,
+            })
+            risultati.append(misura)
+
+    return {
+        "ambiente": informazioni_ambiente(),
+        "ripetizioni": ripetizioni,
+        "risultati": risultati,
+    }
+
+
+def formatta_tabella(benchmark, precedente=None):
+    """Formatta i risultati come tabella di testo, con il confronto opzionale."""
+    riferimenti = {}
+    if precedente is not None:
+        riferimenti = {(r["ingresso"], r["stadio"]): r for r in precedente["risultati"]}
+
+    righe = [
+        "Benchmark riconoscitore difetti",
+        "Ambiente: " + ", ".join(f"{k}={v}" for k, v in benchmark["ambiente"].items()),
+        f"Ripetizioni per stadio: {benchmark['ripetizioni']}",
+        "",
+    ]
+    intestazione = (f"{'ingresso':<26}{'risoluzione':<12}{'stadio':<30}"
+                    f"{'mediana ms':>11}{'p95 ms':>10}{'frame/s':>10}{'picco MB':>10}")
+    if riferimenti:
+        intestazione += f"{'vs prec.':>10}"
+    righe.append(intestazione)
+    righe.append("-" * len(intestazione))
+
+    for r in benchmark["risultati"]:
+        riga = (f"{r['ingresso']:<26}{r['risoluzione']:<12}{r['stadio']:<30}"
+                f"{r['mediana_ms']:>11.2f}{r['p95_ms']:>10.2f}"
+                f"{r['frame_al_secondo']:>10.1f}{r['picco_memoria_mb']:>10.1f}")
+        riferimento = riferimenti.get((r["ingresso"], r["stadio"]))
+        if riferimento is not None and r["mediana_ms"] > 0:
+            # Rapporto > 1: più veloce della versione precedente
+            riga += f"{riferimento['mediana_ms'] / r['mediana_ms']:>9.2f}x"
+        righe.append(riga)
+    return "\n".join(righe) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark della pipeline di rilevamento difetti.")
+    parser.add_argument("--ripetizioni", type=int, default=10)
+    parser.add_argument("--senza-sintetici", action="store_true",
+                        help="usa solo le immagini della cartella images/")
+    parser.add_argument("--stadi", nargs="+", choices=list(crea_stadi(AnalizzatoreDifetti())),
+                        metavar="STADIO", help="esegue solo gli stadi indicati (%(choices)s)")
+    parser.add_argument("--output", default="bench_output.txt", help="file della tabella di testo")
+    parser.add_argument("--json", default="bench_output.json", help="file dei risultati in JSON")
+    parser.add_argument("--confronta", help="JSON di un'esecuzione precedente da confrontare")
+    args = parser.parse_args(argv)
+
+    benchmark = esegui_benchmark(args.ripetizioni, not args.senza_sintetici, args.stadi)
+
+    precedente = None
+    if args.confronta:
+        with open(args.confronta, encoding="utf-8") as f:
+            precedente = json.load(f)
+
+    tabella = formatta_tabella(benchmark, precedente)
+    print(tabella, end="")
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(tabella)
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump(benchmark, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
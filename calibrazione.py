@@ -0,0 +1,97 @@
+"""Calibrazione delle soglie su un insieme di immagini, senza GUI.
+
+Per ogni immagine calcola in un colpo solo le percentuali per tutte le
+soglie 0-255 (vedi analizzatore.CacheSoglie) e riassume quante immagini
+risultano DIFETTATE al variare delle soglie scura e chiara. Esempio:
+    python riconoscitore.py calibra images/
+    python riconoscitore.py calibra images/ --passo 10 --curve curve.jsonl
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from analizzatore import AnalizzatoreDifetti, SOGLIA_DIFETTI_DEFAULT
+from caricamento import RIDUZIONI, decodifica, riduzione_compatibile, riduzione_per_scala
+from ispezione_batch import converti_roi, trova_immagini
+
+
+def calcola_curve(percorsi, analizzatore, riduzione=1):
+    """Restituisce la lista (percorso, curve) per le immagini decodificabili."""
+    risultati = []
+    for percorso in percorsi:
+        frame = decodifica(percorso, grigio=True, riduzione=riduzione)
+        if frame is None:
+            print(f"Impossibile decodificare {percorso}", file=sys.stderr)
+            continue
+        risultati.append((percorso, analizzatore.curve_soglie(frame, riduzione)))
+    return risultati
+
+
+def conta_difettate(curve, soglia_difetti):
+    """Matrice 256x256 del numero di immagini DIFETTATE per ogni coppia (scura, chiara)."""
+    conteggio = np.zeros((256, 256), np.int64)
+    for _, c in curve:
+        conteggio += c["totale"] > soglia_difetti
+    return conteggio
+
+
+def formatta_griglia(conteggio, totale_immagini, passo):
+    """Tabella di testo: righe = soglia scura, colonne = soglia chiara."""
+    soglie = list(range(0, 256, passo))
+    righe = [f"Immagini DIFETTATE su {totale_immagini} (righe: soglia scura, colonne: soglia chiara)",
+             "scura\\chiara" + "".join(f"{t:>5}" for t in soglie)]
+    for td in soglie:
+        righe.append(f"{td:>12}" + "".join(f"{conteggio[td, tb]:>5}" for tb in soglie))
+    return "\n".join(righe) + "\n"
+
+
+def main(argv=None):
+    """Punto di ingresso a riga di comando per la calibrazione delle soglie."""
+    parser = argparse.ArgumentParser(
+        prog="riconoscitore.py calibra",
+        description="Calcola le curve delle percentuali per tutte le soglie su un insieme di immagini.")
+    parser.add_argument("percorso", help="cartella o pattern glob delle immagini")
+    parser.add_argument("--soglia-difetti", type=float, default=SOGLIA_DIFETTI_DEFAULT)
+    parser.add_argument("--passo", type=int, default=25, help="passo delle soglie nella tabella")
+    parser.add_argument("--curve", help="file JSONL in cui salvare le curve di ogni immagine")
+    parser.add_argument("--roi", type=converti_roi, default=None,
+                        help="regione di analisi: 'auto' (vassoio) oppure 'x,y,w,h'")
+    parser.add_argument("--scala", type=float, default=1.0,
+                        help="fattore di scala dell'analisi (es. 0.5)")
+    parser.add_argument("--riduzione", type=int, choices=RIDUZIONI, default=None,
+                        help="decodifica i JPEG a 1/N della risoluzione (default: secondo --scala)")
+    args = parser.parse_args(argv)
+    if args.riduzione is not None and not riduzione_compatibile(args.riduzione, args.scala):
+        parser.error(f"--riduzione {args.riduzione} scende sotto --scala {args.scala} "
+                     f"(massima: {riduzione_per_scala(args.scala)})")
+    riduzione = args.riduzione if args.riduzione is not None else riduzione_per_scala(args.scala)
+
+    percorsi = trova_immagini(args.percorso)
+    if not percorsi:
+        print(f"Nessuna immagine trovata in {args.percorso}", file=sys.stderr)
+        return 1
+
+    analizzatore = AnalizzatoreDifetti(args.soglia_difetti, roi=args.roi, scala_analisi=args.scala)
+    inizio = time.perf_counter()
+    curve = calcola_curve(percorsi, analizzatore, riduzione)
+    durata = time.perf_counter() - inizio
+
+    if args.curve:
+        with open(args.curve, "w", encoding="utf-8") as f:
+            for percorso, c in curve:
+                f.write(json.dumps({
+                    "percorso": percorso,
+                    "scura": np.round(c["scura"], 4).tolist(),
+                    "chiara": np.round(c["chiara"], 4).tolist(),
+                }) + "\n")
+
+    print(formatta_griglia(conta_difettate(curve, args.soglia_difetti), len(curve), args.passo), end="")
+    print(f"Curve calcolate per {len(curve)} immagini in {durata:.2f} s.", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
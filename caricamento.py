@@ -0,0 +1,111 @@
+"""Caricamento delle immagini da file: in grigio, a risoluzione ridotta e con cache LRU.
+
+L'analisi usa solo il canale di grigio: decodificare il JPEG direttamente
+in grigio evita la conversione dei colori e un terzo della memoria. Con
+una riduzione di 2, 4 o 8 libjpeg scala i blocchi DCT durante la
+decodifica, così un'immagine da analizzare a scala ridotta non viene mai
+decodificata a piena risoluzione. I colori si decodificano solo quando
+servono (ad esempio per la vista "Originale").
+
+Le immagini decodificate vengono conservate in una cache LRU limitata in
+MB e indicizzata da percorso, data di modifica e modalità di decodifica:
+rianalizzare lo stesso file non lo decodifica di nuovo, mentre un file
+modificato viene riletto. Gli array restituiti sono in sola lettura.
+"""
+import collections
+import os
+import threading
+
+import cv2
+
+# Flag di cv2.imread per ogni riduzione, in grigio e a colori
+_FLAG_GRIGIO = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+_FLAG_COLORE = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+RIDUZIONI = tuple(_FLAG_GRIGIO)
+
+CAPACITA_CACHE_MB_DEFAULT = 256
+
+
+def riduzione_compatibile(riduzione, scala):
+    """Vero se decodificare a 1/riduzione non scende sotto la scala di analisi."""
+    return riduzione * scala <= 1.0 + 1e-9
+
+
+def riduzione_per_scala(scala):
+    """Riduzione di decodifica più forte che non scende sotto la scala di analisi."""
+    return max(r for r in RIDUZIONI if riduzione_compatibile(r, scala)) if scala < 1.0 else 1
+
+
+def decodifica(percorso, grigio=True, riduzione=1):
+    """Decodifica un'immagine in grigio o a colori, ridotta di 1, 2, 4 o 8 (None se illeggibile)."""
+    if riduzione not in RIDUZIONI:
+        raise ValueError(f"Riduzione non supportata: {riduzione} (valori ammessi: {RIDUZIONI})")
+    flag = (_FLAG_GRIGIO if grigio else _FLAG_COLORE)[riduzione]
+    return cv2.imread(percorso, flag)
+
+
+class CacheImmagini:
+    """Cache LRU delle immagini decodificate, limitata in MB e sicura tra thread."""
+
+    def __init__(self, capacita_mb=CAPACITA_CACHE_MB_DEFAULT):
+        self.capacita = capacita_mb * 1024 * 1024
+        self._immagini = collections.OrderedDict()
+        self._byte = 0
+        self._lock = threading.Lock()
+        self.colpi = 0
+        self.mancati = 0
+
+    def carica(self, percorso, grigio=True, riduzione=1):
+        """Come decodifica(), ma riusa l'immagine già decodificata se il file non è cambiato."""
+        try:
+            stat = os.stat(percorso)
+        except OSError:
+            return None
+        chiave = (os.path.abspath(percorso), stat.st_mtime_ns, stat.st_size, grigio, riduzione)
+        with self._lock:
+            immagine = self._immagini.get(chiave)
+            if immagine is not None:
+                self._immagini.move_to_end(chiave)
+                self.colpi += 1
+                return immagine
+            self.mancati += 1
+
+        # La decodifica avviene fuori dal lock, così più thread decodificano in parallelo
+        immagine = decodifica(percorso, grigio, riduzione)
+        if immagine is None or immagine.nbytes > self.capacita:
+            return immagine
+        # Condivisa tra più chiamanti: nessuno deve poterla modificare
+        immagine.flags.writeable = False
+
+        with self._lock:
+            if chiave not in self._immagini:
+                self._immagini[chiave] = immagine
+                self._byte += immagine.nbytes
+            while self._byte > self.capacita:
+                _, scartata = self._immagini.popitem(last=False)
+                self._byte -= scartata.nbytes
+        return immagine
+
+    def svuota(self):
+        with self._lock:
+            self._immagini.clear()
+            self._byte = 0
+
+    @property
+    def dimensione_mb(self):
+        return self._byte / (1024 * 1024)
+
+
+# Cache condivisa dagli strumenti che rileggono gli stessi file
+IMMAGINI = CacheImmagini()
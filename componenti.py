@@ -0,0 +1,107 @@
+"""Tabella dei singoli difetti (componenti connesse) delle maschere aperte.
+
+Le statistiche vengono ricavate dai contorni esterni, gli stessi usati per
+disegnare le visualizzazioni, così i contorni si estraggono una sola volta
+per maschera. connectedComponentsWithStats (connettività 8) viene eseguita
+sul solo rettangolo di ciascun contorno invece che sull'intera immagine:
+la tabella coincide con quella dell'etichettatura completa, comprese le
+zone racchiuse nei buchi di un difetto, che sono difetti a sé.
+"""
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+from strumentazione import PROFILATORE
+
+# Tipo di difetto nella colonna "tipo"
+TIPO_SCURO = 0
+TIPO_CHIARO = 1
+NOMI_TIPI = {TIPO_SCURO: "scuro", TIPO_CHIARO: "chiaro"}
+
+# Una riga per difetto: rettangolo, area (pixel), centroide, intensità media e tipo
+DTYPE_DIFETTI = np.dtype([
+    ("x", np.int32), ("y", np.int32), ("w", np.int32), ("h", np.int32),
+    ("area", np.int32),
+    ("cx", np.float32), ("cy", np.float32),
+    ("intensita", np.float32),
+    ("tipo", np.uint8),
+])
+
+
+def estrai_contorni(mask):
+    """Contorni esterni delle zone di una maschera (0/255)."""
+    with PROFILATORE.stadio("contorni"):
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return contours
+
+
+def tabella_difetti(contours, mask, gray_image, tipo):
+    """Restituisce l'array strutturato (DTYPE_DIFETTI) dei difetti delimitati dai contorni."""
+    righe = []
+    with PROFILATORE.stadio("componenti"):
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+
+            # Pixel racchiusi dal contorno, limitati ai pixel della maschera
+            regione = np.zeros((h, w), np.uint8)
+            cv2.drawContours(regione, [contour], -1, 255, cv2.FILLED, offset=(-x, -y))
+            cv2.bitwise_and(regione, mask[y:y + h, x:x + w], regione)
+            grigio = gray_image[y:y + h, x:x + w]
+
+            # Più di una componente solo se nei buchi del difetto ci sono altre zone
+            numero, etichette, stats, centroidi = cv2.connectedComponentsWithStats(regione, connectivity=8)
+            if numero == 2:
+                intensita = [None, cv2.mean(grigio, regione)[0]]
+            elif numero > 2:
+                intensita = np.bincount(etichette.ravel(), weights=grigio.ravel(), minlength=numero)
+                intensita[1:] /= stats[1:, cv2.CC_STAT_AREA]
+            for etichetta in range(1, numero):
+                sx, sy, sw, sh, area = stats[etichetta]
+                righe.append((x + sx, y + sy, sw, sh, area,
+                              x + centroidi[etichetta, 0], y + centroidi[etichetta, 1],
+                              intensita[etichetta], tipo))
+        return np.array(righe, DTYPE_DIFETTI)
+
+
+def in_coordinate_frame(tabella, roi=None, scala=1.0):
+    """Riporta rettangoli, centroidi e aree dall'immagine analizzata al frame originale."""
+    if roi is None and scala == 1.0:
+        return tabella
+    tabella = tabella.copy()
+    x0, y0 = (roi[0], roi[1]) if roi is not None else (0, 0)
+    for colonna, origine in (("x", x0), ("y", y0), ("w", 0), ("h", 0)):
+        tabella[colonna] = np.round(tabella[colonna] / scala) + origine
+    tabella["cx"] = tabella["cx"] / scala + x0
+    tabella["cy"] = tabella["cy"] / scala + y0
+    tabella["area"] = np.round(tabella["area"] / (scala * scala))
+    return tabella
+
+
+@dataclass
+class RegolaVerdetto:
+    """Limiti sui singoli difetti che rendono DIFETTATO un pezzo, oltre alla percentuale.
+
+    Le aree sono in pixel del frame originale; None disattiva il limite.
+    area_minima esclude dalla tabella i difetti più piccoli.
+    """
+    area_minima: int = 0
+    area_massima: int = None
+    numero_massimo: int = None
+
+    @property
+    def attiva(self):
+        """Vero se almeno un limite sui difetti è impostato."""
+        return self.area_massima is not None or self.numero_massimo is not None
+
+    def filtra(self, tabella):
+        """Difetti con area almeno pari ad area_minima."""
+        if not self.area_minima:
+            return tabella
+        return tabella[tabella["area"] >= self.area_minima]
+
+    def violata(self, tabella):
+        """Vero se il difetto più grande o il numero di difetti supera i limiti."""
+        if self.area_massima is not None and tabella.size and tabella["area"].max() > self.area_massima:
+            return True
+        return self.numero_massimo is not None and tabella.size > self.numero_massimo
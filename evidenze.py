@@ -0,0 +1,199 @@
+"""Archiviazione automatica delle evidenze dei pezzi DIFETTATI.
+
+Per ogni pezzo difettato vengono salvati il frame originale in JPEG, la
+maschera combinata come PNG a 1 bit e i valori dell'analisi in JSON, in
+una sottocartella per giorno. La codifica e la scrittura avvengono in un
+thread dedicato alimentato da una coda limitata: durante una raffica di
+difetti le evidenze più vecchie in attesa vengono scartate, così né
+l'analisi né la memoria risentono della lentezza del disco.
+"""
+import collections
+import json
+import os
+import threading
+import time
+
+import cv2
+
+from pipeline import CodaLimitata
+from strumentazione import PROFILATORE
+
+# Limiti predefiniti dell'archivio
+DIMENSIONE_MASSIMA_MB_DEFAULT = 1024
+ETA_MASSIMA_GIORNI_DEFAULT = 30
+
+# Evidenze che possono attendere la scrittura (ognuna tiene in memoria un frame)
+CAPACITA_CODA_DEFAULT = 8
+
+QUALITA_JPEG_DEFAULT = 90
+
+# Ogni quanto applicare il limite di età anche se non arrivano nuove evidenze
+INTERVALLO_PULIZIA = 60.0
+
+ESTENSIONI_EVIDENZE = (".jpg", ".png", ".json")
+
+
+def nome_evidenza(timestamp, progressivo=0):
+    """Nome base dei file di un'evidenza (ordinabile cronologicamente).
+
+    Il progressivo distingue le evidenze con lo stesso millisecondo.
+    """
+    millisecondi = int((timestamp % 1) * 1000)
+    return (time.strftime("%Y%m%d-%H%M%S", time.localtime(timestamp)) +
+            f"-{millisecondi:03d}-{progressivo % 10000:04d}")
+
+
+class ArchivioEvidenze:
+    """Salva in background le evidenze dei pezzi difettati e applica la politica di conservazione.
+
+    L'archivio non supera dimensione_massima_mb e non conserva evidenze più
+    vecchie di eta_massima_giorni; quando un limite viene superato si
+    eliminano per prime le evidenze più vecchie.
+    """
+
+    def __init__(self, cartella, dimensione_massima_mb=DIMENSIONE_MASSIMA_MB_DEFAULT,
+                 eta_massima_giorni=ETA_MASSIMA_GIORNI_DEFAULT, capacita=CAPACITA_CODA_DEFAULT,
+                 qualita_jpeg=QUALITA_JPEG_DEFAULT):
+        self.cartella = cartella
+        self.dimensione_massima = dimensione_massima_mb * 1024 * 1024
+        self.eta_massima = eta_massima_giorni * 24 * 3600
+        self.qualita_jpeg = qualita_jpeg
+        self.coda = CodaLimitata(capacita)
+        self.salvate = 0
+        self.eliminate = 0
+        self._progressivo = 0
+        self.al_errore = None
+
+        # Evidenze presenti su disco, dalla più vecchia: (timestamp, [percorsi], byte)
+        self._indice = collections.deque()
+        self._byte_totali = 0
+        self._thread = None
+
+    def avvia(self):
+        """Indicizza le evidenze già presenti e avvia il thread di scrittura."""
+        os.makedirs(self.cartella, exist_ok=True)
+        self._thread = threading.Thread(target=self._ciclo, name="evidenze", daemon=True)
+        self._thread.start()
+
+    def ferma(self, timeout=5.0):
+        """Scrive le evidenze ancora in coda e ferma il thread di scrittura."""
+        # Le ultime evidenze sono spesso quelle dei pezzi appena scartati: non vanno perse
+        self.coda.chiudi(svuota=False)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    @property
+    def scartate(self):
+        """Evidenze non salvate perché la coda era piena."""
+        return self.coda.scartati
+
+    @property
+    def dimensione_mb(self):
+        """Spazio occupato dall'archivio in MB."""
+        return self._byte_totali / (1024 * 1024)
+
+    def archivia(self, frame, risultato, timestamp=None, sorgente=None):
+        """Accoda le evidenze di un RisultatoAnalisi senza attenderne la scrittura.
+
+        sorgente (ad esempio il nome della stazione) viene salvata nel JSON.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        if self.coda.inserisci((timestamp, frame, risultato, sorgente)) is not None:
+            PROFILATORE.evento("evidenze_scartate")
+
+    def _ciclo(self):
+        self._indicizza()
+        self._applica_limiti()
+        ultima_pulizia = time.monotonic()
+        while True:
+            elemento = self.coda.preleva(timeout=INTERVALLO_PULIZIA)
+            if elemento is None and self.coda.chiusa:
+                return
+            if elemento is not None:
+                try:
+                    with PROFILATORE.stadio("evidenze"):
+                        self._salva(*elemento)
+                except Exception as e:
+                    if self.al_errore is not None:
+                        self.al_errore(e)
+
+            if elemento is not None or time.monotonic() - ultima_pulizia >= INTERVALLO_PULIZIA:
+                self._applica_limiti()
+                ultima_pulizia = time.monotonic()
+
+    def _salva(self, timestamp, frame, risultato, sorgente=None):
+        cartella = os.path.join(self.cartella, time.strftime("%Y-%m-%d", time.localtime(timestamp)))
+        os.makedirs(cartella, exist_ok=True)
+        base = os.path.join(cartella, nome_evidenza(timestamp, self._progressivo))
+        self._progressivo += 1
+
+        ok_frame, frame_jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.qualita_jpeg])
+        # La maschera è binaria: un PNG a 1 bit occupa pochi KB
+        ok_maschera, maschera_png = cv2.imencode(".png", risultato.combined_mask,
+                                                 [cv2.IMWRITE_PNG_BILEVEL, 1])
+        if not (ok_frame and ok_maschera):
+            raise ValueError("impossibile codificare le evidenze")
+
+        dati = risultato.come_dizionario()
+        dati["timestamp"] = timestamp
+        if sorgente is not None:
+            dati["sorgente"] = sorgente
+        contenuti = [
+            (base + ".jpg", frame_jpeg.tobytes()),
+            (base + "_maschera.png", maschera_png.tobytes()),
+            (base + ".json", json.dumps(dati, indent=2).encode("utf-8")),
+        ]
+
+        percorsi = []
+        byte = 0
+        for percorso, contenuto in contenuti:
+            with open(percorso, "wb") as f:
+                f.write(contenuto)
+            percorsi.append(percorso)
+            byte += len(contenuto)
+
+        self._indice.append((timestamp, percorsi, byte))
+        self._byte_totali += byte
+        self.salvate += 1
+
+    def _indicizza(self):
+        """Ricostruisce l'indice dalle evidenze presenti nella cartella."""
+        gruppi = {}
+        for radice, _, nomi in os.walk(self.cartella):
+            for nome in nomi:
+                if not nome.endswith(ESTENSIONI_EVIDENZE):
+                    continue
+                percorso = os.path.join(radice, nome)
+                base = os.path.join(radice, nome.split(".")[0].replace("_maschera", ""))
+                try:
+                    stat = os.stat(percorso)
+                except OSError:
+                    continue
+                gruppo = gruppi.setdefault(base, [stat.st_mtime, [], 0])
+                gruppo[0] = min(gruppo[0], stat.st_mtime)
+                gruppo[1].append(percorso)
+                gruppo[2] += stat.st_size
+
+        self._indice = collections.deque(sorted(tuple(g) for g in gruppi.values()))
+        self._byte_totali = sum(g[2] for g in self._indice)
+
+    def _applica_limiti(self):
+        """Elimina le evidenze più vecchie finché età e dimensione rientrano nei limiti."""
+        limite_eta = time.time() - self.eta_massima
+        while self._indice and (self._byte_totali > self.dimensione_massima or
+                                self._indice[0][0] < limite_eta):
+            _, percorsi, byte = self._indice.popleft()
+            for percorso in percorsi:
+                try:
+                    os.remove(percorso)
+                except FileNotFoundError:
+                    pass
+            # Rimuove la cartella del giorno quando si svuota
+            try:
+                os.rmdir(os.path.dirname(percorsi[0]))
+            except OSError:
+                pass
+            self._byte_totali -= byte
+            self.eliminate += 1
@@ -0,0 +1,96 @@
+"""Finestra con la griglia delle anteprime di più stazioni di ispezione (vedi stazioni.py).
+
+Va usata solo dal thread principale di Tk.
+"""
+import math
+import tkinter as tk
+from tkinter import ttk
+
+from anteprima import AnteprimaCanvas
+from stazioni import SchedulatoreStazioni
+
+# La griglia si aggiorna meno spesso dell'anteprima principale: con molte
+# stazioni il ridimensionamento dei frame peserebbe sul thread di Tk
+FPS_GRIGLIA = 5
+
+COLORE_OK = "#2e7d32"
+COLORE_DIFETTATO = "#c62828"
+COLORE_IN_ATTESA = "#e0e0e0"
+
+
+class FinestraStazioni:
+    """Finestra secondaria che ispeziona più stazioni e ne mostra anteprime e verdetti.
+
+    al_risultato(stazione, RisultatoPipeline) viene chiamata dai worker
+    (ad esempio per il registro); log deve essere thread-safe.
+    """
+
+    def __init__(self, root, stazioni, num_worker=2, al_risultato=None, log=None, al_chiusura=None):
+        self.log = log if log is not None else (lambda messaggio: None)
+        self.al_chiusura = al_chiusura
+        self.schedulatore = SchedulatoreStazioni(
+            num_worker, al_risultato,
+            al_errore=lambda stazione, e: self.log(f"Errore nella stazione {stazione.nome}: {str(e)}"))
+
+        self.finestra = tk.Toplevel(root)
+        self.finestra.title(f"Stazioni di ispezione ({len(stazioni)})")
+        self.finestra.protocol("WM_DELETE_WINDOW", self.chiudi)
+
+        # Griglia quasi quadrata: 4 stazioni in 2x2, 6 in 3x2...
+        colonne = math.ceil(math.sqrt(len(stazioni)))
+        righe = math.ceil(len(stazioni) / colonne)
+        for riga in range(righe):
+            self.finestra.rowconfigure(riga, weight=1)
+        for colonna in range(colonne):
+            self.finestra.columnconfigure(colonna, weight=1)
+
+        self._riquadri = []
+        for i, stazione in enumerate(stazioni):
+            self.schedulatore.aggiungi(stazione)
+            riquadro = ttk.LabelFrame(self.finestra, text=stazione.nome)
+            riquadro.grid(row=i // colonne, column=i % colonne, sticky="nsew", padx=5, pady=5)
+
+            # Il bordo del canvas mostra l'ultimo verdetto della stazione
+            canvas = tk.Canvas(riquadro, bg="#e0e0e0", width=320, height=240,
+                               highlightthickness=4, highlightbackground=COLORE_IN_ATTESA)
+            canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+            anteprima = AnteprimaCanvas(canvas)
+            anteprima.mostra_messaggio("In attesa dei frame...")
+
+            stato = tk.StringVar(value="In attesa...")
+            ttk.Label(riquadro, textvariable=stato).pack(fill=tk.X, padx=5, pady=(0, 5))
+            self._riquadri.append((stazione, canvas, anteprima, stato))
+
+        self._job = None
+        self._ultime_sequenze = [0] * len(stazioni)
+        self.schedulatore.avvia()
+        self._aggiorna()
+
+    def _aggiorna(self):
+        for i, (stazione, canvas, anteprima, stato) in enumerate(self._riquadri):
+            acquisito = stazione.acquisitore.ultimo()
+            # Ridisegna solo se la stazione ha un frame nuovo
+            if acquisito is not None and acquisito.sequenza != self._ultime_sequenze[i]:
+                self._ultime_sequenze[i] = acquisito.sequenza
+                anteprima.mostra(acquisito.frame)
+
+            consegna = stazione.ultimo_risultato
+            if consegna is not None:
+                r = consegna.risultato
+                stato.set(f"{r.status_text}  {r.total_percent:.2f}%   "
+                          f"{stazione.completate} analisi, latenza {consegna.latenza * 1000:.0f} ms")
+                canvas.config(highlightbackground=COLORE_DIFETTATO if r.is_defective else COLORE_OK)
+            if stazione.terminata:
+                stato.set("Sorgente terminata")
+
+        self._job = self.finestra.after(1000 // FPS_GRIGLIA, self._aggiorna)
+
+    def chiudi(self):
+        """Ferma tutte le stazioni e chiude la finestra."""
+        if self._job is not None:
+            self.finestra.after_cancel(self._job)
+            self._job = None
+        self.schedulatore.ferma()
+        self.finestra.destroy()
+        if self.al_chiusura is not None:
+            self.al_chiusura()
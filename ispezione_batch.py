@@ -0,0 +1,272 @@
+"""Ispezione batch di cartelle di immagini su tutti i core, senza GUI.
+
+Esempio:
+    python riconoscitore.py batch images/ -o risultati.csv
+    python riconoscitore.py batch "archivio/**/*.jpg" -o risultati.jsonl --processi 8
+    python riconoscitore.py batch images/ --roi auto --scala 0.5 --confronta
+    python riconoscitore.py batch images/ -o risultati.db
+
+Le immagini vengono decodificate direttamente in grigio; con --scala < 1
+un JPEG viene anche decodificato a 1/2, 1/4 o 1/8 della risoluzione
+(--riduzione 1 forza la decodifica completa).
+"""
+import argparse
+import concurrent.futures
+import csv
+import glob
+import json
+import os
+import sys
+import time
+
+from analizzatore import (AnalizzatoreDifetti, ROI_AUTOMATICA, SOGLIA_DIFETTI_DEFAULT,
+                          SOGLIA_SCURO_DEFAULT, SOGLIA_CHIARO_DEFAULT,
+                          confronta_con_analisi_completa)
+from caricamento import RIDUZIONI, decodifica, riduzione_compatibile, riduzione_per_scala
+from componenti import RegolaVerdetto
+from registro import RegistroRisultati
+
+# Estensioni considerate quando si passa una cartella
+ESTENSIONI_IMMAGINI = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+# Estensioni dell'output scritto nel registro SQLite invece che in un file di testo
+ESTENSIONI_REGISTRO = (".db", ".sqlite")
+
+CAMPI_RISULTATO = [
+    "percorso", "dark_percent", "bright_percent", "total_percent", "stato",
+    "soglia_difetti", "soglia_colore_scuro", "soglia_colore_chiaro", "roi", "scala",
+    "numero_difetti", "difetto_massimo", "tempo_ms",
+    "speedup", "deriva_dark", "deriva_bright", "deriva_total", "errore",
+]
+
+# Analizzatore del processo worker (creato una volta sola dall'initializer)
+_analizzatore = None
+_confronta = False
+_riduzione = 1
+
+
+def trova_immagini(percorso):
+    """Restituisce la lista ordinata delle immagini in una cartella o corrispondenti a un glob."""
+    if os.path.isdir(percorso):
+        nomi = sorted(os.listdir(percorso))
+        return [os.path.join(percorso, nome) for nome in nomi
+                if nome.lower().endswith(ESTENSIONI_IMMAGINI)]
+    return sorted(p for p in glob.glob(percorso, recursive=True) if os.path.isfile(p))
+
+
+def converti_roi(testo):
+    """Interpreta l'opzione --roi: "auto" oppure "x,y,w,h"."""
+    if testo is None or testo == ROI_AUTOMATICA:
+        return testo
+    valori = [int(v) for v in testo.split(",")]
+    if len(valori) != 4:
+        raise argparse.ArgumentTypeError("la ROI deve essere 'auto' oppure 'x,y,w,h'")
+    return tuple(valori)
+
+
+def _inizializza_worker(soglia_difetti, soglia_scuro, soglia_chiaro, roi=None, scala=1.0,
+                        confronta=False, regola=None, riduzione=1):
+    """Crea l'analizzatore del processo worker con le soglie indicate."""
+    global _analizzatore, _confronta, _riduzione
+    _analizzatore = AnalizzatoreDifetti(soglia_difetti, soglia_scuro, soglia_chiaro,
+                                        roi=roi, scala_analisi=scala, regola=regola)
+    _confronta = confronta
+    _riduzione = riduzione
+
+
+def analizza_file(percorso):
+    """Decodifica e analizza un'immagine; eseguita nei processi worker."""
+    inizio = time.perf_counter()
+    risultato = {"percorso": percorso}
+    try:
+        # L'analisi usa solo il grigio: i colori non vengono mai decodificati
+        frame = decodifica(percorso, grigio=True, riduzione=_riduzione)
+        if frame is None:
+            raise ValueError("impossibile decodificare l'immagine")
+        risultato.update(_analizzatore.analizza(frame, _riduzione).come_dizionario())
+        if _confronta:
+            # L'analisi completa richiede il frame a piena risoluzione; quella configurata
+            # si misura sul frame decodificato ridotto, come nel batch
+            completo = frame if _riduzione == 1 else decodifica(percorso, grigio=True)
+            confronto = confronta_con_analisi_completa(completo, _analizzatore, ripetizioni=1,
+                                                       frame_ridotto=frame, riduzione=_riduzione)
+            for chiave in ("speedup", "deriva_dark", "deriva_bright", "deriva_total"):
+                risultato[chiave] = confronto[chiave]
+    except Exception as e:
+        risultato["errore"] = str(e)
+    risultato["tempo_ms"] = round((time.perf_counter() - inizio) * 1000, 2)
+    return risultato
+
+
+class ScrittoreRisultati:
+    """Scrive i risultati in CSV, JSONL o nel registro SQLite (in base all'estensione)."""
+
+    def __init__(self, percorso=None):
+        self.percorso = percorso
+        self.registro = None
+        if percorso is None:
+            self.file = sys.stdout
+            self.formato = "jsonl"
+        elif percorso.lower().endswith(ESTENSIONI_REGISTRO):
+            self.file = None
+            self.formato = "sqlite"
+            self.registro = RegistroRisultati(percorso)
+        else:
+            self.file = open(percorso, "w", newline="", encoding="utf-8")
+            self.formato = "csv" if percorso.lower().endswith(".csv") else "jsonl"
+
+        self.csv_writer = None
+        if self.formato == "csv":
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=CAMPI_RISULTATO)
+            self.csv_writer.writeheader()
+
+    def scrivi(self, risultato):
+        """Scrive un risultato e svuota il buffer, così il file è utilizzabile anche durante il batch."""
+        if self.registro is not None:
+            # Le immagini non decodificabili restano solo nel riepilogo finale
+            if "errore" not in risultato:
+                self.registro.registra(risultato, sorgente=risultato["percorso"],
+                                       tempi={"totale": risultato["tempo_ms"]})
+            return
+        if self.csv_writer is not None:
+            self.csv_writer.writerow(risultato)
+        else:
+            self.file.write(json.dumps(risultato) + "\n")
+        self.file.flush()
+
+    def chiudi(self):
+        """Chiude il file di output (non chiude stdout)."""
+        if self.registro is not None:
+            self.registro.chiudi()
+        elif self.file is not sys.stdout:
+            self.file.close()
+
+
+def esegui_batch(percorsi, scrittore, soglia_difetti=SOGLIA_DIFETTI_DEFAULT,
+                 soglia_scuro=SOGLIA_SCURO_DEFAULT, soglia_chiaro=SOGLIA_CHIARO_DEFAULT,
+                 processi=None, max_in_volo=None, roi=None, scala=1.0, confronta=False,
+                 regola=None, riduzione=None):
+    """Analizza le immagini su un pool di processi e restituisce le statistiche del batch.
+
+    Al pool vengono sottoposti al massimo max_in_volo file alla volta, così la
+    memoria resta limitata anche con migliaia di immagini. riduzione è il
+    fattore di decodifica ridotta (None: il massimo compatibile con la scala).
+    """
+    if riduzione is None:
+        riduzione = riduzione_per_scala(scala)
+    elif not riduzione_compatibile(riduzione, scala):
+        raise ValueError(f"La riduzione {riduzione} scende sotto la scala di analisi {scala} "
+                         f"(massima: {riduzione_per_scala(scala)})")
+    processi = processi or os.cpu_count() or 1
+    max_in_volo = max_in_volo or processi * 2
+
+    statistiche = {"immagini": 0, "difettate": 0, "errori": 0}
+    speedup = []
+    derive = []
+    inizio = time.perf_counter()
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=processi,
+            initializer=_inizializza_worker,
+            initargs=(soglia_difetti, soglia_scuro, soglia_chiaro, roi, scala, confronta,
+                      regola, riduzione)) as pool:
+        in_volo = set()
+        percorsi = iter(percorsi)
+        esauriti = False
+
+        while in_volo or not esauriti:
+            # Riempie il pool fino al limite di file in volo
+            while not esauriti and len(in_volo) < max_in_volo:
+                percorso = next(percorsi, None)
+                if percorso is None:
+                    esauriti = True
+                else:
+                    in_volo.add(pool.submit(analizza_file, percorso))
+
+            if not in_volo:
+                break
+
+            completati, in_volo = concurrent.futures.wait(
+                in_volo, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in completati:
+                risultato = future.result()
+                scrittore.scrivi(risultato)
+
+                statistiche["immagini"] += 1
+                if "errore" in risultato:
+                    statistiche["errori"] += 1
+                elif risultato["stato"] == "DIFETTATO":
+                    statistiche["difettate"] += 1
+                if "speedup" in risultato:
+                    speedup.append(risultato["speedup"])
+                    derive.append(abs(risultato["deriva_total"]))
+
+    durata = time.perf_counter() - inizio
+    statistiche["durata_s"] = durata
+    statistiche["immagini_al_secondo"] = statistiche["immagini"] / durata if durata > 0 else 0.0
+    if speedup:
+        statistiche["speedup_medio"] = sum(speedup) / len(speedup)
+        statistiche["deriva_totale_max"] = max(derive)
+    return statistiche
+
+
+def main(argv=None):
+    """Punto di ingresso a riga di comando per l'ispezione batch."""
+    parser = argparse.ArgumentParser(
+        prog="riconoscitore.py batch",
+        description="Analizza una cartella (o un glob) di immagini di vassoi.")
+    parser.add_argument("percorso", help="cartella o pattern glob delle immagini")
+    parser.add_argument("-o", "--output",
+                        help="file dei risultati (.csv o .jsonl); se omesso, JSONL su stdout")
+    parser.add_argument("--processi", type=int, default=None,
+                        help="numero di processi worker (default: tutti i core)")
+    parser.add_argument("--soglia-difetti", type=float, default=SOGLIA_DIFETTI_DEFAULT)
+    parser.add_argument("--soglia-scuro", type=int, default=SOGLIA_SCURO_DEFAULT)
+    parser.add_argument("--soglia-chiaro", type=int, default=SOGLIA_CHIARO_DEFAULT)
+    parser.add_argument("--roi", type=converti_roi, default=None,
+                        help="regione di analisi: 'auto' (vassoio) oppure 'x,y,w,h'")
+    parser.add_argument("--scala", type=float, default=1.0,
+                        help="fattore di scala dell'analisi (es. 0.5)")
+    parser.add_argument("--riduzione", type=int, choices=RIDUZIONI, default=None,
+                        help="decodifica i JPEG a 1/N della risoluzione (default: secondo --scala)")
+    parser.add_argument("--confronta", action="store_true",
+                        help="misura speedup e deriva rispetto all'analisi completa")
+    parser.add_argument("--area-minima", type=int, default=0,
+                        help="ignora i difetti più piccoli di questa area (pixel)")
+    parser.add_argument("--area-massima", type=int, default=None,
+                        help="DIFETTATO se un singolo difetto supera questa area (pixel)")
+    parser.add_argument("--numero-massimo", type=int, default=None,
+                        help="DIFETTATO se i difetti sono più di questo numero")
+    args = parser.parse_args(argv)
+    if args.riduzione is not None and not riduzione_compatibile(args.riduzione, args.scala):
+        parser.error(f"--riduzione {args.riduzione} scende sotto --scala {args.scala} "
+                     f"(massima: {riduzione_per_scala(args.scala)})")
+    regola = RegolaVerdetto(args.area_minima, args.area_massima, args.numero_massimo)
+
+    percorsi = trova_immagini(args.percorso)
+    if not percorsi:
+        print(f"Nessuna immagine trovata in {args.percorso}", file=sys.stderr)
+        return 1
+
+    scrittore = ScrittoreRisultati(args.output)
+    try:
+        statistiche = esegui_batch(
+            percorsi, scrittore, args.soglia_difetti, args.soglia_scuro, args.soglia_chiaro,
+            processi=args.processi, roi=args.roi, scala=args.scala, confronta=args.confronta,
+            regola=regola, riduzione=args.riduzione)
+    finally:
+        scrittore.chiudi()
+
+    print(f"Analizzate {statistiche['immagini']} immagini in {statistiche['durata_s']:.2f} s "
+          f"({statistiche['immagini_al_secondo']:.2f} immagini/s). "
+          f"Difettate: {statistiche['difettate']}, errori: {statistiche['errori']}.",
+          file=sys.stderr)
+    if "speedup_medio" in statistiche:
+        print(f"Speedup medio rispetto all'analisi completa: {statistiche['speedup_medio']:.2f}x, "
+              f"deriva massima dell'area totale: {statistiche['deriva_totale_max']:.3f} punti percentuali.",
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Buffer preallocati e riutilizzabili per frame, immagini in grigio, maschere e visualizzazioni.
+
+Ogni "posto" (frame, grigio, maschera_scure, ...) conserva pochi array
+della risoluzione corrente. Un array viene riconsegnato solo quando
+nessuno lo usa più: nessun risultato, coda o vista ne tiene un
+riferimento (nemmeno tramite una vista NumPy). Le funzioni OpenCV
+scrivono direttamente nei buffer con dst=, così a regime l'analisi non
+alloca memoria per i dati dell'immagine e l'occupazione resta costante.
+
+    grigio = BUFFER.ottieni("grigio", frame.shape[:2])
+    cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=grigio)
+"""
+import os
+import sys
+import threading
+
+import numpy as np
+
+# Array conservati al massimo per ogni posto; oltre si alloca senza conservare
+MASSIMO_PER_POSTO_DEFAULT = 16
+
+# Riferimenti a un array libero: la lista del pool e l'argomento di sys.getrefcount
+_RIFERIMENTI_LIBERO = 2
+
+
+def memoria_processo_mb():
+    """Memoria residente del processo in MB (None se non disponibile)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pagine_residenti = int(f.read().split()[1])
+        return pagine_residenti * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Senza /proc si ripiega sul picco (in KB su Linux, in byte su macOS)
+    picco = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return picco / (1024 * 1024) if sys.platform == "darwin" else picco / 1024
+
+
+class PoolBuffer:
+    """Array NumPy riutilizzabili, raggruppati per posto e dimensionati alla risoluzione corrente."""
+
+    def __init__(self, massimo_per_posto=MASSIMO_PER_POSTO_DEFAULT, abilitato=True):
+        self.massimo_per_posto = massimo_per_posto
+        self.abilitato = abilitato
+        self._posti = {}
+        self._lock = threading.Lock()
+        self.allocazioni = 0
+        self.riusi = 0
+        self.fuori_pool = 0
+
+    def ottieni(self, posto, forma, dtype=np.uint8):
+        """Restituisce un array libero della forma indicata (con contenuto non inizializzato)."""
+        forma = tuple(forma)
+        if not self.abilitato:
+            return np.empty(forma, dtype)
+        dtype = np.dtype(dtype)
+        with self._lock:
+            buffer = self._posti.setdefault(posto, [])
+            # Cambio di risoluzione: gli array liberi della forma precedente vengono rilasciati
+            for i in reversed(range(len(buffer))):
+                if ((buffer[i].shape != forma or buffer[i].dtype != dtype) and
+                        sys.getrefcount(buffer[i]) == _RIFERIMENTI_LIBERO):
+                    del buffer[i]
+            for i in range(len(buffer)):
+                if (sys.getrefcount(buffer[i]) == _RIFERIMENTI_LIBERO and
+                        buffer[i].shape == forma and buffer[i].dtype == dtype):
+                    self.riusi += 1
+                    return buffer[i]
+
+            array = np.empty(forma, dtype)
+            if len(buffer) < self.massimo_per_posto:
+                buffer.append(array)
+                self.allocazioni += 1
+            else:
+                # Troppi array ancora in uso (code lunghe): questo non viene conservato
+                self.fuori_pool += 1
+            return array
+
+    def svuota(self):
+        """Rilascia tutti i buffer (quelli ancora in uso restano validi per chi li tiene)."""
+        with self._lock:
+            self._posti = {}
+
+    @property
+    def byte_totali(self):
+        with self._lock:
+            return sum(a.nbytes for buffer in self._posti.values() for a in buffer)
+
+    def statistiche(self):
+        """Occupazione del pool e della memoria del processo, allocazioni e riusi."""
+        with self._lock:
+            posti = {posto: len(buffer) for posto, buffer in self._posti.items()}
+        memoria = memoria_processo_mb()
+        return {
+            "buffer_mb": round(self.byte_totali / (1024 * 1024), 2),
+            "buffer_per_posto": posti,
+            "allocazioni": self.allocazioni,
+            "riusi": self.riusi,
+            "fuori_pool": self.fuori_pool,
+            "memoria_processo_mb": round(memoria, 1) if memoria is not None else None,
+        }
+
+
+# Pool condiviso da acquisizione, analisi e visualizzazioni
+BUFFER = PoolBuffer()
@@ -0,0 +1,168 @@
+"""Pipeline produttore/consumatore per l'analisi dei frame.
+
+Cattura -> coda limitata (scarta i frame più vecchi) -> pool fisso di worker
+-> stadio dei risultati. Se l'analisi è più lenta della cattura i frame in
+eccesso vengono scartati, così la latenza resta costante invece di crescere.
+"""
+import collections
+import threading
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from strumentazione import PROFILATORE
+
+
+@dataclass
+class FrameInAnalisi:
+    """Frame inviato alla pipeline, con numero di sequenza e istante di cattura."""
+    sequenza: int
+    timestamp: float
+    frame: np.ndarray = field(repr=False)
+
+
+@dataclass
+class RisultatoPipeline:
+    """Risultato dell'analisi legato al frame da cui è stato prodotto."""
+    sequenza: int
+    timestamp: float
+    latenza: float
+    frame: np.ndarray = field(repr=False)
+    risultato: object = field(repr=False)
+
+
+class CodaLimitata:
+    """Coda thread-safe di capacità fissa: quando è piena scarta l'elemento più vecchio."""
+
+    def __init__(self, capacita):
+        self._elementi = collections.deque()
+        self._capacita = capacita
+        self._condizione = threading.Condition()
+        self._chiusa = False
+        self.scartati = 0
+
+    def inserisci(self, elemento):
+        """Inserisce un elemento; restituisce l'elemento scartato (o None)."""
+        with self._condizione:
+            scartato = None
+            if len(self._elementi) >= self._capacita:
+                scartato = self._elementi.popleft()
+                self.scartati += 1
+            self._elementi.append(elemento)
+            self._condizione.notify()
+            return scartato
+
+    def preleva(self, timeout=None):
+        """Preleva l'elemento più vecchio; restituisce None se la coda è chiusa e vuota o scade il timeout."""
+        with self._condizione:
+            if not self._condizione.wait_for(lambda: self._elementi or self._chiusa, timeout):
+                return None
+            if not self._elementi:
+                return None
+            return self._elementi.popleft()
+
+    def chiudi(self, svuota=True):
+        """Chiude la coda e sveglia tutti i consumatori in attesa.
+
+        Con svuota=False gli elementi già in coda restano prelevabili.
+        """
+        with self._condizione:
+            self._chiusa = True
+            if svuota:
+                self._elementi.clear()
+            self._condizione.notify_all()
+
+    @property
+    def chiusa(self):
+        return self._chiusa
+
+    def __len__(self):
+        with self._condizione:
+            return len(self._elementi)
+
+
+class PipelineAnalisi:
+    """Analizza i frame su un numero fisso di worker e consegna i risultati in ordine.
+
+    analizza(frame) viene eseguita nei worker; al_risultato(RisultatoPipeline)
+    viene chiamata dal worker che ha terminato. I risultati più vecchi
+    dell'ultimo già consegnato vengono scartati. al_risultato deve essere
+    rapida (ad esempio root.after), perché viene eseguita sotto lock.
+    """
+
+    def __init__(self, analizza, al_risultato, num_worker=2, capacita=2, al_errore=None):
+        self.analizza = analizza
+        self.al_risultato = al_risultato
+        self.al_errore = al_errore
+        self.num_worker = num_worker
+        self.coda = CodaLimitata(capacita)
+
+        self._workers = []
+        self._lock = threading.Lock()
+        self._sequenza = 0
+        self._ultima_consegnata = -1
+        self.completati = 0
+        self.superati = 0
+
+    def avvia(self):
+        """Avvia i thread worker."""
+        for i in range(self.num_worker):
+            worker = threading.Thread(target=self._ciclo_worker, name=f"analisi-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def ferma(self, timeout=1.0):
+        """Chiude la coda e attende la fine dei worker."""
+        self.coda.chiudi()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def invia(self, frame, timestamp=None):
+        """Accoda un frame per l'analisi e restituisce il suo numero di sequenza."""
+        with self._lock:
+            sequenza = self._sequenza
+            self._sequenza += 1
+        if timestamp is None:
+            timestamp = time.time()
+        if self.coda.inserisci(FrameInAnalisi(sequenza, timestamp, frame)) is not None:
+            PROFILATORE.evento("frame_scartati")
+        return sequenza
+
+    @property
+    def scartati(self):
+        """Frame scartati perché la coda era piena."""
+        return self.coda.scartati
+
+    def _ciclo_worker(self):
+        while True:
+            lavoro = self.coda.preleva()
+            if lavoro is None:
+                return
+
+            try:
+                with PROFILATORE.stadio("analisi"):
+                    risultato = self.analizza(lavoro.frame)
+            except Exception as e:
+                if self.al_errore is not None:
+                    self.al_errore(e)
+                continue
+
+            # La consegna avviene sotto lock perché i risultati arrivino in ordine
+            with self._lock:
+                # Un worker più veloce ha già consegnato un frame più recente
+                if lavoro.sequenza < self._ultima_consegnata:
+                    self.superati += 1
+                    continue
+                self._ultima_consegnata = lavoro.sequenza
+                self.completati += 1
+                PROFILATORE.evento("analisi_completate")
+
+                self.al_risultato(RisultatoPipeline(
+                    sequenza=lavoro.sequenza,
+                    timestamp=lavoro.timestamp,
+                    latenza=time.time() - lavoro.timestamp,
+                    frame=lavoro.frame,
+                    risultato=risultato,
+                ))
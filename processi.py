@@ -0,0 +1,590 @@
+"""Analisi in processi worker separati, con i frame scambiati in memoria condivisa.
+
+Con l'analisi nei thread del processo della GUI le parti in Python
+(indicizzazione dell'overlay, testi, dizionari, callback di Tk) si
+contendono il GIL con acquisizione e interfaccia. Qui l'analisi gira in
+processi worker: l'acquisizione scrive ogni frame una sola volta in un
+blocco di un anello di memoria condivisa (multiprocessing.shared_memory),
+il worker lo legge sul posto e scrive nello stesso blocco, dopo il frame,
+immagine in grigio, maschere e vista richiesta. Tra i processi viaggiano
+solo nome del blocco, posizioni, forme e valori numerici: nessun array da
+megabyte viene serializzato con pickle.
+
+Come i buffer di memoria.PoolBuffer, un blocco torna libero quando nessuno
+tiene più un riferimento al frame o ai risultati che contiene (frame in
+coda o in analisi, risultato mostrato, evidenza da salvare...).
+"""
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from multiprocessing import connection, shared_memory
+
+import cv2
+import numpy as np
+
+from analizzatore import AnalizzatoreDifetti, RisultatoAnalisi
+from memoria import BUFFER
+from pipeline import CodaLimitata, FrameInAnalisi, RisultatoPipeline
+from strumentazione import PROFILATORE
+from viste import VisteAnalisi
+
+# Processi worker predefiniti: tutti i core tranne quello di interfaccia e acquisizione
+NUM_PROCESSI_DEFAULT = max(1, (os.cpu_count() or 1) - 1)
+
+# Blocchi oltre a quelli in coda e in analisi: frame in scrittura, ultimo
+# frame acquisito, risultato mostrato ed evidenza da salvare
+BLOCCHI_AGGIUNTIVI = 4
+
+# Byte per pixel riservati dopo il frame alle uscite del worker: grigio,
+# grigio ridotto, tre maschere e una vista BGR
+BYTE_USCITE_PER_PIXEL = 8
+
+# Uscite dell'analizzatore e delle viste scritte nel blocco del frame (le altre restano nel worker)
+POSTI_CONDIVISI = ("grigio", "grigio_scalato", "maschera_scure", "maschera_chiare",
+                   "maschera_combinata", "vista")
+
+ALLINEAMENTO = 64
+
+# Blocchi a cui un worker resta collegato (quelli di risoluzioni precedenti vengono chiusi)
+BLOCCHI_COLLEGATI_MASSIMI = 32
+
+# Attesa massima del thread di ricezione prima di ricontrollare se la pipeline è stata fermata
+ATTESA_CONTROLLO_WORKER = 0.5
+
+# Riferimenti a un blocco libero: l'attributo del blocco e l'argomento di sys.getrefcount
+_RIFERIMENTI_LIBERO = 2
+
+
+def _allinea(posizione):
+    return -(-posizione // ALLINEAMENTO) * ALLINEAMENTO
+
+
+def dimensione_blocco(forma, dtype=np.uint8):
+    """Byte necessari per un frame della forma indicata e per le uscite della sua analisi."""
+    pixel = forma[0] * forma[1]
+    frame = int(np.prod(forma)) * np.dtype(dtype).itemsize
+    return _allinea(frame) + pixel * BYTE_USCITE_PER_PIXEL + ALLINEAMENTO * len(POSTI_CONDIVISI)
+
+
+def impostazioni_analizzatore(analizzatore):
+    """Soglie e parametri dell'analizzatore da inviare ai worker (senza buffer né thread)."""
+    return {
+        "soglia_difetti": analizzatore.soglia_difetti,
+        "soglia_colore_scuro": analizzatore.soglia_colore_scuro,
+        "soglia_colore_chiaro": analizzatore.soglia_colore_chiaro,
+        "roi": analizzatore.roi,
+        "scala_analisi": analizzatore.scala_analisi,
+        "regola": analizzatore.regola,
+        "dimensione_kernel": analizzatore.kernel.shape[0],
+    }
+
+
+def applica_impostazioni(analizzatore, impostazioni):
+    """Applica all'analizzatore del worker le impostazioni ricevute."""
+    analizzatore.soglia_difetti = impostazioni["soglia_difetti"]
+    analizzatore.soglia_colore_scuro = impostazioni["soglia_colore_scuro"]
+    analizzatore.soglia_colore_chiaro = impostazioni["soglia_colore_chiaro"]
+    analizzatore.roi = impostazioni["roi"]
+    analizzatore.scala_analisi = impostazioni["scala_analisi"]
+    analizzatore.regola = impostazioni["regola"]
+    analizzatore.imposta_kernel(impostazioni["dimensione_kernel"])
+
+
+class _ArrayBlocco(np.ndarray):
+    """Vista uint8 piatta di un blocco, che tiene in vita la sua SharedMemory.
+
+    Gli array NumPy non trattengono il buffer esportato: ogni vista ricavata
+    da questo array ne tiene un riferimento, così la SharedMemory (e la sua
+    mappatura) non può sparire finché esistono array sul blocco.
+    """
+
+
+class _Blocco:
+    """Blocco di memoria condivisa con la sua vista uint8 piatta."""
+
+    __slots__ = ("memoria", "array")
+
+    def __init__(self, memoria):
+        self.memoria = memoria
+        self.array = np.ndarray((memoria.size,), np.uint8, buffer=memoria.buf).view(_ArrayBlocco)
+        self.array.memoria = memoria
+
+    @property
+    def nome(self):
+        return self.memoria.name
+
+    def vista(self, offset, forma, dtype=np.uint8, passi=None):
+        """Array della forma indicata da offset in poi (passi: strides, se non contiguo)."""
+        dtype = np.dtype(dtype)
+        # Lo slice risale a self.array, che tiene in vita la SharedMemory; np.asarray
+        # ne fa un ndarray normale per OpenCV e per il resto del codice
+        if passi is None:
+            dimensione = int(np.prod(forma)) * dtype.itemsize
+            return np.asarray(self.array[offset:offset + dimensione]).view(dtype).reshape(forma)
+        estensione = sum((n - 1) * p for n, p in zip(forma, passi)) + dtype.itemsize
+        regione = np.asarray(self.array[offset:offset + estensione]).view(dtype)
+        return np.lib.stride_tricks.as_strided(regione, forma, passi)
+
+    def stacca(self):
+        """Rilascia il blocco: subito se è libero, altrimenti con l'ultimo array che lo usa."""
+        libero = sys.getrefcount(self.array) == _RIFERIMENTI_LIBERO
+        self.array = None
+        if libero:
+            self.memoria.close()
+
+    def chiudi(self):
+        """Stacca e rimuove il blocco (resta valido per chi ne tiene ancora un array)."""
+        self.stacca()
+        try:
+            self.memoria.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _posizione_in(array, blocco):
+    """Offset di array nel blocco (None se array non è contenuto nel blocco)."""
+    inizio = blocco.array.__array_interface__["data"][0]
+    indirizzo = array.__array_interface__["data"][0]
+    if inizio <= indirizzo and indirizzo + array.nbytes <= inizio + blocco.array.size:
+        return indirizzo - inizio
+    return None
+
+
+class AnelloCondiviso:
+    """Blocchi di memoria condivisa per i frame, riutilizzati quando nessuno li usa più.
+
+    Si usa come un PoolBuffer (ottieni(posto, forma)), ad esempio come buffer
+    di AcquisitoreFrame: il frame viene scritto direttamente nella memoria
+    che i worker leggeranno. Va usato solo dal processo che lo ha creato.
+    """
+
+    def __init__(self, numero_blocchi):
+        self.numero_blocchi = numero_blocchi
+        self._blocchi = []
+        self._lock = threading.Lock()
+        self.allocazioni = 0
+        self.riusi = 0
+        self.fuori_anello = 0
+
+    def ottieni(self, posto, forma, dtype=np.uint8):
+        """Array non inizializzato all'inizio di un blocco libero (privato se sono tutti occupati)."""
+        forma = tuple(forma)
+        dtype = np.dtype(dtype)
+        necessari = dimensione_blocco(forma, dtype)
+        with self._lock:
+            liberi = [b for b in self._blocchi if sys.getrefcount(b.array) == _RIFERIMENTI_LIBERO]
+            adatti = [b for b in liberi if b.array.size >= necessari]
+            if adatti:
+                self.riusi += 1
+                return adatti[0].vista(0, forma, dtype)
+
+            if liberi:
+                # Cambio di risoluzione: il blocco libero troppo piccolo viene sostituito
+                self._blocchi.remove(liberi[0])
+                liberi[0].chiudi()
+            elif len(self._blocchi) >= self.numero_blocchi:
+                self.fuori_anello += 1
+                return np.empty(forma, dtype)
+            blocco = _Blocco(shared_memory.SharedMemory(create=True, size=necessari))
+            self._blocchi.append(blocco)
+            self.allocazioni += 1
+            return blocco.vista(0, forma, dtype)
+
+    def posizione(self, array):
+        """(nome del blocco, offset) di un array contiguo contenuto nell'anello, altrimenti None."""
+        if not array.flags.c_contiguous:
+            return None
+        with self._lock:
+            for blocco in self._blocchi:
+                offset = _posizione_in(array, blocco)
+                if offset is not None:
+                    return blocco.nome, offset
+        return None
+
+    def copia(self, frame):
+        """Copia il frame in un blocco libero; None se l'anello è tutto occupato."""
+        destinazione = self.ottieni("frame", frame.shape, frame.dtype)
+        if self.posizione(destinazione) is None:
+            return None
+        np.copyto(destinazione, frame)
+        return destinazione
+
+    def vista(self, nome, offset, forma, dtype=np.uint8, passi=None):
+        """Array scritto da un worker nel blocco indicato."""
+        with self._lock:
+            blocco = next(b for b in self._blocchi if b.nome == nome)
+        return blocco.vista(offset, forma, dtype, passi)
+
+    def chiudi(self):
+        """Chiude e rimuove tutti i blocchi (quelli ancora in uso restano validi per chi li tiene)."""
+        with self._lock:
+            for blocco in self._blocchi:
+                blocco.chiudi()
+            self._blocchi = []
+
+    def statistiche(self):
+        with self._lock:
+            byte = sum(b.array.size for b in self._blocchi)
+            blocchi = len(self._blocchi)
+        return {
+            "blocchi": blocchi,
+            "memoria_condivisa_mb": round(byte / (1024 * 1024), 2),
+            "allocazioni": self.allocazioni,
+            "riusi": self.riusi,
+            "fuori_anello": self.fuori_anello,
+        }
+
+
+class _UsciteCondivise:
+    """Buffer dell'analizzatore nel worker: le uscite da restituire vanno nel blocco del frame."""
+
+    def __init__(self, blocco, inizio):
+        self.blocco = blocco
+        self.libero = _allinea(inizio)
+
+    def ottieni(self, posto, forma, dtype=np.uint8):
+        forma = tuple(forma)
+        dtype = np.dtype(dtype)
+        if posto in POSTI_CONDIVISI:
+            dimensione = int(np.prod(forma)) * dtype.itemsize
+            if self.libero + dimensione <= self.blocco.array.size:
+                array = self.blocco.vista(self.libero, forma, dtype)
+                self.libero = _allinea(self.libero + dimensione)
+                return array
+        return BUFFER.ottieni(posto, forma, dtype)
+
+    def descrivi(self, array):
+        """Descrizione da inviare al processo principale: posizione nel blocco o l'array stesso."""
+        offset = _posizione_in(array, self.blocco)
+        if offset is None:
+            # Uscita fuori dal blocco (raro): viaggia serializzata
+            return ("locale", np.array(array))
+        return ("condiviso", offset, array.shape, array.dtype.str, array.strides)
+
+
+def _collega(blocchi, nome):
+    """Blocco già collegato nel worker o nuovo collegamento (staccando i più vecchi)."""
+    blocco = blocchi.pop(nome, None)
+    if blocco is None:
+        blocco = _Blocco(shared_memory.SharedMemory(name=nome))
+        while len(blocchi) >= BLOCCHI_COLLEGATI_MASSIMI:
+            blocchi.pop(next(iter(blocchi))).stacca()
+    blocchi[nome] = blocco
+    return blocco
+
+
+def _analizza_nel_blocco(analizzatore, blocco, offset, forma, dtype, impostazioni, vista):
+    """Analizza il frame sul posto e descrive le uscite scritte nello stesso blocco."""
+    inizio = time.perf_counter()
+    frame = blocco.vista(offset, forma, dtype)
+    uscite = _UsciteCondivise(blocco, offset + frame.nbytes)
+    applica_impostazioni(analizzatore, impostazioni)
+    analizzatore.buffer = uscite
+    risultato = analizzatore.analizza(frame)
+
+    viste_pronte = {}
+    if vista is not None:
+        inizio_viste = time.perf_counter()
+        viste_pronte[vista] = uscite.descrivi(VisteAnalisi(frame, risultato, uscite)[vista])
+        # Tabella dei difetti (riusa i contorni della vista appena generata)
+        risultato.difetti
+        risultato.tempi["viste"] = (time.perf_counter() - inizio_viste) * 1000
+
+    return {
+        "dark_percent": risultato.dark_percent,
+        "bright_percent": risultato.bright_percent,
+        "total_percent": risultato.total_percent,
+        "is_defective": risultato.is_defective,
+        "roi": risultato.roi,
+        "scala": risultato.scala,
+        "kernel": risultato.kernel,
+        "tempi": risultato.tempi,
+        "gray_image": uscite.descrivi(risultato.gray_image),
+        "maschere": {nome: uscite.descrivi(m) for nome, m in risultato._maschere.items()},
+        "difetti": risultato._difetti,
+        "viste": viste_pronte,
+        "durata": time.perf_counter() - inizio,
+    }
+
+
+def _ciclo_worker(compiti, risultati):
+    """Corpo dei processi worker: analizza i frame ricevuti sulla sua pipe fino a None."""
+    # Il parallelismo viene dai processi: i thread interni di OpenCV si pesterebbero i piedi
+    cv2.setNumThreads(1)
+    analizzatore = AnalizzatoreDifetti()
+    blocchi = {}
+    while True:
+        try:
+            compito = compiti.recv()
+        except EOFError:
+            break
+        if compito is None:
+            break
+        sequenza, nome, offset, forma, dtype, impostazioni, vista = compito
+        try:
+            esito = _analizza_nel_blocco(analizzatore, _collega(blocchi, nome), offset, forma,
+                                         np.dtype(dtype), impostazioni, vista)
+        except Exception as e:
+            risultati.send((sequenza, None, f"{type(e).__name__}: {e}"))
+        else:
+            risultati.send((sequenza, esito, None))
+    for blocco in blocchi.values():
+        blocco.stacca()
+
+
+class _Worker:
+    """Processo worker con le sue pipe e il compito che sta analizzando (None se libero)."""
+
+    __slots__ = ("processo", "compiti", "risultati", "sequenza")
+
+    def __init__(self, contesto, nome):
+        ricezione_compiti, self.compiti = contesto.Pipe(duplex=False)
+        self.risultati, invio_risultati = contesto.Pipe(duplex=False)
+        self.processo = contesto.Process(target=_ciclo_worker, args=(ricezione_compiti, invio_risultati),
+                                         name=nome, daemon=True)
+        self.processo.start()
+        # Le estremità del worker restano solo nel worker: la sua morte chiude le pipe
+        ricezione_compiti.close()
+        invio_risultati.close()
+        self.sequenza = None
+
+    def chiudi(self, timeout):
+        try:
+            self.compiti.send(None)
+        except OSError:
+            pass
+        self.processo.join(timeout)
+        if self.processo.is_alive():
+            self.processo.terminate()
+            self.processo.join(timeout)
+        self.compiti.close()
+        self.risultati.close()
+
+
+class PipelineProcessi:
+    """Come pipeline.PipelineAnalisi, ma l'analisi gira in processi worker.
+
+    I frame che non sono già in un blocco dell'anello vengono copiati in uno
+    libero (o scartati se sono tutti occupati). Le impostazioni
+    dell'analizzatore vengono lette a ogni invio a un worker, così le
+    modifiche alle soglie valgono dal frame successivo. Con vista (funzione
+    che restituisce il nome della vista da preparare) il risultato
+    consegnato è un VisteAnalisi con quella vista già generata dal worker,
+    altrimenti un RisultatoAnalisi. al_risultato viene chiamata dal thread
+    di ricezione e deve essere rapida (ad esempio root.after).
+    """
+
+    def __init__(self, analizzatore, al_risultato, num_worker=NUM_PROCESSI_DEFAULT, capacita=2,
+                 al_errore=None, vista=None):
+        self.analizzatore = analizzatore
+        self.al_risultato = al_risultato
+        self.al_errore = al_errore
+        self.vista = vista
+        self.num_worker = num_worker
+        self.coda = CodaLimitata(capacita)
+        self.anello = AnelloCondiviso(num_worker + capacita + BLOCCHI_AGGIUNTIVI)
+
+        # spawn: il processo della GUI ha già thread attivi, che fork non duplicherebbe
+        self._contesto = multiprocessing.get_context("spawn")
+        # Ogni worker ha le sue pipe: un worker che muore non può bloccare gli altri
+        self._worker = []
+        self._avviati = 0
+        self._thread = []
+        self._attivo = False
+        # Worker liberi: un compito per worker alla volta, gli altri frame
+        # attendono (e si scartano) nella coda limitata
+        self._liberi = threading.Semaphore(num_worker)
+
+        self._lock = threading.Lock()
+        self._sequenza = 0
+        self._in_volo = {}
+        self._ultima_consegnata = -1
+        self.completati = 0
+        self.superati = 0
+        self.senza_blocco = 0
+
+    def avvia(self):
+        """Avvia i processi worker e i thread di invio e ricezione."""
+        self._attivo = True
+        for _ in range(self.num_worker):
+            self._worker.append(self._nuovo_worker())
+        for nome, ciclo in (("invio-processi", self._ciclo_invio),
+                            ("ricezione-processi", self._ciclo_ricezione)):
+            thread = threading.Thread(target=ciclo, name=nome, daemon=True)
+            thread.start()
+            self._thread.append(thread)
+
+    def _nuovo_worker(self):
+        self._avviati += 1
+        return _Worker(self._contesto, f"analisi-{self._avviati}")
+
+    def ferma(self, timeout=1.0):
+        """Ferma worker e thread e rilascia la memoria condivisa."""
+        self._attivo = False
+        self.coda.chiudi()
+        for _ in range(self.num_worker):
+            self._liberi.release()
+        for thread in self._thread:
+            thread.join(timeout)
+        self._thread = []
+        for worker in self._worker:
+            worker.chiudi(timeout)
+        self._worker = []
+        with self._lock:
+            self._in_volo.clear()
+        self.anello.chiudi()
+
+    def invia(self, frame, timestamp=None):
+        """Accoda un frame per l'analisi e restituisce il suo numero di sequenza."""
+        with self._lock:
+            sequenza = self._sequenza
+            self._sequenza += 1
+        if timestamp is None:
+            timestamp = time.time()
+        if self.anello.posizione(frame) is None:
+            # Frame acquisito fuori dall'anello (ad esempio il primo): lo si copia una volta
+            frame = self.anello.copia(frame)
+            if frame is None:
+                self.senza_blocco += 1
+                PROFILATORE.evento("frame_scartati")
+                return sequenza
+        if self.coda.inserisci(FrameInAnalisi(sequenza, timestamp, frame)) is not None:
+            PROFILATORE.evento("frame_scartati")
+        return sequenza
+
+    @property
+    def scartati(self):
+        """Frame scartati perché la coda era piena o non c'erano blocchi liberi."""
+        return self.coda.scartati + self.senza_blocco
+
+    def _ciclo_invio(self):
+        while True:
+            self._liberi.acquire()
+            lavoro = self.coda.preleva()
+            if lavoro is None or not self._attivo:
+                return
+            nome, offset = self.anello.posizione(lavoro.frame)
+            impostazioni = impostazioni_analizzatore(self.analizzatore)
+            vista = self.vista() if self.vista is not None else None
+            # Il lavoro in volo trattiene il blocco: non può essere riusato durante l'analisi
+            with self._lock:
+                # Il semaforo garantisce che almeno un worker sia libero
+                worker = next(w for w in self._worker if w.sequenza is None)
+                worker.sequenza = lavoro.sequenza
+                self._in_volo[lavoro.sequenza] = (lavoro, nome, impostazioni)
+            try:
+                worker.compiti.send((lavoro.sequenza, nome, offset, lavoro.frame.shape,
+                                     lavoro.frame.dtype.str, impostazioni, vista))
+            except OSError:
+                # Worker appena morto: il thread di ricezione fallisce il suo compito
+                pass
+
+    def _ciclo_ricezione(self):
+        while self._attivo:
+            with self._lock:
+                attesi = {}
+                for worker in self._worker:
+                    attesi[worker.risultati] = worker
+                    attesi[worker.processo.sentinel] = worker
+            for pronto in connection.wait(list(attesi), ATTESA_CONTROLLO_WORKER):
+                worker = attesi[pronto]
+                if pronto is worker.risultati:
+                    try:
+                        messaggio = worker.risultati.recv()
+                    except (EOFError, OSError):
+                        continue  # Il worker è morto: se ne occupa il controllo del sentinel
+                    self._ricevi(worker, *messaggio)
+                elif worker in self._worker:
+                    self._sostituisci(worker)
+
+    def _libera(self, worker):
+        """Toglie il compito al worker e restituisce il lavoro in volo corrispondente."""
+        with self._lock:
+            in_volo = self._in_volo.pop(worker.sequenza, None)
+            worker.sequenza = None
+        self._liberi.release()
+        return in_volo
+
+    def _ricevi(self, worker, sequenza, esito, errore):
+        in_volo = self._libera(worker)
+        if in_volo is None:
+            return
+        lavoro, nome, impostazioni = in_volo
+        if errore is not None:
+            if self.al_errore is not None:
+                self.al_errore(RuntimeError(errore))
+            return
+
+        PROFILATORE.registra("analisi", esito["durata"])
+        risultato = self._ricostruisci(lavoro.frame, nome, esito, impostazioni)
+        with self._lock:
+            # Un worker più veloce ha già consegnato un frame più recente
+            if lavoro.sequenza < self._ultima_consegnata:
+                self.superati += 1
+                return
+            self._ultima_consegnata = lavoro.sequenza
+            self.completati += 1
+        PROFILATORE.evento("analisi_completate")
+
+        self.al_risultato(RisultatoPipeline(
+            sequenza=lavoro.sequenza,
+            timestamp=lavoro.timestamp,
+            latenza=time.time() - lavoro.timestamp,
+            frame=lavoro.frame,
+            risultato=risultato,
+        ))
+
+    def _sostituisci(self, worker):
+        """Sostituisce un worker terminato in modo anomalo e fallisce il compito che stava analizzando."""
+        # Un risultato inviato appena prima di morire è ancora valido
+        try:
+            while worker.risultati.poll():
+                self._ricevi(worker, *worker.risultati.recv())
+        except (EOFError, OSError):
+            pass
+        worker.processo.join(ATTESA_CONTROLLO_WORKER)
+        messaggio = f"Processo di analisi {worker.processo.name} terminato (codice {worker.processo.exitcode})"
+        sostituto = self._nuovo_worker()
+        with self._lock:
+            self._worker[self._worker.index(worker)] = sostituto
+            aveva_compito = worker.sequenza is not None
+        if aveva_compito:
+            # Il frame che stava analizzando non tornerà più: il lavoro fallisce e il posto si libera
+            in_volo = self._libera(worker)
+            if in_volo is not None:
+                messaggio += f" durante l'analisi del frame {in_volo[0].sequenza}"
+        worker.chiudi(0)
+        if self.al_errore is not None:
+            self.al_errore(RuntimeError(messaggio))
+
+    def _ricostruisci(self, frame, nome, esito, impostazioni):
+        """RisultatoAnalisi (o VisteAnalisi) con le immagini lette sul posto dal blocco."""
+        def array(descrizione):
+            if descrizione[0] == "locale":
+                return descrizione[1]
+            _, offset, forma, dtype, passi = descrizione
+            return self.anello.vista(nome, offset, forma, np.dtype(dtype), passi)
+
+        risultato = RisultatoAnalisi(
+            dark_percent=esito["dark_percent"],
+            bright_percent=esito["bright_percent"],
+            total_percent=esito["total_percent"],
+            is_defective=esito["is_defective"],
+            soglia_difetti=impostazioni["soglia_difetti"],
+            soglia_colore_scuro=impostazioni["soglia_colore_scuro"],
+            soglia_colore_chiaro=impostazioni["soglia_colore_chiaro"],
+            gray_image=array(esito["gray_image"]),
+            kernel=esito["kernel"],
+            roi=esito["roi"],
+            scala=esito["scala"],
+            regola=impostazioni["regola"],
+            tempi=esito["tempi"],
+            _maschere={nome_maschera: array(d) for nome_maschera, d in esito["maschere"].items()},
+            _difetti=esito["difetti"],
+        )
+        if self.vista is None:
+            return risultato
+        viste_pronte = {vista: array(d) for vista, d in esito["viste"].items()}
+        return VisteAnalisi(frame, risultato, viste_pronte=viste_pronte)
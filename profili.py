@@ -0,0 +1,218 @@
+"""Profili di ispezione (per prodotto o tipo di legno) letti da un file JSON.
+
+Un profilo raccoglie soglie, kernel, regione e scala di analisi, regola
+del verdetto, telecamera e intervallo dell'analisi automatica. Il file
+viene riletto solo quando cambia la data di modifica, e applicare un
+profilo ricostruisce il kernel solo se ne cambia la dimensione: cambiare
+prodotto sulla linea richiede una frazione di millisecondo.
+
+Formato del file:
+    {
+      "attivo": "abete",
+      "profili": {
+        "abete": {"soglia_difetti": 5.0, "soglia_colore_scuro": 50, ...},
+        "noce":  {"soglia_colore_scuro": 35, "dimensione_kernel": 7}
+      }
+    }
+I campi omessi prendono i valori predefiniti.
+"""
+import dataclasses
+import json
+import os
+from dataclasses import dataclass
+
+from analizzatore import (DIMENSIONE_KERNEL_DEFAULT, ROI_AUTOMATICA, SOGLIA_CHIARO_DEFAULT,
+                          SOGLIA_DIFETTI_DEFAULT, SOGLIA_SCURO_DEFAULT)
+from componenti import RegolaVerdetto
+
+# File dei profili accanto allo script
+PERCORSO_PROFILI_DEFAULT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profili.json")
+
+NOME_PROFILO_DEFAULT = "predefinito"
+
+# Data di modifica iniziale: il file non è ancora stato letto
+_MAI_LETTO = object()
+
+# Tipi ammessi per i campi numerici del file (None solo dove il campo è facoltativo)
+_TIPI_CAMPI = {
+    "soglia_difetti": (int, float),
+    "soglia_colore_scuro": (int,),
+    "soglia_colore_chiaro": (int,),
+    "dimensione_kernel": (int,),
+    "scala_analisi": (int, float),
+    "area_minima": (int,),
+    "area_massima": (int, type(None)),
+    "numero_massimo": (int, type(None)),
+    "camera_index": (int,),
+    "intervallo_analisi": (int, float),
+}
+
+# Intervalli ammessi per i campi numerici: un valore fuori intervallo fallirebbe (o darebbe
+# sempre 0% o 100%) solo quando il profilo viene applicato sulla linea
+_LIMITI_CAMPI = {
+    "soglia_difetti": (lambda v: 0 <= v <= 100, "tra 0 e 100"),
+    "soglia_colore_scuro": (lambda v: 0 <= v <= 255, "tra 0 e 255"),
+    "soglia_colore_chiaro": (lambda v: 0 <= v <= 255, "tra 0 e 255"),
+    "dimensione_kernel": (lambda v: v >= 1, "almeno 1"),
+    "scala_analisi": (lambda v: 0 < v <= 1, "maggiore di 0 e al massimo 1"),
+    "area_minima": (lambda v: v >= 0, "non negativo"),
+    "area_massima": (lambda v: v is None or v >= 0, "non negativo"),
+    "numero_massimo": (lambda v: v is None or v >= 0, "non negativo"),
+    "camera_index": (lambda v: v >= 0, "non negativo"),
+    "intervallo_analisi": (lambda v: v > 0, "maggiore di 0"),
+}
+
+
+def _controlla_campi(nome, dati):
+    """Solleva ValueError se un campo del profilo ha un tipo o un valore non valido."""
+    for campo, tipi in _TIPI_CAMPI.items():
+        if campo not in dati:
+            continue
+        valore = dati[campo]
+        # bool è una sottoclasse di int, ma true/false non è un valore numerico valido
+        if isinstance(valore, bool) or not isinstance(valore, tipi):
+            raise ValueError(f"Valore non valido per {campo} nel profilo {nome}: {valore!r}")
+        valido, descrizione = _LIMITI_CAMPI[campo]
+        if not valido(valore):
+            raise ValueError(f"Valore non valido per {campo} nel profilo {nome}: {valore!r} "
+                             f"(deve essere {descrizione})")
+    roi = dati.get("roi")
+    if roi is None or roi == ROI_AUTOMATICA:
+        return
+    if (not isinstance(roi, (list, tuple)) or len(roi) != 4
+            or any(isinstance(v, bool) or not isinstance(v, int) for v in roi)):
+        raise ValueError(f"Valore non valido per roi nel profilo {nome}: {roi!r} "
+                         f"(ammessi null, \"{ROI_AUTOMATICA}\" o [x, y, w, h])")
+    if roi[2] <= 0 or roi[3] <= 0:
+        raise ValueError(f"Valore non valido per roi nel profilo {nome}: {roi!r} "
+                         f"(larghezza e altezza devono essere maggiori di 0)")
+
+
+@dataclass
+class ProfiloIspezione:
+    """Parametri di ispezione di un prodotto."""
+    nome: str = NOME_PROFILO_DEFAULT
+    soglia_difetti: float = SOGLIA_DIFETTI_DEFAULT
+    soglia_colore_scuro: int = SOGLIA_SCURO_DEFAULT
+    soglia_colore_chiaro: int = SOGLIA_CHIARO_DEFAULT
+    dimensione_kernel: int = DIMENSIONE_KERNEL_DEFAULT
+    # None (intero frame), "auto" (vassoio) oppure [x, y, w, h]
+    roi: object = None
+    scala_analisi: float = 1.0
+    area_minima: int = 0
+    area_massima: int = None
+    numero_massimo: int = None
+    camera_index: int = 0
+    intervallo_analisi: float = 1.0
+
+    @classmethod
+    def da_dizionario(cls, nome, dati):
+        """Crea un profilo dai campi del file, rifiutando quelli sconosciuti o di tipo errato."""
+        campi = {f.name for f in dataclasses.fields(cls)}
+        sconosciuti = set(dati) - campi
+        if sconosciuti:
+            raise ValueError(f"Campi sconosciuti nel profilo {nome}: {', '.join(sorted(sconosciuti))}")
+        _controlla_campi(nome, dati)
+        profilo = cls(**dict(dati, nome=nome))
+        if profilo.roi is not None and profilo.roi != ROI_AUTOMATICA:
+            profilo.roi = tuple(profilo.roi)
+        return profilo
+
+    def come_dizionario(self):
+        """Campi da salvare nel file (senza il nome, che ne è la chiave)."""
+        dati = dataclasses.asdict(self)
+        del dati["nome"]
+        if isinstance(self.roi, tuple):
+            dati["roi"] = list(self.roi)
+        return dati
+
+    @property
+    def regola(self):
+        return RegolaVerdetto(self.area_minima, self.area_massima, self.numero_massimo)
+
+    def applica(self, analizzatore):
+        """Imposta il profilo sull'analizzatore (il kernel viene ricreato solo se cambia)."""
+        analizzatore.imposta_kernel(self.dimensione_kernel)
+        analizzatore.soglia_difetti = self.soglia_difetti
+        analizzatore.soglia_colore_scuro = self.soglia_colore_scuro
+        analizzatore.soglia_colore_chiaro = self.soglia_colore_chiaro
+        analizzatore.roi = self.roi
+        analizzatore.scala_analisi = self.scala_analisi
+        analizzatore.regola = self.regola
+
+
+class FileProfili:
+    """File JSON dei profili, riletto solo quando viene modificato.
+
+    I profili vengono letti alla prima chiamata di ricarica_se_modificato().
+    """
+
+    def __init__(self, percorso=PERCORSO_PROFILI_DEFAULT):
+        self.percorso = percorso
+        self.profili = {}
+        self.attivo = None
+        self._data_modifica = _MAI_LETTO
+
+    def ricarica_se_modificato(self):
+        """Rilegge il file se è cambiato dall'ultima lettura; restituisce True se è stato riletto.
+
+        Se il file non esiste si usa il solo profilo predefinito. Un file non
+        valido solleva ValueError e lascia invariati i profili già caricati.
+        """
+        try:
+            data_modifica = os.stat(self.percorso).st_mtime_ns
+        except FileNotFoundError:
+            data_modifica = None
+        if data_modifica == self._data_modifica:
+            return False
+        # Un file non valido non viene riletto finché non cambia di nuovo
+        self._data_modifica = data_modifica
+
+        if data_modifica is None:
+            profili = {NOME_PROFILO_DEFAULT: ProfiloIspezione()}
+            attivo = NOME_PROFILO_DEFAULT
+        else:
+            with open(self.percorso, encoding="utf-8") as f:
+                try:
+                    dati = json.load(f)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"File dei profili non valido: {e}")
+            try:
+                profili = {nome: ProfiloIspezione.da_dizionario(nome, campi)
+                           for nome, campi in dati.get("profili", {}).items()}
+            except (TypeError, AttributeError) as e:
+                raise ValueError(f"File dei profili non valido: {e}")
+            if not profili:
+                profili = {NOME_PROFILO_DEFAULT: ProfiloIspezione()}
+            attivo = dati.get("attivo")
+            if attivo not in profili:
+                attivo = next(iter(profili))
+
+        self.profili = profili
+        self.attivo = attivo
+        return True
+
+    def nomi(self):
+        return list(self.profili)
+
+    def profilo(self, nome=None):
+        """Profilo con il nome indicato (quello attivo se None)."""
+        nome = nome if nome is not None else self.attivo
+        if nome not in self.profili:
+            raise KeyError(f"Profilo sconosciuto: {nome}")
+        return self.profili[nome]
+
+    def salva(self, profilo, attiva=True):
+        """Aggiunge o sostituisce un profilo e riscrive il file in modo atomico."""
+        self.profili[profilo.nome] = profilo
+        if attiva:
+            self.attivo = profilo.nome
+        dati = {
+            "attivo": self.attivo,
+            "profili": {nome: p.come_dizionario() for nome, p in self.profili.items()},
+        }
+        temporaneo = self.percorso + ".tmp"
+        with open(temporaneo, "w", encoding="utf-8") as f:
+            json.dump(dati, f, indent=2)
+        os.replace(temporaneo, self.percorso)
+        self._data_modifica = os.stat(self.percorso).st_mtime_ns
@@ -0,0 +1,271 @@
+"""Registro persistente dei risultati di ispezione su SQLite.
+
+Le analisi vengono accodate in memoria e scritte da un thread dedicato a
+lotti (una transazione ogni dimensione_lotto righe o intervallo_commit
+secondi), così chi registra non attende mai il disco. Le interrogazioni
+aprono una connessione propria in sola lettura e possono girare da
+qualunque thread; LetturaRegistro le offre senza il thread di scrittura.
+Esempio di riepilogo a riga di comando:
+    python riconoscitore.py registro risultati.db --ore 8
+"""
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from urllib.request import pathname2url
+
+from analizzatore import STATO_DIFETTATO
+
+# Righe scritte al massimo in una transazione e attesa massima prima del commit
+DIMENSIONE_LOTTO_DEFAULT = 200
+INTERVALLO_COMMIT_DEFAULT = 1.0
+
+# Analisi che possono attendere la scrittura; oltre vengono scartate
+CAPACITA_CODA_DEFAULT = 10000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analisi (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    sorgente TEXT,
+    dark_percent REAL,
+    bright_percent REAL,
+    total_percent REAL,
+    difettato INTEGER,
+    soglia_difetti REAL,
+    soglia_colore_scuro INTEGER,
+    soglia_colore_chiaro INTEGER,
+    roi TEXT,
+    scala REAL,
+    numero_difetti INTEGER,
+    difetto_massimo INTEGER,
+    tempi TEXT
+);
+CREATE INDEX IF NOT EXISTS analisi_timestamp ON analisi (timestamp);
+"""
+
+COLONNE = [
+    "timestamp", "sorgente", "dark_percent", "bright_percent", "total_percent", "difettato",
+    "soglia_difetti", "soglia_colore_scuro", "soglia_colore_chiaro", "roi", "scala",
+    "numero_difetti", "difetto_massimo", "tempi",
+]
+
+_INSERIMENTO = (f"INSERT INTO analisi ({', '.join(COLONNE)}) "
+                f"VALUES ({', '.join('?' for _ in COLONNE)})")
+
+# Fine della coda di scrittura
+_FINE = object()
+
+
+def _connetti(percorso):
+    connessione = sqlite3.connect(percorso, timeout=10.0)
+    # WAL: le letture non bloccano la scrittura; NORMAL basta con WAL e riduce i fsync
+    connessione.execute("PRAGMA journal_mode=WAL")
+    connessione.execute("PRAGMA synchronous=NORMAL")
+    return connessione
+
+
+def _connetti_in_lettura(percorso):
+    # mode=ro: un file inesistente è un errore invece di un registro vuoto appena creato
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(percorso))}?mode=ro",
+                           uri=True, timeout=10.0)
+
+
+def riga_da_risultato(dati, timestamp=None, sorgente=None, tempi=None):
+    """Converte un dizionario di RisultatoAnalisi.come_dizionario() nella riga da inserire."""
+    roi = dati.get("roi")
+    return (
+        timestamp if timestamp is not None else time.time(),
+        sorgente,
+        dati.get("dark_percent"),
+        dati.get("bright_percent"),
+        dati.get("total_percent"),
+        int(dati.get("stato") == STATO_DIFETTATO),
+        dati.get("soglia_difetti"),
+        dati.get("soglia_colore_scuro"),
+        dati.get("soglia_colore_chiaro"),
+        json.dumps(list(roi)) if roi is not None else None,
+        dati.get("scala"),
+        dati.get("numero_difetti"),
+        dati.get("difetto_massimo"),
+        json.dumps({nome: round(ms, 3) for nome, ms in tempi.items()}) if tempi else None,
+    )
+
+
+class LetturaRegistro:
+    """Interrogazioni su un registro esistente, aperto in sola lettura."""
+
+    def __init__(self, percorso):
+        self.percorso = percorso
+
+    def _interroga(self, sql, parametri=()):
+        connessione = _connetti_in_lettura(self.percorso)
+        connessione.row_factory = sqlite3.Row
+        try:
+            return [dict(riga) for riga in connessione.execute(sql, parametri)]
+        finally:
+            connessione.close()
+
+    def difettosita_oraria(self, inizio=None, fine=None):
+        """Analisi, pezzi difettati e percentuale di difettati per ogni ora (ora locale)."""
+        inizio = inizio if inizio is not None else 0
+        fine = fine if fine is not None else time.time()
+        return self._interroga("""
+            SELECT strftime('%Y-%m-%d %H:00', timestamp, 'unixepoch', 'localtime') AS ora,
+                   COUNT(*) AS analisi,
+                   SUM(difettato) AS difettati,
+                   100.0 * SUM(difettato) / COUNT(*) AS percentuale_difettati,
+                   AVG(total_percent) AS area_difettata_media
+            FROM analisi
+            WHERE timestamp >= ? AND timestamp < ?
+            GROUP BY ora
+            ORDER BY ora
+        """, (inizio, fine))
+
+    def storico_soglie(self, inizio=None, fine=None):
+        """Istanti in cui sono cambiate le soglie, con i nuovi valori."""
+        inizio = inizio if inizio is not None else 0
+        fine = fine if fine is not None else time.time()
+        return self._interroga("""
+            SELECT timestamp, soglia_difetti, soglia_colore_scuro, soglia_colore_chiaro
+            FROM (
+                SELECT timestamp, soglia_difetti, soglia_colore_scuro, soglia_colore_chiaro,
+                       LAG(soglia_difetti) OVER w AS prec_difetti,
+                       LAG(soglia_colore_scuro) OVER w AS prec_scuro,
+                       LAG(soglia_colore_chiaro) OVER w AS prec_chiaro
+                FROM analisi
+                WHERE timestamp >= ? AND timestamp < ?
+                WINDOW w AS (ORDER BY timestamp)
+            )
+            WHERE prec_difetti IS NULL
+               OR soglia_difetti != prec_difetti
+               OR soglia_colore_scuro != prec_scuro
+               OR soglia_colore_chiaro != prec_chiaro
+            ORDER BY timestamp
+        """, (inizio, fine))
+
+    def ultime(self, numero=20):
+        """Le ultime analisi registrate, dalla più recente."""
+        return self._interroga("SELECT * FROM analisi ORDER BY timestamp DESC LIMIT ?", (numero,))
+
+
+class RegistroRisultati(LetturaRegistro):
+    """Archivio append-only delle analisi con scrittura in background a lotti."""
+
+    def __init__(self, percorso, dimensione_lotto=DIMENSIONE_LOTTO_DEFAULT,
+                 intervallo_commit=INTERVALLO_COMMIT_DEFAULT, capacita=CAPACITA_CODA_DEFAULT):
+        super().__init__(percorso)
+        self.dimensione_lotto = dimensione_lotto
+        self.intervallo_commit = intervallo_commit
+        self._coda = queue.Queue(capacita)
+        self.scartati = 0
+        self.scritti = 0
+        self.al_errore = None
+
+        # Crea lo schema subito, così gli errori di percorso emergono all'apertura
+        connessione = _connetti(percorso)
+        with connessione:
+            connessione.executescript(SCHEMA)
+        connessione.close()
+
+        self._thread = threading.Thread(target=self._ciclo_scrittura, name="registro", daemon=True)
+        self._thread.start()
+
+    def registra(self, dati, timestamp=None, sorgente=None, tempi=None):
+        """Accoda un risultato (dizionario di come_dizionario()) senza attendere la scrittura."""
+        try:
+            self._coda.put_nowait(riga_da_risultato(dati, timestamp, sorgente, tempi))
+        except queue.Full:
+            self.scartati += 1
+
+    def chiudi(self, timeout=5.0):
+        """Scrive le analisi ancora in coda e ferma il thread di scrittura."""
+        self._coda.put(_FINE)
+        self._thread.join(timeout)
+
+    def _ciclo_scrittura(self):
+        connessione = _connetti(self.percorso)
+        lotto = []
+        scadenza = None
+        try:
+            while True:
+                attesa = None if scadenza is None else max(0.0, scadenza - time.monotonic())
+                try:
+                    riga = self._coda.get(timeout=attesa)
+                except queue.Empty:
+                    riga = None
+
+                if riga is not None and riga is not _FINE:
+                    lotto.append(riga)
+                    if scadenza is None:
+                        scadenza = time.monotonic() + self.intervallo_commit
+
+                # Scrive quando il lotto è pieno, è scaduto l'intervallo o si chiude
+                if lotto and (riga is None or riga is _FINE or len(lotto) >= self.dimensione_lotto):
+                    self._scrivi(connessione, lotto)
+                    lotto = []
+                    scadenza = None
+                if riga is _FINE:
+                    return
+        finally:
+            connessione.close()
+
+    def _scrivi(self, connessione, lotto):
+        try:
+            with connessione:
+                connessione.executemany(_INSERIMENTO, lotto)
+            self.scritti += len(lotto)
+        except sqlite3.Error as e:
+            self.scartati += len(lotto)
+            if self.al_errore is not None:
+                self.al_errore(e)
+
+    def elimina_precedenti(self, timestamp):
+        """Elimina le analisi più vecchie di timestamp; restituisce quante ne ha eliminate."""
+        connessione = _connetti(self.percorso)
+        try:
+            with connessione:
+                return connessione.execute("DELETE FROM analisi WHERE timestamp < ?",
+                                           (timestamp,)).rowcount
+        finally:
+            connessione.close()
+
+
+def main(argv=None):
+    """Riepilogo a riga di comando di un registro dei risultati."""
+    parser = argparse.ArgumentParser(
+        prog="riconoscitore.py registro",
+        description="Mostra la difettosità per ora e lo storico delle soglie di un registro.")
+    parser.add_argument("percorso", help="file SQLite del registro")
+    parser.add_argument("--ore", type=float, default=24.0, help="ore da riepilogare (default: 24)")
+    args = parser.parse_args(argv)
+
+    # Solo lettura: nessuno schema creato e nessun thread di scrittura
+    registro = LetturaRegistro(args.percorso)
+    inizio = time.time() - args.ore * 3600
+    try:
+        orari = registro.difettosita_oraria(inizio)
+        soglie = registro.storico_soglie(inizio)
+    except sqlite3.Error as e:
+        print(f"Impossibile leggere il registro {args.percorso}: {e}", file=sys.stderr)
+        return 1
+
+    print(f"{'ora':<18}{'analisi':>9}{'difettati':>11}{'% difettati':>13}{'area media %':>14}")
+    for riga in orari:
+        print(f"{riga['ora']:<18}{riga['analisi']:>9}{riga['difettati']:>11}"
+              f"{riga['percentuale_difettati']:>13.1f}{riga['area_difettata_media']:>14.2f}")
+
+    print("\nStorico soglie:")
+    for riga in soglie:
+        istante = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(riga["timestamp"]))
+        print(f"{istante}  difetti {riga['soglia_difetti']:.1f}%  "
+              f"scuro {riga['soglia_colore_scuro']}  chiaro {riga['soglia_colore_chiaro']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,51 @@
 import cv2
 import numpy as np
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
-from PIL import Image, ImageTk
+from tkinter import ttk, filedialog, messagebox, simpledialog
 import os
 import sys
 import threading
 import time
 
+from acquisizione import AcquisitoreFrame
+from analizzatore import AnalizzatoreDifetti, ROI_AUTOMATICA, maschera_zone_scure, maschera_zone_chiare, percentuale_area
+from anteprima import AnteprimaCanvas
+from componenti import RegolaVerdetto
+from evidenze import ArchivioEvidenze
+from memoria import BUFFER
+from pipeline import PipelineAnalisi
+from processi import NUM_PROCESSI_DEFAULT, PipelineProcessi
+from profili import FileProfili, ProfiloIspezione
+from registro import RegistroRisultati
+from sorgenti import crea_sorgente
+from strumentazione import PROFILATORE
+from variazioni import EVENTO_NUOVO_VASSOIO, RilevatoreVariazioni
+from viste import (NOMI_VISTE, VISTA_PREDEFINITA, VisteAnalisi,
+                   disegna_zone_scure, disegna_zone_chiare, disegna_difetti_combinati)
+
+# Worker dell'analisi automatica e frame che possono attendere in coda
+NUM_WORKER_ANALISI = 2
+CAPACITA_CODA_ANALISI = 2
+
+# Thread per l'analisi a tasselli dei frame grandi: i core lasciati liberi dai worker
+# dell'analisi, che intanto eseguono gli stadi non divisi in fasce (contorni, viste)
+THREAD_TASSELLI = max(1, (os.cpu_count() or 1) - NUM_WORKER_ANALISI)
+
+# Frequenza massima di aggiornamento dell'anteprima live
+FPS_ANTEPRIMA = 25
+
+# Attesa dopo l'ultimo movimento di uno slider prima di ridisegnare la vista
+RITARDO_RIDISEGNO_MS = 200
+
+# Archivio SQLite di tutte le analisi mostrate
+PERCORSO_REGISTRO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "risultati.db")
+
+# Ogni quanto controllare se il file dei profili è stato modificato
+INTERVALLO_CONTROLLO_PROFILI_MS = 2000
+
+# Cartella delle evidenze (frame, maschera e valori) dei pezzi difettati
+CARTELLA_EVIDENZE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "evidenze")
+
 def main():
     # Verifica le dipendenze richieste
     try:
@@ -29,40 +67,114 @@ def main():
     # Avvia il loop principale
     root.mainloop()
 
+def main_batch(argv=None):
+    """Ispezione batch di una cartella di immagini (senza GUI)."""
+    import ispezione_batch
+    return ispezione_batch.main(argv)
+
+def main_registro(argv=None):
+    """Riepilogo del registro dei risultati (difettosità per ora e storico soglie)."""
+    import registro
+    return registro.main(argv)
+
+def main_servizio(argv=None):
+    """Servizio HTTP/JSON di ispezione (senza GUI)."""
+    import servizio
+    return servizio.main(argv)
+
+def main_riproduci(argv=None):
+    """Riproduzione di video, cartelle o frame sintetici attraverso la pipeline (senza GUI)."""
+    import sorgenti
+    return sorgenti.main(argv)
+
+def main_stazioni(argv=None):
+    """Ispezione di più stazioni con un pool di worker condiviso (senza GUI)."""
+    import stazioni
+    return stazioni.main(argv)
+
+def main_calibra(argv=None):
+    """Calibrazione delle soglie su una cartella di immagini (senza GUI)."""
+    import calibrazione
+    return calibrazione.main(argv)
+
 class RiconoscitoreDifetti:
     def __init__(self, root):
         self.root = root
         
-        # Valore soglia difetti (%)
-        self.soglia_difetti = 5.0
-        
-        # Valore soglia colore scuro (0-255)
-        self.soglia_colore_scuro = 50
-        
-        # Valore soglia per zone chiare/rosse (0-255)
-        self.soglia_colore_chiaro = 200
+        # Motore di analisi (contiene le soglie difetti, zone scure e zone chiare)
+        self.analizzatore = AnalizzatoreDifetti(thread_tasselli=THREAD_TASSELLI)
         
         # Variabili per la webcam
         self.capture = None
         self.is_capturing = False
-        self.capture_thread = None
+        self.feed_job = None  # Aggiornamento dell'anteprima programmato con root.after
+        self.last_sequence = 0
+        self.last_analysis_time = 0
         self.camera_index = 0  # Indice della webcam (0 = predefinita)
+        self.acquisitore = None
+        self.pipeline = None
+        self.rilevatore = RilevatoreVariazioni()  # Evita di rianalizzare una scena invariata
+        self.stations_window = None  # Finestra delle stazioni multiple (una sola alla volta)
         
         # Percorso dell'immagine corrente
         self.image_path = None
         self.original_image = None
         self.processed_images = {}
         self.current_view = None
+        self.rerender_job = None  # Ridisegno della vista dopo un cambio di soglia
+        self.performance_job = None  # Aggiornamento periodico del pannello prestazioni
         
         # Crea l'interfaccia utente
         self.create_widgets()
         
+        # Registro persistente dei risultati (scritto in background)
+        try:
+            self.registro = RegistroRisultati(PERCORSO_REGISTRO)
+            self.registro.al_errore = lambda e: self.log(f"Errore nel registro dei risultati: {str(e)}")
+        except Exception as e:
+            self.registro = None
+            self.log(f"Registro dei risultati non disponibile: {str(e)}")
+        
+        # Archivio delle evidenze dei pezzi difettati (scritto in background)
+        self.archivio = ArchivioEvidenze(CARTELLA_EVIDENZE)
+        self.archivio.al_errore = lambda e: self.log(f"Errore nel salvataggio delle evidenze: {str(e)}")
+        self.archivio.avvia()
+        
+        # Profili di ispezione: applica quello attivo e segue le modifiche al file
+        self.profili = FileProfili()
+        self.check_profiles_file()
+        
         # Testo iniziale per l'applicazione
         self.log("Applicazione avviata. Premi 'Avvia webcam' per iniziare.")
         
         # Imposta la routine di chiusura
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
     
+    # Le soglie sono conservate nel motore di analisi
+    @property
+    def soglia_difetti(self):
+        return self.analizzatore.soglia_difetti
+    
+    @soglia_difetti.setter
+    def soglia_difetti(self, value):
+        self.analizzatore.soglia_difetti = value
+    
+    @property
+    def soglia_colore_scuro(self):
+        return self.analizzatore.soglia_colore_scuro
+    
+    @soglia_colore_scuro.setter
+    def soglia_colore_scuro(self, value):
+        self.analizzatore.soglia_colore_scuro = value
+    
+    @property
+    def soglia_colore_chiaro(self):
+        return self.analizzatore.soglia_colore_chiaro
+    
+    @soglia_colore_chiaro.setter
+    def soglia_colore_chiaro(self, value):
+        self.analizzatore.soglia_colore_chiaro = value
+    
     def create_widgets(self):
         # Crea un menu in alto
         menubar = tk.Menu(self.root)
@@ -79,6 +191,7 @@ class RiconoscitoreDifetti:
         process_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Elaborazione", menu=process_menu)
         process_menu.add_command(label="Scatta e Analizza", command=self.capture_and_analyze)
+        process_menu.add_command(label="Stazioni Multiple...", command=self.open_stations)
         
         # Crea un frame principale diviso in due parti
         main_paned = ttk.PanedWindow(self.root, orient=tk.HORIZONTAL)
@@ -91,7 +204,8 @@ class RiconoscitoreDifetti:
         # Canvas per mostrare l'immagine
         self.canvas = tk.Canvas(left_frame, bg="#e0e0e0", width=600, height=500)
         self.canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-        self.canvas.create_text(300, 250, text="Avvia la webcam per iniziare", fill="gray", font=("Arial", 14))
+        self.anteprima = AnteprimaCanvas(self.canvas)
+        self.anteprima.mostra_messaggio("Avvia la webcam per iniziare")
         
         # Pannello destro (controlli)
         right_frame = ttk.Frame(main_paned)
@@ -101,10 +215,40 @@ class RiconoscitoreDifetti:
         control_frame = ttk.LabelFrame(right_frame, text="Controlli")
         control_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
+        # Profilo del prodotto ispezionato
+        profile_frame = ttk.LabelFrame(control_frame, text="Profilo Prodotto")
+        profile_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        self.profile_var = tk.StringVar()
+        self.profile_options = ttk.Combobox(profile_frame, textvariable=self.profile_var, state="readonly")
+        self.profile_options.pack(fill=tk.X, padx=5, pady=5)
+        self.profile_options.bind("<<ComboboxSelected>>", self.change_profile)
+        
+        ttk.Button(profile_frame, text="Salva impostazioni come profilo...",
+                   command=self.save_profile).pack(fill=tk.X, padx=5, pady=5)
+        
         # Controlli webcam
         webcam_frame = ttk.LabelFrame(control_frame, text="Controlli Webcam")
         webcam_frame.pack(fill=tk.X, padx=10, pady=10)
         
+        # Sorgente dei frame: indice della webcam, file video, cartella di immagini o "sintetico"
+        source_frame = ttk.Frame(webcam_frame)
+        source_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(source_frame, text="Sorgente: ").pack(side=tk.LEFT)
+        self.source_var = tk.StringVar(value=str(self.camera_index))
+        ttk.Entry(source_frame, textvariable=self.source_var, width=18).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Button(source_frame, text="...", width=3, command=self.browse_source).pack(side=tk.LEFT, padx=2)
+        
+        # Video e cartelle alla loro cadenza oppure il più velocemente possibile
+        self.real_time_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(webcam_frame, text="Riproduci in tempo reale",
+                        variable=self.real_time_var).pack(fill=tk.X, padx=10, pady=5)
+        
+        # Analisi in processi worker: anteprima e acquisizione non contendono il GIL con l'analisi
+        self.processes_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(webcam_frame, text="Analizza in processi separati",
+                        variable=self.processes_var).pack(fill=tk.X, padx=10, pady=5)
+        
         self.start_button = ttk.Button(webcam_frame, text="Avvia Webcam", command=self.start_webcam)
         self.start_button.pack(fill=tk.X, padx=10, pady=5)
         
@@ -135,6 +279,15 @@ class RiconoscitoreDifetti:
                                    textvariable=self.analysis_freq_var, width=5)
         freq_spinbox.pack(side=tk.LEFT, padx=5)
         
+        # Analisi una sola volta per vassoio invece che a intervalli
+        self.tray_trigger_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            webcam_frame,
+            text="Analizza solo all'arrivo di un nuovo vassoio",
+            variable=self.tray_trigger_var,
+            command=self.toggle_auto_analyze
+        ).pack(fill=tk.X, padx=10, pady=5)
+        
         # Soglia per la sensibilità colore SCURO
         dark_frame = ttk.LabelFrame(control_frame, text="Sensibilità Zone Scure")
         dark_frame.pack(fill=tk.X, padx=10, pady=10)
@@ -174,12 +327,49 @@ class RiconoscitoreDifetti:
         self.threshold_label = ttk.Label(threshold_frame, text=f"Soglia: {self.soglia_difetti:.1f}%")
         self.threshold_label.pack(pady=5)
         
+        # Regione e risoluzione di analisi
+        region_frame = ttk.LabelFrame(control_frame, text="Regione di Analisi")
+        region_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        self.roi_auto_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(region_frame, text="Solo vassoio (rilevamento automatico)",
+                        variable=self.roi_auto_var,
+                        command=self.update_analysis_mode).pack(fill=tk.X, padx=5, pady=2)
+        
+        scale_frame = ttk.Frame(region_frame)
+        scale_frame.pack(fill=tk.X, padx=5, pady=2)
+        ttk.Label(scale_frame, text="Scala analisi: ").pack(side=tk.LEFT)
+        
+        self.analysis_scale_var = tk.DoubleVar(value=1.0)
+        ttk.Spinbox(scale_frame, values=(0.25, 0.5, 0.75, 1.0), state="readonly", width=5,
+                    textvariable=self.analysis_scale_var,
+                    command=self.update_analysis_scale).pack(side=tk.LEFT, padx=5)
+        
+        # Limiti sui singoli difetti (0 = nessun limite)
+        rule_frame = ttk.LabelFrame(control_frame, text="Regola Verdetto")
+        rule_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        self.min_defect_area_var = tk.IntVar(value=0)
+        self.max_defect_area_var = tk.IntVar(value=0)
+        self.max_defect_count_var = tk.IntVar(value=0)
+        for text, variable in (("Area minima difetto (px): ", self.min_defect_area_var),
+                               ("Area massima difetto (px): ", self.max_defect_area_var),
+                               ("Numero massimo difetti: ", self.max_defect_count_var)):
+            row = ttk.Frame(rule_frame)
+            row.pack(fill=tk.X, padx=5, pady=2)
+            ttk.Label(row, text=text).pack(side=tk.LEFT)
+            spinbox = ttk.Spinbox(row, from_=0, to=1000000, increment=10, width=8,
+                                  textvariable=variable, command=self.update_verdict_rule)
+            spinbox.pack(side=tk.RIGHT, padx=5)
+            spinbox.bind("<Return>", self.update_verdict_rule)
+        
         # Visualizzazioni disponibili
         views_frame = ttk.LabelFrame(control_frame, text="Visualizzazioni")
         views_frame.pack(fill=tk.X, padx=10, pady=10)
         
-        self.view_var = tk.StringVar()
-        self.view_options = ttk.Combobox(views_frame, textvariable=self.view_var, state="readonly")
+        self.view_var = tk.StringVar(value=VISTA_PREDEFINITA)
+        self.view_options = ttk.Combobox(views_frame, textvariable=self.view_var, state="readonly",
+                                         values=NOMI_VISTE)
         self.view_options.pack(fill=tk.X, padx=5, pady=5)
         self.view_options.bind("<<ComboboxSelected>>", self.change_view)
         
@@ -199,10 +389,33 @@ class RiconoscitoreDifetti:
         total_area_label = ttk.Label(results_frame, textvariable=self.total_area_var)
         total_area_label.pack(anchor=tk.W, padx=5, pady=2)
         
+        self.defects_var = tk.StringVar(value="Difetti: N/A")
+        defects_label = ttk.Label(results_frame, textvariable=self.defects_var)
+        defects_label.pack(anchor=tk.W, padx=5, pady=2)
+        
         self.status_var = tk.StringVar(value="Stato: N/A")
         self.status_label = ttk.Label(results_frame, textvariable=self.status_var)
         self.status_label.pack(anchor=tk.W, padx=5, pady=2)
         
+        self.archive_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(results_frame, text="Archivia le evidenze dei pezzi DIFETTATI",
+                        variable=self.archive_var).pack(anchor=tk.W, padx=5, pady=2)
+        
+        # Prestazioni: tempi per stadio, FPS e frame scartati
+        perf_frame = ttk.LabelFrame(control_frame, text="Prestazioni")
+        perf_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        self.profiling_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(perf_frame, text="Misura tempi per stadio", variable=self.profiling_var,
+                        command=self.toggle_profiling).pack(anchor=tk.W, padx=5, pady=2)
+        
+        self.perf_var = tk.StringVar(value="Misure disattivate")
+        ttk.Label(perf_frame, textvariable=self.perf_var, font=("Courier", 8),
+                  justify=tk.LEFT).pack(anchor=tk.W, padx=5, pady=2)
+        
+        ttk.Button(perf_frame, text="Salva misure...",
+                   command=self.save_profiling).pack(fill=tk.X, padx=5, pady=2)
+        
         # Log delle operazioni
         log_frame = ttk.LabelFrame(right_frame, text="Log")
         log_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
@@ -218,88 +431,288 @@ class RiconoscitoreDifetti:
         """Aggiorna l'etichetta della soglia quando viene modificata."""
         self.soglia_difetti = self.threshold_var.get()
         self.threshold_label.config(text=f"Soglia: {self.soglia_difetti:.1f}%")
+        self.reevaluate_thresholds()
     
     def update_dark_threshold(self, event=None):
         """Aggiorna l'etichetta della soglia colore scuro quando viene modificata."""
         self.soglia_colore_scuro = self.dark_var.get()
         self.dark_label.config(text=f"Soglia zone scure: {self.soglia_colore_scuro}")
+        self.reevaluate_thresholds()
     
     def update_bright_threshold(self, event=None):
         """Aggiorna l'etichetta della soglia colore chiaro quando viene modificata."""
         self.soglia_colore_chiaro = self.bright_var.get()
         self.bright_label.config(text=f"Soglia zone chiare: {self.soglia_colore_chiaro}")
+        self.reevaluate_thresholds()
+    
+    def update_verdict_rule(self, event=None):
+        """Aggiorna i limiti su dimensione e numero dei difetti usati per il verdetto."""
+        try:
+            max_area = self.max_defect_area_var.get()
+            max_count = self.max_defect_count_var.get()
+            self.analizzatore.regola = RegolaVerdetto(
+                area_minima=self.min_defect_area_var.get(),
+                area_massima=max_area or None,
+                numero_massimo=max_count or None)
+        except tk.TclError:
+            return  # Valore non numerico ancora in digitazione
+        self.reevaluate_thresholds()
+    
+    def reevaluate_thresholds(self):
+        """Rivaluta l'ultimo frame analizzato con le soglie correnti, senza rianalizzarlo."""
+        views = self.processed_images
+        if not isinstance(views, VisteAnalisi):
+            return
+        
+        # Percentuali e verdetto dagli istogrammi del frame: immediati
+        risultato = views.risultato.ricalcola(
+            self.soglia_difetti, self.soglia_colore_scuro, self.soglia_colore_chiaro,
+            self.analizzatore.regola)
+        self.processed_images = VisteAnalisi(views.frame, risultato)
+        self.update_result_labels(risultato)
+        
+        # La vista viene ridisegnata solo quando lo slider si ferma
+        if self.rerender_job is not None:
+            self.root.after_cancel(self.rerender_job)
+        self.rerender_job = self.root.after(RITARDO_RIDISEGNO_MS, self.rerender_current_view)
+    
+    def rerender_current_view(self):
+        """Ridisegna la vista selezionata per le soglie correnti."""
+        self.rerender_job = None
+        if self.current_view in self.processed_images:
+            self.display_image(self.processed_images[self.current_view])
+            self.update_defect_labels(self.processed_images.risultato)
+    
+    def update_analysis_mode(self):
+        """Passa dall'intero frame al solo vassoio e viceversa (scelta esplicita dell'utente)."""
+        self.analizzatore.roi = ROI_AUTOMATICA if self.roi_auto_var.get() else None
+        self.rilevatore.azzera()
+        self.log_analysis_region()
+    
+    def update_analysis_scale(self):
+        """Aggiorna la scala dell'analisi lasciando invariata la regione (anche quella di un profilo)."""
+        self.analizzatore.scala_analisi = float(self.analysis_scale_var.get())
+        self.rilevatore.azzera()
+        self.log_analysis_region()
+    
+    def log_analysis_region(self):
+        """Scrive nel log la regione e la scala di analisi correnti."""
+        roi = self.analizzatore.roi
+        if roi is None:
+            regione = "intero frame"
+        elif roi == ROI_AUTOMATICA:
+            regione = "solo vassoio"
+        else:
+            x, y, w, h = roi
+            regione = f"rettangolo {w}x{h} in ({x}, {y})"
+        self.log(f"Regione di analisi: {regione}, scala {self.analizzatore.scala_analisi:.2f}.")
+    
+    def change_profile(self, event=None):
+        """Applica il profilo selezionato nel combobox."""
+        try:
+            self.apply_profile(self.profili.profilo(self.profile_var.get()))
+        except KeyError as e:
+            self.log(str(e))
+    
+    def apply_profile(self, profilo):
+        """Applica un profilo al motore di analisi e ai controlli, senza fermare la cattura."""
+        profilo.applica(self.analizzatore)
+        self.profile_var.set(profilo.nome)
+        
+        # Allinea i controlli ai valori del profilo
+        self.threshold_var.set(profilo.soglia_difetti)
+        self.dark_var.set(profilo.soglia_colore_scuro)
+        self.bright_var.set(profilo.soglia_colore_chiaro)
+        self.threshold_label.config(text=f"Soglia: {profilo.soglia_difetti:.1f}%")
+        self.dark_label.config(text=f"Soglia zone scure: {profilo.soglia_colore_scuro}")
+        self.bright_label.config(text=f"Soglia zone chiare: {profilo.soglia_colore_chiaro}")
+        self.roi_auto_var.set(profilo.roi == ROI_AUTOMATICA)
+        self.analysis_scale_var.set(profilo.scala_analisi)
+        self.min_defect_area_var.set(profilo.area_minima)
+        self.max_defect_area_var.set(profilo.area_massima or 0)
+        self.max_defect_count_var.set(profilo.numero_massimo or 0)
+        self.analysis_freq_var.set(profilo.intervallo_analisi)
+        
+        if profilo.camera_index != self.camera_index:
+            self.camera_index = profilo.camera_index
+            self.source_var.set(str(self.camera_index))
+            if self.is_capturing:
+                self.log(f"La webcam {self.camera_index} verrà usata dal prossimo avvio.")
+        
+        # La scena corrente va rianalizzata con i nuovi parametri
+        self.rilevatore.azzera()
+        self.reevaluate_thresholds()
+        self.log(f"Profilo '{profilo.nome}' applicato.")
+    
+    def save_profile(self):
+        """Salva le impostazioni correnti come profilo (nuovo o esistente)."""
+        name = simpledialog.askstring("Salva profilo", "Nome del profilo:",
+                                      initialvalue=self.profile_var.get(), parent=self.root)
+        if not name:
+            return
+        
+        regola = self.analizzatore.regola
+        profilo = ProfiloIspezione(
+            nome=name,
+            soglia_difetti=self.soglia_difetti,
+            soglia_colore_scuro=self.soglia_colore_scuro,
+            soglia_colore_chiaro=self.soglia_colore_chiaro,
+            dimensione_kernel=self.analizzatore.kernel.shape[0],
+            roi=self.analizzatore.roi,
+            scala_analisi=self.analizzatore.scala_analisi,
+            area_minima=regola.area_minima,
+            area_massima=regola.area_massima,
+            numero_massimo=regola.numero_massimo,
+            camera_index=self.camera_index,
+            intervallo_analisi=self.analysis_freq_var.get())
+        try:
+            self.profili.salva(profilo)
+        except OSError as e:
+            messagebox.showerror("Errore", f"Impossibile salvare il profilo: {str(e)}")
+            return
+        self.profile_options.config(values=self.profili.nomi())
+        self.profile_var.set(name)
+        self.log(f"Profilo '{name}' salvato in {self.profili.percorso}")
+    
+    def check_profiles_file(self):
+        """Applica il profilo selezionato quando il file dei profili viene caricato o modificato."""
+        try:
+            if self.profili.ricarica_se_modificato():
+                self.profile_options.config(values=self.profili.nomi())
+                name = self.profile_var.get()
+                if name not in self.profili.profili:
+                    name = self.profili.attivo
+                self.apply_profile(self.profili.profilo(name))
+        except (ValueError, OSError) as e:
+            self.log(f"Profili non caricati: {str(e)}")
+        
+        self.root.after(INTERVALLO_CONTROLLO_PROFILI_MS, self.check_profiles_file)
+    
+    def browse_source(self):
+        """Sceglie un file video da riprodurre al posto della webcam."""
+        file_path = filedialog.askopenfilename(
+            title="Seleziona un video",
+            filetypes=[("Video", "*.mp4 *.avi *.mov *.mkv"), ("Tutti i file", "*.*")])
+        if file_path:
+            self.source_var.set(file_path)
     
     def start_webcam(self):
-        """Avvia la cattura dalla webcam."""
+        """Avvia la cattura dalla sorgente indicata (webcam, video, cartella o frame sintetici)."""
         try:
-            # Inizializza la webcam
-            self.capture = cv2.VideoCapture(self.camera_index)
+            # Inizializza la sorgente
+            descrizione = self.source_var.get().strip() or str(self.camera_index)
+            if descrizione.isdigit():
+                self.camera_index = int(descrizione)
+            self.capture = crea_sorgente(descrizione, tempo_reale=self.real_time_var.get())
             
             if not self.capture.isOpened():
-                messagebox.showerror("Errore", "Impossibile accedere alla webcam.")
-                self.log("Errore: Impossibile accedere alla webcam.")
+                self.capture.release()
+                self.capture = None
+                messagebox.showerror("Errore", f"Impossibile aprire la sorgente {descrizione}.")
+                self.log(f"Errore: Impossibile aprire la sorgente {descrizione}.")
                 return
             
             # Imposta flag di cattura
             self.is_capturing = True
             
+            # Pipeline di analisi automatica (coda limitata + worker fissi)
+            if self.processes_var.get():
+                # I worker sono processi: preparano anche la vista selezionata e i
+                # frame vengono acquisiti direttamente nella loro memoria condivisa
+                self.pipeline = PipelineProcessi(
+                    self.analizzatore, self.on_pipeline_result,
+                    num_worker=NUM_PROCESSI_DEFAULT, capacita=CAPACITA_CODA_ANALISI,
+                    al_errore=lambda e: self.log(f"Errore durante l'elaborazione: {str(e)}"),
+                    vista=lambda: self.current_view or VISTA_PREDEFINITA)
+                buffer = self.pipeline.anello
+            else:
+                self.pipeline = PipelineAnalisi(
+                    self.analyze_frame, self.on_pipeline_result,
+                    num_worker=NUM_WORKER_ANALISI, capacita=CAPACITA_CODA_ANALISI,
+                    al_errore=lambda e: self.log(f"Errore durante l'elaborazione: {str(e)}"))
+                buffer = BUFFER
+            self.pipeline.avvia()
+            
+            # Avvia il thread che legge in continuo dalla webcam e conserva l'ultimo frame
+            # La fine di un video o di una cartella ferma la cattura dal thread della GUI
+            self.acquisitore = AcquisitoreFrame(
+                self.capture, specchia=self.capture.specchia,
+                al_termine=lambda: self.root.after(0, self.on_source_finished), buffer=buffer)
+            self.acquisitore.avvia()
+            
             # Attiva/disattiva i pulsanti
             self.start_button.config(state=tk.DISABLED)
             self.stop_button.config(state=tk.NORMAL)
             self.capture_button.config(state=tk.NORMAL)
             
-            # Avvia il thread di cattura
-            self.capture_thread = threading.Thread(target=self.update_webcam_feed)
-            self.capture_thread.daemon = True
-            self.capture_thread.start()
+            # Avvia l'aggiornamento dell'anteprima nel thread di Tk
+            self.last_sequence = 0
+            self.last_analysis_time = 0
+            self.rilevatore.azzera()
+            self.update_webcam_feed()
             
-            self.log("Webcam avviata.")
+            self.log(f"Cattura avviata da {self.capture.descrizione}.")
             
         except Exception as e:
             messagebox.showerror("Errore", f"Errore nell'avvio della webcam: {str(e)}")
             self.log(f"Errore nell'avvio della webcam: {str(e)}")
     
     def update_webcam_feed(self):
-        """Aggiorna il feed della webcam in modo continuo."""
-        last_analysis_time = 0
+        """Aggiorna l'anteprima e l'analisi automatica (eseguita periodicamente nel thread di Tk)."""
+        self.feed_job = None
+        if not self.is_capturing:
+            return
         
-        while self.is_capturing:
-            try:
-                # Leggi un frame dalla webcam
-                ret, frame = self.capture.read()
-                
-                if not ret:
-                    self.log("Errore nella lettura del frame dalla webcam.")
-                    break
-                
-                # Specchia orizzontalmente il frame (più naturale per l'utente)
-                frame = cv2.flip(frame, 1)
+        start_time = time.perf_counter()
+        try:
+            acquisito = self.acquisitore.ultimo()
+            
+            if acquisito is None and not self.acquisitore.attivo:
+                self.log("Errore nella lettura del frame dalla webcam.")
+                return
+            
+            # Mostra solo i frame nuovi; se l'interfaccia è in ritardo i frame intermedi vengono saltati
+            if acquisito is not None and acquisito.sequenza != self.last_sequence:
+                self.last_sequence = acquisito.sequenza
+                frame = acquisito.frame
                 
                 # Visualizza il frame live
                 self.display_webcam_frame(frame)
                 
                 # Analisi automatica se abilitata
-                current_time = time.time()
-                if (self.auto_analyze_var.get() and 
-                    current_time - last_analysis_time > self.analysis_freq_var.get()):
-                    # Salva l'ultimo frame per elaborarlo
-                    self.original_image = frame.copy()
-                    # Elabora l'immagine in un thread separato per non bloccare l'UI
-                    analysis_thread = threading.Thread(target=self.process_image)
-                    analysis_thread.daemon = True
-                    analysis_thread.start()
-                    last_analysis_time = current_time
-                
-                # Breve pausa per non sovraccaricare la CPU
-                time.sleep(0.03)
-                
-            except Exception as e:
-                self.log(f"Errore nell'aggiornamento del feed webcam: {str(e)}")
-                break
+                if self.auto_analyze_var.get():
+                    self.auto_analyze(frame, acquisito.timestamp)
+            
+        except Exception as e:
+            self.log(f"Errore nell'aggiornamento del feed webcam: {str(e)}")
+            return
         
-        # Rilascia la webcam quando esco dal ciclo
-        if self.capture is not None and self.is_capturing == False:
-            self.capture.release()
+        # Riprogramma l'aggiornamento rispettando l'FPS dell'anteprima
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        delay_ms = max(1, int(1000 / FPS_ANTEPRIMA - elapsed_ms))
+        self.feed_job = self.root.after(delay_ms, self.update_webcam_feed)
+    
+    def auto_analyze(self, frame, timestamp):
+        """Invia il frame all'analisi automatica se la scena è cambiata."""
+        if self.tray_trigger_var.get():
+            # Un'analisi per vassoio: quando la scena si ferma dopo un movimento
+            if self.rilevatore.aggiorna(frame) != EVENTO_NUOVO_VASSOIO:
+                return
+            self.log("Nuovo vassoio rilevato.")
+        else:
+            current_time = time.time()
+            if current_time - self.last_analysis_time <= self.analysis_freq_var.get():
+                return
+            self.last_analysis_time = current_time
+            
+            # Scena invariata: resta valido il risultato precedente
+            if not self.rilevatore.da_analizzare(frame):
+                PROFILATORE.evento("analisi_evitate")
+                return
+        
+        # Accoda il frame alla pipeline: se i worker sono occupati
+        # viene scartato il frame più vecchio in attesa
+        self.pipeline.invia(frame, timestamp)
     
     def display_webcam_frame(self, frame):
         """Visualizza un frame dalla webcam nel canvas."""
@@ -307,52 +720,37 @@ class RiconoscitoreDifetti:
             return
         
         try:
-            # Ottieni le dimensioni del canvas
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
-            
-            # Se il canvas non è ancora stato renderizzato, usa dimensioni di backup
-            if canvas_width < 50 or canvas_height < 50:
-                canvas_width = 600
-                canvas_height = 500
-            
-            # Dimensioni originali del frame
-            height, width = frame.shape[:2]
-            
-            # Calcola il fattore di scala per adattare il frame al canvas
-            scale = min(canvas_width/width, canvas_height/height)
-            new_width = int(width * scale)
-            new_height = int(height * scale)
-            
-            # Ridimensiona il frame
-            resized = cv2.resize(frame, (new_width, new_height))
-            
-            # Converti da BGR a RGB per PIL
-            display_image = cv2.cvtColor(resized, cv2.COLOR_BGR2RGB)
-            
-            # Converti in formato PIL
-            pil_image = Image.fromarray(display_image)
-            
-            # Converti in formato Tkinter
-            tk_image = ImageTk.PhotoImage(image=pil_image)
-            
-            # Salva un riferimento all'immagine (per evitare il garbage collection)
-            self.tk_image = tk_image
-            
-            # Mostra l'immagine nel canvas
-            self.canvas.delete("all")
-            self.canvas.create_image(canvas_width//2, canvas_height//2, image=tk_image)
+            # Aggiorna in place l'immagine del canvas (stessa PhotoImage, stesso elemento)
+            with PROFILATORE.stadio("anteprima"):
+                self.anteprima.mostra(frame)
             
         except Exception as e:
             self.log(f"Errore nella visualizzazione del frame: {str(e)}")
     
+    def on_source_finished(self):
+        """Chiamata quando la sorgente non fornisce più frame (fine del video o della cartella)."""
+        if self.is_capturing:
+            self.log(f"Sorgente {self.capture.descrizione} terminata.")
+            self.stop_webcam()
+    
     def stop_webcam(self):
         """Ferma la cattura dalla webcam."""
         self.is_capturing = False
         
-        # Attendi che il thread di cattura termini
-        if self.capture_thread and self.capture_thread.is_alive():
-            self.capture_thread.join(1.0)  # Attendi max 1 secondo
+        # Annulla l'aggiornamento dell'anteprima già programmato
+        if self.feed_job is not None:
+            self.root.after_cancel(self.feed_job)
+            self.feed_job = None
+        
+        # Ferma il thread di acquisizione prima di rilasciare la webcam
+        if self.acquisitore is not None:
+            self.acquisitore.ferma()
+            self.acquisitore = None
+        
+        # Ferma i worker di analisi
+        if self.pipeline is not None:
+            self.pipeline.ferma()
+            self.pipeline = None
         
         # Rilascia la webcam
         if self.capture is not None:
@@ -365,30 +763,26 @@ class RiconoscitoreDifetti:
         self.capture_button.config(state=tk.DISABLED)
         
         # Cancella il canvas
-        self.canvas.delete("all")
-        self.canvas.create_text(300, 250, text="Webcam fermata", fill="gray", font=("Arial", 14))
+        self.anteprima.mostra_messaggio("Webcam fermata")
         
         self.log("Webcam fermata.")
     
     def capture_and_analyze(self):
         """Cattura un frame dalla webcam e lo analizza."""
-        if not self.is_capturing or self.capture is None:
+        if not self.is_capturing or self.acquisitore is None:
             messagebox.showwarning("Attenzione", "La webcam non è attiva.")
             return
         
         try:
-            # Leggi un frame dalla webcam
-            ret, frame = self.capture.read()
+            # Prendi l'ultimo frame acquisito (già specchiato) senza leggere dalla webcam
+            acquisito = self.acquisitore.ultimo()
             
-            if not ret:
+            if acquisito is None:
                 messagebox.showerror("Errore", "Impossibile catturare il frame dalla webcam.")
                 return
-                
-            # Specchia orizzontalmente il frame
-            frame = cv2.flip(frame, 1)
             
-            # Salva il frame come immagine originale
-            self.original_image = frame.copy()
+            # Salva il frame come immagine originale (i frame acquisiti non vengono mai modificati)
+            self.original_image = acquisito.frame
             
             # Processa l'immagine
             self.process_image()
@@ -399,10 +793,71 @@ class RiconoscitoreDifetti:
             self.log(f"Errore durante la cattura: {str(e)}")
             messagebox.showerror("Errore", f"Si è verificato un errore: {str(e)}")
     
+    def toggle_profiling(self):
+        """Attiva/disattiva la misura dei tempi per stadio."""
+        PROFILATORE.azzera()
+        PROFILATORE.abilitato = self.profiling_var.get()
+        # Un solo aggiornamento periodico anche se le misure vengono riattivate entro un secondo
+        if self.performance_job is not None:
+            self.root.after_cancel(self.performance_job)
+            self.performance_job = None
+        if PROFILATORE.abilitato:
+            self.log("Misura dei tempi per stadio attivata.")
+            self.update_performance_panel()
+        else:
+            self.perf_var.set("Misure disattivate")
+            self.log("Misura dei tempi per stadio disattivata.")
+    
+    def update_performance_panel(self):
+        """Aggiorna il pannello prestazioni (una volta al secondo finché le misure sono attive)."""
+        self.performance_job = None
+        if not PROFILATORE.abilitato:
+            return
+        
+        dropped = self.pipeline.scartati if self.pipeline is not None else 0
+        lines = [
+            f"Acquisizione: {PROFILATORE.frequenza('frame_acquisiti'):5.1f} fps",
+            f"Analisi:      {PROFILATORE.frequenza('analisi_completate'):5.1f} fps",
+            f"Scartati:     {dropped}",
+            f"Evitate:      {PROFILATORE.frequenza('analisi_evitate'):5.1f} /s",
+        ]
+        # Occupazione dei buffer riutilizzati e della memoria del processo (deve restare stabile)
+        memory = BUFFER.statistiche()
+        lines.append(f"Buffer:       {memory['buffer_mb']:5.1f} MB ({memory['allocazioni']} allocazioni)")
+        if memory["memoria_processo_mb"] is not None:
+            lines.append(f"Memoria:      {memory['memoria_processo_mb']:5.1f} MB")
+        if isinstance(self.pipeline, PipelineProcessi):
+            shared = self.pipeline.anello.statistiche()
+            lines.append(f"Condivisa:    {shared['memoria_condivisa_mb']:5.1f} MB ({shared['blocchi']} blocchi)")
+        lines.append(f"{'stadio':<15}{'p50 ms':>8}{'p95 ms':>8}")
+        for name, stats in sorted(PROFILATORE.riepilogo().items()):
+            lines.append(f"{name:<15}{stats['p50_ms']:>8.1f}{stats['p95_ms']:>8.1f}")
+        self.perf_var.set("\n".join(lines))
+        
+        self.performance_job = self.root.after(1000, self.update_performance_panel)
+    
+    def save_profiling(self):
+        """Salva su file (JSON) le misure raccolte."""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json", filetypes=[("JSON", "*.json"), ("Tutti i file", "*.*")])
+        if not file_path:
+            return
+        
+        extra = {"frame_scartati": self.pipeline.scartati if self.pipeline is not None else 0,
+                 "memoria": BUFFER.statistiche()}
+        if isinstance(self.pipeline, PipelineProcessi):
+            extra["memoria_condivisa"] = self.pipeline.anello.statistiche()
+        PROFILATORE.scrivi_su_file(file_path, extra)
+        self.log(f"Misure salvate in {file_path}")
+    
     def toggle_auto_analyze(self):
         """Attiva/disattiva l'analisi automatica."""
         auto_analyze = self.auto_analyze_var.get()
-        if auto_analyze:
+        # Alla riattivazione la scena corrente viene comunque analizzata
+        self.rilevatore.azzera()
+        if auto_analyze and self.tray_trigger_var.get():
+            self.log("Analisi automatica attivata all'arrivo di ogni nuovo vassoio.")
+        elif auto_analyze:
             self.log(f"Analisi automatica attivata con intervallo di {self.analysis_freq_var.get():.1f} secondi.")
         else:
             self.log("Analisi automatica disattivata.")
@@ -414,124 +869,154 @@ class RiconoscitoreDifetti:
             return
         
         try:
-            # Converti in scala di grigi
-            gray_image = cv2.cvtColor(self.original_image, cv2.COLOR_BGR2GRAY)
-            
-            # Reset delle immagini elaborate
-            self.processed_images = {}
-            self.processed_images["Originale"] = self.original_image.copy()
-            
-            # Applica una colormap JET (default)
-            colormap = cv2.COLORMAP_JET
-            colored_image = cv2.applyColorMap(gray_image, colormap)
-            self.processed_images["Colormap JET"] = colored_image
-            
-            # Rileva zone scure
-            dark_image, dark_mask, dark_percent = self.detect_dark_regions(gray_image, self.soglia_colore_scuro)
-            self.processed_images["Zone Scure"] = dark_image
-            
-            # Rileva zone chiare/rosse
-            bright_image, bright_mask, bright_percent = self.detect_bright_regions(gray_image, self.soglia_colore_chiaro)
-            self.processed_images["Zone Chiare"] = bright_image
-            
-            # Crea un'immagine combinata che mostra entrambi i tipi di difetti
-            combined_image, combined_mask, total_percent = self.combine_defects(
-                gray_image, dark_mask, bright_mask, dark_percent, bright_percent)
-            self.processed_images["Difetti Combinati"] = combined_image
-            
-            # Aggiungi le maschere alle visualizzazioni
-            self.processed_images["Maschera Zone Scure"] = cv2.cvtColor(dark_mask, cv2.COLOR_GRAY2BGR)
-            self.processed_images["Maschera Zone Chiare"] = cv2.cvtColor(bright_mask, cv2.COLOR_GRAY2BGR)
-            self.processed_images["Maschera Combinata"] = cv2.cvtColor(combined_mask, cv2.COLOR_GRAY2BGR)
-            
-            # Determina se il pezzo è difettato (basato sull'area difettata totale)
-            is_defective = total_percent > self.soglia_difetti
-            status_text = "DIFETTATO" if is_defective else "OK"
-            
-            # Aggiorna i risultati dell'analisi
-            # Usiamo tk.CallAfter per aggiornare l'UI in modo thread-safe
-            self.root.after(0, lambda: self.dark_area_var.set(f"Area scura: {dark_percent:.2f}%"))
-            self.root.after(0, lambda: self.bright_area_var.set(f"Area chiara: {bright_percent:.2f}%"))
-            self.root.after(0, lambda: self.total_area_var.set(f"Area difettata totale: {total_percent:.2f}%"))
-            self.root.after(0, lambda: self.status_var.set(f"Stato: {status_text}"))
-            
-            # Imposta lo stato con colore
-            if is_defective:
-                self.root.after(0, lambda: self.status_label.config(foreground="red"))
-            else:
-                self.root.after(0, lambda: self.status_label.config(foreground="green"))
-            
-            # Aggiorna il combobox con le viste disponibili
-            self.root.after(0, lambda: self.view_options.config(values=list(self.processed_images.keys())))
-            
-            # Passa alla vista "Difetti Combinati"
-            self.root.after(0, lambda: self.view_var.set("Difetti Combinati"))
-            self.root.after(0, lambda: self.display_image(self.processed_images["Difetti Combinati"]))
-            self.current_view = "Difetti Combinati"
-            
-            # Log dei risultati (utilizzando after per essere thread-safe)
-            self.root.after(0, lambda: self.log(
-                f"Analisi completata. Area scura: {dark_percent:.2f}%, Area chiara: {bright_percent:.2f}%, "
-                f"Totale: {total_percent:.2f}%. Stato: {status_text}"))
+            views = self.analyze_frame(self.original_image)
+            self.root.after(0, self.show_analysis, views)
             
         except Exception as e:
             self.log(f"Errore durante l'elaborazione: {str(e)}")
             messagebox.showerror("Errore", f"Si è verificato un errore: {str(e)}")
     
+    def analyze_frame(self, frame):
+        """Analizza un frame e prepara la vista selezionata (eseguibile in un thread worker)."""
+        # Analizza il frame con il motore di analisi (senza dipendenze dalla GUI)
+        risultato = self.analizzatore.analizza(frame)
+        
+        # Le visualizzazioni vengono generate solo quando richieste:
+        # qui si genera solo quella selezionata (predefinita: "Difetti Combinati")
+        start_time = time.perf_counter()
+        views = VisteAnalisi(frame, risultato)
+        views[self.current_view or VISTA_PREDEFINITA]
+        
+        # La GUI mostra sempre numero e dimensione dei difetti: la tabella (che riusa
+        # i contorni della vista appena generata) si calcola qui nel worker invece
+        # che nel thread dell'interfaccia. Servizio e batch la calcolano solo se serve.
+        risultato.difetti
+        risultato.tempi["viste"] = (time.perf_counter() - start_time) * 1000
+        return views
+    
+    def show_analysis(self, views, capture_time=None):
+        """Mostra nell'interfaccia il risultato di un'analisi (da chiamare nel thread principale)."""
+        with PROFILATORE.stadio("post_ui"):
+            self._show_analysis(views)
+        
+        # Latenza dalla cattura del frame alla visualizzazione del risultato
+        tempi = dict(views.risultato.tempi)
+        if capture_time is not None:
+            latency = time.time() - capture_time
+            PROFILATORE.registra("latenza_totale", latency)
+            tempi["latenza_totale"] = latency * 1000
+        
+        source = "automatica" if capture_time is not None else "manuale"
+        
+        # Evidenze del pezzo difettato: codificate e salvate nel thread dell'archivio
+        if views.risultato.is_defective and self.archive_var.get():
+            self.archivio.archivia(views.frame, views.risultato, capture_time, sorgente=source)
+        
+        if self.registro is not None:
+            self.registro.registra(
+                views.risultato.come_dizionario(),
+                timestamp=capture_time,
+                sorgente=source,
+                tempi=tempi)
+    
+    def _show_analysis(self, views):
+        risultato = views.risultato
+        dark_percent = risultato.dark_percent
+        bright_percent = risultato.bright_percent
+        total_percent = risultato.total_percent
+        status_text = risultato.status_text
+        
+        # Il frame e le viste mostrate sono sempre quelli a cui si riferisce il risultato
+        self.original_image = views.frame
+        self.processed_images = views
+        
+        # Aggiorna i risultati dell'analisi
+        self.update_result_labels(risultato)
+        self.update_defect_labels(risultato)
+        
+        view = self.current_view or VISTA_PREDEFINITA
+        self.current_view = view
+        self.display_image(views[view])
+        
+        self.log(f"Analisi completata. Area scura: {dark_percent:.2f}%, Area chiara: {bright_percent:.2f}%, "
+                 f"Totale: {total_percent:.2f}%. Stato: {status_text}")
+    
+    def update_result_labels(self, risultato):
+        """Aggiorna percentuali e stato mostrati nel pannello dei risultati."""
+        self.dark_area_var.set(f"Area scura: {risultato.dark_percent:.2f}%")
+        self.bright_area_var.set(f"Area chiara: {risultato.bright_percent:.2f}%")
+        self.total_area_var.set(f"Area difettata totale: {risultato.total_percent:.2f}%")
+        self.status_var.set(f"Stato: {risultato.status_text}")
+        
+        # Imposta lo stato con colore
+        self.status_label.config(foreground="red" if risultato.is_defective else "green")
+    
+    def update_defect_labels(self, risultato):
+        """Mostra numero e dimensione massima dei singoli difetti."""
+        difetti = risultato.difetti
+        largest = int(difetti["area"].max()) if difetti.size else 0
+        self.defects_var.set(f"Difetti: {difetti.size} (massimo {largest} px)")
+    
+    def open_stations(self):
+        """Avvia l'ispezione di più stazioni in una finestra con la griglia delle anteprime."""
+        if self.stations_window is not None:
+            self.stations_window.finestra.lift()
+            return
+        
+        text = simpledialog.askstring(
+            "Stazioni multiple",
+            "Sorgenti delle stazioni separate da virgole, con un profilo facoltativo\n"
+            "(es. 0, 1, corsia3.mp4=noce):",
+            parent=self.root)
+        if not text:
+            return
+        
+        # Import locale: le stazioni servono solo se richieste
+        from finestra_stazioni import FinestraStazioni
+        from stazioni import crea_stazioni
+        try:
+            stations = crea_stazioni([t for t in text.split(",") if t.strip()], self.profili,
+                                     tempo_reale=self.real_time_var.get())
+        except (ValueError, KeyError) as e:
+            messagebox.showerror("Errore", e.args[0])
+            return
+        
+        self.stations_window = FinestraStazioni(
+            self.root, stations, num_worker=NUM_WORKER_ANALISI,
+            al_risultato=lambda station, result: self.root.after(0, self.on_station_result, station, result),
+            log=self.log, al_chiusura=self.on_stations_closed)
+        self.log(f"Ispezione avviata su {len(stations)} stazioni.")
+    
+    def on_station_result(self, station, pipeline_result):
+        """Registra (e archivia se difettato) il risultato di una stazione, nel thread dell'interfaccia."""
+        risultato = pipeline_result.risultato
+        if risultato.is_defective and self.archive_var.get():
+            self.archivio.archivia(pipeline_result.frame, risultato, pipeline_result.timestamp,
+                                   sorgente=station.nome)
+        if self.registro is not None:
+            self.registro.registra(risultato.come_dizionario(), timestamp=pipeline_result.timestamp,
+                                   sorgente=station.nome, tempi=risultato.tempi)
+    
+    def on_stations_closed(self):
+        self.stations_window = None
+        self.log("Ispezione delle stazioni fermata.")
+    
+    def on_pipeline_result(self, pipeline_result):
+        """Riceve un risultato dalla pipeline di analisi e lo passa al thread dell'interfaccia."""
+        self.root.after(0, self.show_analysis, pipeline_result.risultato, pipeline_result.timestamp)
+    
     def detect_dark_regions(self, gray_image, threshold=50):
         """Rileva le regioni scure e calcola la percentuale."""
-        # Applica soglia per individuare le aree scure
-        _, threshold_image = cv2.threshold(gray_image, threshold, 255, cv2.THRESH_BINARY_INV)
-        
-        # Operazioni morfologiche per migliorare il rilevamento
-        kernel = np.ones((5, 5), np.uint8)
-        processed_mask = cv2.morphologyEx(threshold_image, cv2.MORPH_OPEN, kernel)
-        
-        # Calcola la percentuale di area scura
-        total_pixels = processed_mask.shape[0] * processed_mask.shape[1]
-        dark_pixels = cv2.countNonZero(processed_mask)
-        dark_percent = (dark_pixels / total_pixels) * 100
-        
-        # Crea un'immagine a colori per evidenziare le aree scure
-        contours, _ = cv2.findContours(processed_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        result_image = cv2.cvtColor(gray_image, cv2.COLOR_GRAY2BGR)
-        cv2.drawContours(result_image, contours, -1, (0, 0, 255), 2)  # Contorni rossi per zone scure
-        
-        # Aggiungi testo con la percentuale e parametri
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        cv2.putText(result_image, f"Area scura: {dark_percent:.2f}%", (10, 30), 
-                   font, 0.7, (0, 0, 255), 2)
-        cv2.putText(result_image, f"Soglia scuro: {threshold}", (10, 60), 
-                   font, 0.7, (255, 255, 0), 2)
-        
+        processed_mask = maschera_zone_scure(gray_image, threshold, self.analizzatore.kernel)
+        dark_percent = percentuale_area(processed_mask)
+        result_image = disegna_zone_scure(gray_image, processed_mask, dark_percent, threshold)
         return result_image, processed_mask, dark_percent
     
     def detect_bright_regions(self, gray_image, threshold=200):
         """Rileva le regioni chiare e calcola la percentuale."""
-        # Applica soglia per individuare le aree chiare
-        _, threshold_image = cv2.threshold(gray_image, threshold, 255, cv2.THRESH_BINARY)
-        
-        # Operazioni morfologiche per migliorare il rilevamento
-        kernel = np.ones((5, 5), np.uint8)
-        processed_mask = cv2.morphologyEx(threshold_image, cv2.MORPH_OPEN, kernel)
-        
-        # Calcola la percentuale di area chiara
-        total_pixels = processed_mask.shape[0] * processed_mask.shape[1]
-        bright_pixels = cv2.countNonZero(processed_mask)
-        bright_percent = (bright_pixels / total_pixels) * 100
-        
-        # Crea un'immagine a colori per evidenziare le aree chiare
-        contours, _ = cv2.findContours(processed_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        result_image = cv2.cvtColor(gray_image, cv2.COLOR_GRAY2BGR)
-        cv2.drawContours(result_image, contours, -1, (0, 255, 0), 2)  # Contorni verdi per zone chiare
-        
-        # Aggiungi testo con la percentuale e parametri
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        cv2.putText(result_image, f"Area chiara: {bright_percent:.2f}%", (10, 30), 
-                   font, 0.7, (0, 255, 0), 2)
-        cv2.putText(result_image, f"Soglia chiaro: {threshold}", (10, 60), 
-                   font, 0.7, (255, 255, 0), 2)
-        
+        processed_mask = maschera_zone_chiare(gray_image, threshold, self.analizzatore.kernel)
+        bright_percent = percentuale_area(processed_mask)
+        result_image = disegna_zone_chiare(gray_image, processed_mask, bright_percent, threshold)
         return result_image, processed_mask, bright_percent
     
     def combine_defects(self, gray_image, dark_mask, bright_mask, dark_percent, bright_percent):
@@ -540,44 +1025,79 @@ class RiconoscitoreDifetti:
         combined_mask = cv2.bitwise_or(dark_mask, bright_mask)
         
         # Ricalcola la percentuale totale (poiché potrebbero esserci sovrapposizioni)
-        total_pixels = combined_mask.shape[0] * combined_mask.shape[1]
-        defect_pixels = cv2.countNonZero(combined_mask)
-        total_percent = (defect_pixels / total_pixels) * 100
-        
-        # Crea un'immagine a colori per evidenziare tutte le aree difettate
-        result_image = cv2.cvtColor(gray_image, cv2.COLOR_GRAY2BGR)
-        
-        # Disegna contorni per zone scure (rosso)
-        contours_dark, _ = cv2.findContours(dark_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        cv2.drawContours(result_image, contours_dark, -1, (0, 0, 255), 2)
-        
-        # Disegna contorni per zone chiare (verde)
-        contours_bright, _ = cv2.findContours(bright_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        cv2.drawContours(result_image, contours_bright, -1, (0, 255, 0), 2)
-        
-        # Crea un overlay colorato per visualizzare meglio le aree difettate
-        overlay = result_image.copy()
-        # Colora aree scure in blu semi-trasparente
-        overlay[dark_mask > 0] = [255, 0, 0]  # BGR: blu
-        # Colora aree chiare in verde semi-trasparente
-        overlay[bright_mask > 0] = [0, 255, 0]  # BGR: verde
-        
-        # Combina con l'immagine originale
-        alpha = 0.3  # Trasparenza dell'overlay
-        cv2.addWeighted(overlay, alpha, result_image, 1 - alpha, 0, result_image)
-        
-        # Aggiungi testo con percentuali e parametri
-        font = cv2.FONT_HERSHEY_SIMPLEX
-        cv2.putText(result_image, f"Area scura: {dark_percent:.2f}%", (10, 30), 
-                   font, 0.7, (0, 0, 255), 2)
-        cv2.putText(result_image, f"Area chiara: {bright_percent:.2f}%", (10, 60), 
-                   font, 0.7, (0, 255, 0), 2)
-        cv2.putText(result_image, f"Area totale difettata: {total_percent:.2f}%", (10, 90), 
-                   font, 0.7, (255, 255, 255), 2)
-        
-        status_text = "DIFETTATO" if total_percent > self.soglia_difetti else "OK"
-        status_color = (0, 0, 255) if total_percent > self.soglia_difetti else (0, 255, 0)
-        cv2.putText(result_image, f"Stato: {status_text}", (10, 120), 
-                   font, 0.7, status_color, 2)
-        
-        return result_image, combined_mask, total_percent
\ No newline at end of file
+        total_percent = percentuale_area(combined_mask)
+        
+        result_image = disegna_difetti_combinati(
+            gray_image, dark_mask, bright_mask, dark_percent, bright_percent,
+            total_percent, total_percent > self.soglia_difetti)
+        
+        return result_image, combined_mask, total_percent
+    
+    def log(self, message):
+        """Aggiunge un messaggio al log delle operazioni (thread-safe)."""
+        if threading.current_thread() is not threading.main_thread():
+            self.root.after(0, self.log, message)
+            return
+        
+        timestamp = time.strftime("%H:%M:%S")
+        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
+        self.log_text.see(tk.END)
+    
+    def display_image(self, image):
+        """Visualizza un'immagine elaborata nel canvas."""
+        # Il ridimensionamento e la conversione sono gli stessi del feed webcam
+        self.display_webcam_frame(image)
+    
+    def change_view(self, event=None):
+        """Mostra la visualizzazione selezionata nel combobox (generandola se necessario)."""
+        view = self.view_var.get()
+        self.current_view = view
+        if view in self.processed_images:
+            self.display_image(self.processed_images[view])
+    
+    def save_current_image(self):
+        """Salva su file la visualizzazione corrente."""
+        image = self.processed_images.get(self.current_view)
+        if image is None:
+            image = self.original_image
+        if image is None:
+            messagebox.showwarning("Attenzione", "Nessuna immagine da salvare.")
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".png",
+            filetypes=[("PNG", "*.png"), ("JPEG", "*.jpg"), ("Tutti i file", "*.*")])
+        if not file_path:
+            return
+        
+        if cv2.imwrite(file_path, image):
+            self.log(f"Immagine salvata in {file_path}")
+        else:
+            messagebox.showerror("Errore", f"Impossibile salvare l'immagine in {file_path}")
+    
+    def on_close(self):
+        """Ferma la webcam e chiude l'applicazione."""
+        if self.is_capturing:
+            self.stop_webcam()
+        if self.stations_window is not None:
+            self.stations_window.chiudi()
+        if self.registro is not None:
+            self.registro.chiudi()
+        self.archivio.ferma()
+        self.root.destroy()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        sys.exit(main_batch(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "calibra":
+        sys.exit(main_calibra(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "registro":
+        sys.exit(main_registro(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "servizio":
+        sys.exit(main_servizio(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "riproduci":
+        sys.exit(main_riproduci(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "stazioni":
+        sys.exit(main_stazioni(sys.argv[2:]))
+    main()
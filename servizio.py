@@ -0,0 +1,407 @@
+"""Servizio HTTP/JSON di ispezione, senza GUI, per PLC e MES.
+
+Usa lo stesso motore di analisi della GUI. Le richieste vengono eseguite
+da un pool fisso di worker; oltre il numero massimo di richieste in corso
+il servizio risponde subito 503 invece di accumulare ritardo.
+
+    python riconoscitore.py servizio --porta 8080 --camera 0
+
+Endpoint:
+    POST /analizza   corpo: immagine (JPEG, PNG, ...) -> percentuali e verdetto
+    POST /scatta     acquisisce un frame dalla telecamera e lo analizza
+    POST /profilo    ?nome=... applica un profilo del file dei profili
+    GET  /salute     stato del servizio
+    GET  /metriche   contatori e tempi per stadio
+
+Le soglie si possono indicare nella query string, ad esempio
+POST /analizza?soglia_scuro=60&difetti=1 (difetti=1 aggiunge la tabella
+dei singoli difetti alla risposta).
+"""
+import argparse
+import concurrent.futures
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+from analizzatore import (AnalizzatoreDifetti, SOGLIA_DIFETTI_DEFAULT, SOGLIA_SCURO_DEFAULT,
+                          SOGLIA_CHIARO_DEFAULT)
+from componenti import NOMI_TIPI
+from memoria import BUFFER
+from profili import PERCORSO_PROFILI_DEFAULT, FileProfili
+from strumentazione import PROFILATORE
+
+# Dimensione massima accettata per un'immagine inviata
+DIMENSIONE_MASSIMA_IMMAGINE = 50 * 1024 * 1024
+
+# Attesa massima del risultato di un'analisi
+TIMEOUT_ANALISI = 30.0
+
+# Secondi suggeriti ai client nel 503 (intestazione Retry-After)
+RIPROVA_DOPO = 1
+
+# Parametri della query string: tipo e intervallo ammesso
+PARAMETRI_SOGLIE = {
+    "soglia_difetti": (float, 0, 100),
+    "soglia_scuro": (int, 0, 255),
+    "soglia_chiaro": (int, 0, 255),
+}
+
+
+class RichiestaNonValida(ValueError):
+    """Richiesta con parametri o immagine non validi (risposta 400)."""
+
+
+class ServizioOccupato(RuntimeError):
+    """Troppe richieste in corso (risposta 503)."""
+
+
+def difetti_in_json(difetti):
+    """Converte la tabella dei difetti in una lista di dizionari serializzabili."""
+    righe = []
+    for riga in difetti:
+        righe.append({
+            "x": int(riga["x"]), "y": int(riga["y"]), "w": int(riga["w"]), "h": int(riga["h"]),
+            "area": int(riga["area"]),
+            "cx": round(float(riga["cx"]), 2), "cy": round(float(riga["cy"]), 2),
+            "intensita": round(float(riga["intensita"]), 2),
+            "tipo": NOMI_TIPI[int(riga["tipo"])],
+        })
+    return righe
+
+
+class ServizioIspezione:
+    """Esegue le analisi richieste via HTTP su un pool limitato di worker."""
+
+    def __init__(self, analizzatore=None, num_worker=2, max_in_attesa=8,
+                 acquisitore=None, registro=None, profili=None):
+        self.analizzatore = analizzatore if analizzatore is not None else AnalizzatoreDifetti()
+        self.profili = profili
+        self.profilo_attivo = None
+        self.acquisitore = acquisitore
+        self.registro = registro
+        self.num_worker = num_worker
+        self._pool = concurrent.futures.ThreadPoolExecutor(num_worker, thread_name_prefix="servizio")
+
+        # Richieste ammesse contemporaneamente: in esecuzione + in attesa di un worker
+        self._posti = threading.BoundedSemaphore(num_worker + max_in_attesa)
+        self._lock = threading.Lock()
+        self.contatori = {"richieste": 0, "completate": 0, "rifiutate": 0, "errori": 0, "difettate": 0}
+        self.avvio = time.time()
+
+    def _conta(self, nome):
+        with self._lock:
+            self.contatori[nome] += 1
+
+    def analizzatore_per(self, parametri):
+        """Analizzatore con le soglie della richiesta (quello del servizio se non ne indica)."""
+        if not parametri:
+            return self.analizzatore
+        valori = {}
+        for nome, valore in parametri.items():
+            if nome not in PARAMETRI_SOGLIE:
+                continue
+            tipo, minimo, massimo = PARAMETRI_SOGLIE[nome]
+            try:
+                valori[nome] = tipo(valore)
+            except ValueError:
+                raise RichiestaNonValida(f"valore non valido per {nome}: {valore}")
+            # Fuori intervallo il verdetto sarebbe sempre 0% o 100%
+            if not minimo <= valori[nome] <= massimo:
+                raise RichiestaNonValida(f"{nome} deve essere tra {minimo} e {massimo}: {valore}")
+        # Un analizzatore attivo non viene mai modificato (attiva_profilo lo sostituisce),
+        # quindi basta leggerlo una volta per avere un profilo coerente
+        base = self.analizzatore
+        if not valori:
+            return base
+        return AnalizzatoreDifetti(
+            valori.get("soglia_difetti", base.soglia_difetti),
+            valori.get("soglia_scuro", base.soglia_colore_scuro),
+            valori.get("soglia_chiaro", base.soglia_colore_chiaro),
+            roi=base.roi, scala_analisi=base.scala_analisi,
+            regola=base.regola, dimensione_kernel=base.kernel.shape[0],
+            thread_tasselli=base.thread_tasselli)
+
+    def ammetti(self):
+        """Riserva un posto per una richiesta; ServizioOccupato se il pool è saturo."""
+        self._conta("richieste")
+        if not self._posti.acquire(blocking=False):
+            self._conta("rifiutate")
+            PROFILATORE.evento("richieste_rifiutate")
+            raise ServizioOccupato("troppe richieste in corso")
+
+    def rilascia(self):
+        """Restituisce un posto ottenuto con ammetti senza eseguire la richiesta."""
+        self._posti.release()
+
+    def esegui(self, funzione, *argomenti):
+        """Esegue funzione nel pool su un posto già ammesso e ne attende il risultato."""
+        try:
+            futuro = self._pool.submit(funzione, *argomenti)
+        except BaseException:
+            self._posti.release()
+            raise
+        # Il posto si libera quando l'analisi termina davvero, anche dopo un timeout
+        futuro.add_done_callback(lambda _: self._posti.release())
+        return futuro.result(TIMEOUT_ANALISI)
+
+    def analizza_immagine(self, dati_immagine, parametri, con_difetti=False):
+        """Decodifica e analizza un'immagine inviata; restituisce il dizionario di risposta."""
+        frame = cv2.imdecode(np.frombuffer(dati_immagine, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise RichiestaNonValida("impossibile decodificare l'immagine")
+        return self._analizza(frame, self.analizzatore_per(parametri), "http", con_difetti)
+
+    def analizza_scatto(self, parametri, con_difetti=False):
+        """Analizza l'ultimo frame della telecamera; restituisce il dizionario di risposta."""
+        if self.acquisitore is None:
+            raise RichiestaNonValida("nessuna telecamera configurata (opzione --camera)")
+        acquisito = self.acquisitore.ultimo()
+        if acquisito is None:
+            raise RichiestaNonValida("nessun frame disponibile dalla telecamera")
+        return self._analizza(acquisito.frame, self.analizzatore_per(parametri), "camera",
+                              con_difetti, acquisito.timestamp)
+
+    def _analizza(self, frame, analizzatore, sorgente, con_difetti, timestamp=None):
+        inizio = time.perf_counter()
+        with PROFILATORE.stadio("analisi"):
+            risultato = analizzatore.analizza(frame)
+        risposta = risultato.come_dizionario()
+        if con_difetti:
+            risposta["difetti"] = difetti_in_json(risultato.difetti)
+        risposta["tempi"] = {nome: round(ms, 2) for nome, ms in risultato.tempi.items()}
+        risposta["tempo_ms"] = round((time.perf_counter() - inizio) * 1000, 2)
+        risposta["risoluzione"] = [frame.shape[1], frame.shape[0]]
+
+        if self.registro is not None:
+            self.registro.registra(risposta, timestamp=timestamp, sorgente=sorgente,
+                                   tempi=risultato.tempi)
+        self._conta("completate")
+        if risultato.is_defective:
+            self._conta("difettate")
+        PROFILATORE.evento("analisi_completate")
+        return risposta
+
+    def attiva_profilo(self, nome):
+        """Applica un profilo (rileggendo il file se è cambiato) alle analisi successive."""
+        if self.profili is None:
+            raise RichiestaNonValida("nessun file dei profili configurato")
+        with self._lock:
+            try:
+                self.profili.ricarica_se_modificato()
+                profilo = self.profili.profilo(nome)
+            except (ValueError, KeyError) as e:
+                raise RichiestaNonValida(e.args[0])
+            # Nuovo analizzatore sostituito con un solo assegnamento: le analisi in corso
+            # finiscono con il profilo precedente, senza mescolarne i campi con il nuovo
+            analizzatore = AnalizzatoreDifetti(thread_tasselli=self.analizzatore.thread_tasselli)
+            profilo.applica(analizzatore)
+            self.analizzatore = analizzatore
+            self.profilo_attivo = profilo.nome
+        return {"profilo": profilo.nome, "parametri": profilo.come_dizionario()}
+
+    def salute(self):
+        """Stato sintetico del servizio."""
+        return {
+            "stato": "ok",
+            "camera": self.acquisitore is not None and self.acquisitore.attivo,
+            "worker": self.num_worker,
+            "profilo": self.profilo_attivo,
+            "attivo_da_s": round(time.time() - self.avvio, 1),
+        }
+
+    def metriche(self):
+        """Contatori delle richieste, frequenza delle analisi, tempi per stadio e memoria."""
+        with self._lock:
+            contatori = dict(self.contatori)
+        return {
+            "contatori": contatori,
+            "analisi_al_secondo": PROFILATORE.frequenza("analisi_completate"),
+            "stadi": PROFILATORE.riepilogo(),
+            "memoria": BUFFER.statistiche(),
+        }
+
+    def chiudi(self):
+        """Attende le analisi in corso e ferma il pool."""
+        self._pool.shutdown(wait=True)
+
+
+class GestoreRichieste(BaseHTTPRequestHandler):
+    """Traduce le richieste HTTP in chiamate a ServizioIspezione (server.servizio)."""
+
+    server_version = "RiconoscitoreDifetti/1.0"
+
+    def log_message(self, format, *args):
+        # Il log di ogni richiesta su stderr rallenterebbe il servizio sotto carico
+        pass
+
+    def _rispondi(self, codice, dati, intestazioni=None):
+        corpo = json.dumps(dati).encode("utf-8")
+        self.send_response(codice)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        for nome, valore in (intestazioni or {}).items():
+            self.send_header(nome, valore)
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _ammetti(self):
+        """Riserva un posto nel servizio; se è saturo risponde 503 e restituisce False."""
+        try:
+            self.server.servizio.ammetti()
+        except ServizioOccupato as e:
+            self._rispondi(503, {"errore": str(e)}, {"Retry-After": str(RIPROVA_DOPO)})
+            return False
+        return True
+
+    def _gestisci(self, funzione, *argomenti):
+        # Il posto deve essere già stato riservato con _ammetti
+        servizio = self.server.servizio
+        try:
+            self._rispondi(200, servizio.esegui(funzione, *argomenti))
+        except RichiestaNonValida as e:
+            self._rispondi(400, {"errore": str(e)})
+        except concurrent.futures.TimeoutError:
+            servizio._conta("errori")
+            self._rispondi(504, {"errore": "analisi non completata in tempo"})
+        except Exception as e:
+            servizio._conta("errori")
+            self._rispondi(500, {"errore": str(e)})
+
+    def do_GET(self):
+        servizio = self.server.servizio
+        percorso = urlparse(self.path).path
+        if percorso == "/salute":
+            self._rispondi(200, servizio.salute())
+        elif percorso == "/metriche":
+            self._rispondi(200, servizio.metriche())
+        else:
+            self._rispondi(404, {"errore": f"percorso sconosciuto: {percorso}"})
+
+    def do_POST(self):
+        servizio = self.server.servizio
+        url = urlparse(self.path)
+        query = {nome: valori[-1] for nome, valori in parse_qs(url.query).items()}
+        con_difetti = query.pop("difetti", "0") not in ("0", "", "false")
+
+        if url.path == "/analizza":
+            try:
+                lunghezza = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                self._rispondi(400, {"errore": "intestazione Content-Length non valida"})
+                return
+            if lunghezza <= 0:
+                self._rispondi(400, {"errore": "corpo della richiesta vuoto"})
+                return
+            if lunghezza > DIMENSIONE_MASSIMA_IMMAGINE:
+                self._rispondi(413, {"errore": "immagine troppo grande"})
+                return
+            # Il corpo si legge solo dopo aver ottenuto un posto: un servizio saturo
+            # non accumula in memoria immagini che rifiuterebbe comunque
+            if not self._ammetti():
+                return
+            try:
+                dati_immagine = self.rfile.read(lunghezza)
+            except BaseException:
+                servizio.rilascia()
+                raise
+            if len(dati_immagine) < lunghezza:
+                servizio.rilascia()
+                self._rispondi(400, {"errore": "corpo della richiesta incompleto"})
+                return
+            self._gestisci(servizio.analizza_immagine, dati_immagine, query, con_difetti)
+        elif url.path == "/scatta":
+            if self._ammetti():
+                self._gestisci(servizio.analizza_scatto, query, con_difetti)
+        elif url.path == "/profilo":
+            try:
+                self._rispondi(200, servizio.attiva_profilo(query.get("nome")))
+            except RichiestaNonValida as e:
+                self._rispondi(400, {"errore": str(e)})
+        else:
+            self._rispondi(404, {"errore": f"percorso sconosciuto: {url.path}"})
+
+
+def crea_server(servizio, host="127.0.0.1", porta=8080):
+    """Crea il server HTTP (una thread per connessione) collegato al servizio."""
+    server = ThreadingHTTPServer((host, porta), GestoreRichieste)
+    server.daemon_threads = True
+    server.servizio = servizio
+    return server
+
+
+def main(argv=None):
+    """Punto di ingresso a riga di comando del servizio di ispezione."""
+    parser = argparse.ArgumentParser(
+        prog="riconoscitore.py servizio",
+        description="Servizio HTTP/JSON di ispezione dei vassoi (senza GUI).")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="indirizzo di ascolto (default: solo connessioni locali)")
+    parser.add_argument("--porta", type=int, default=8080)
+    parser.add_argument("--worker", type=int, default=2, help="analisi eseguite in parallelo")
+    parser.add_argument("--thread-tasselli", type=int, default=1,
+                        help="thread per l'analisi a tasselli delle immagini grandi (default: 1, disattivata)")
+    parser.add_argument("--max-in-attesa", type=int, default=8,
+                        help="richieste in attesa di un worker prima di rispondere 503")
+    parser.add_argument("--camera", type=int, default=None,
+                        help="indice della telecamera per POST /scatta")
+    parser.add_argument("--registro", help="file SQLite in cui registrare le analisi")
+    parser.add_argument("--profilo", help="profilo da applicare all'avvio (sostituisce le soglie)")
+    parser.add_argument("--file-profili", default=PERCORSO_PROFILI_DEFAULT,
+                        help="file JSON dei profili")
+    parser.add_argument("--soglia-difetti", type=float, default=SOGLIA_DIFETTI_DEFAULT)
+    parser.add_argument("--soglia-scuro", type=int, default=SOGLIA_SCURO_DEFAULT)
+    parser.add_argument("--soglia-chiaro", type=int, default=SOGLIA_CHIARO_DEFAULT)
+    args = parser.parse_args(argv)
+
+    # Le metriche espongono i tempi per stadio
+    PROFILATORE.abilitato = True
+
+    capture = acquisitore = registro = None
+    if args.camera is not None:
+        from acquisizione import AcquisitoreFrame
+        capture = cv2.VideoCapture(args.camera)
+        if not capture.isOpened():
+            print(f"Impossibile aprire la telecamera {args.camera}", file=sys.stderr)
+            return 1
+        acquisitore = AcquisitoreFrame(capture, specchia=False)
+        acquisitore.avvia()
+    if args.registro:
+        from registro import RegistroRisultati
+        registro = RegistroRisultati(args.registro)
+
+    servizio = ServizioIspezione(
+        AnalizzatoreDifetti(args.soglia_difetti, args.soglia_scuro, args.soglia_chiaro,
+                            thread_tasselli=args.thread_tasselli),
+        num_worker=args.worker, max_in_attesa=args.max_in_attesa,
+        acquisitore=acquisitore, registro=registro, profili=FileProfili(args.file_profili))
+    if args.profilo:
+        try:
+            servizio.attiva_profilo(args.profilo)
+        except RichiestaNonValida as e:
+            print(str(e), file=sys.stderr)
+            return 1
+    server = crea_server(servizio, args.host, args.porta)
+    print(f"Servizio di ispezione in ascolto su http://{args.host}:{args.porta}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        servizio.chiudi()
+        if acquisitore is not None:
+            acquisitore.ferma()
+            capture.release()
+        if registro is not None:
+            registro.chiudi()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,375 @@
+"""Sorgenti di frame intercambiabili: telecamera, file video, cartella di immagini e frame sintetici.
+
+Tutte espongono la stessa interfaccia di cv2.VideoCapture usata da
+AcquisitoreFrame (read([image]), isOpened(), release()); image è un
+buffer in cui scrivere il frame, se la sorgente può riutilizzarlo. Le sorgenti registrate
+possono essere riprodotte alla velocità reale (cadenza del video o fps
+indicati) oppure il più velocemente possibile, per misurare il massimo
+numero di analisi al secondo sostenibile senza telecamera:
+    python riconoscitore.py riproduci registrazione.mp4 --massima-velocita
+    python riconoscitore.py riproduci images/ --fps 5 --ripeti --durata 30
+    python riconoscitore.py riproduci sintetico:1920x1080 --durata 10
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from caricamento import IMMAGINI, decodifica
+
+# Prefisso della descrizione di una sorgente sintetica ("sintetico" o "sintetico:LxA")
+PREFISSO_SINTETICO = "sintetico"
+
+FPS_DEFAULT = 25.0
+
+# Analisi dopo le quali la memoria del processo si considera a regime
+ANALISI_RISCALDAMENTO = 20
+
+# Secondi tra due campioni della memoria del processo durante la riproduzione
+INTERVALLO_CAMPIONI_MEMORIA = 0.5
+
+
+def frame_sintetico(larghezza, altezza, seme=0):
+    """Crea un frame BGR simile a un vassoio: fondo chiaro con venature scure e macchie chiare."""
+    rng = np.random.default_rng(seme)
+    frame = np.full((altezza, larghezza, 3), (90, 140, 190), np.uint8)
+    rumore = rng.integers(-20, 20, frame.shape, dtype=np.int16)
+    frame = np.clip(frame.astype(np.int16) + rumore, 0, 255).astype(np.uint8)
+    for _ in range(8):
+        centro = (int(rng.integers(0, larghezza)), int(rng.integers(0, altezza)))
+        assi = (int(rng.integers(5, larghezza // 15)), int(rng.integers(5, altezza // 8)))
+        colore = (20, 20, 30) if rng.random() < 0.5 else (230, 240, 250)
+        cv2.ellipse(frame, centro, assi, float(rng.integers(0, 180)), 0, 360, colore, -1)
+    return frame
+
+
+class Cadenza:
+    """Scandisce la lettura dei frame a fps costanti (o nessuna attesa se tempo_reale è False).
+
+    Se la lettura è in ritardo non recupera accumulando frame: riparte dal momento attuale.
+    """
+
+    def __init__(self, fps, tempo_reale=True):
+        self.intervallo = 1.0 / fps if fps and fps > 0 else 0.0
+        self.tempo_reale = tempo_reale
+        self._prossimo = None
+
+    def attendi(self):
+        if not self.tempo_reale or self.intervallo == 0.0:
+            return
+        adesso = time.perf_counter()
+        if self._prossimo is None or adesso - self._prossimo > self.intervallo:
+            self._prossimo = adesso
+        elif self._prossimo > adesso:
+            time.sleep(self._prossimo - adesso)
+        self._prossimo += self.intervallo
+
+
+class SorgenteCamera:
+    """Telecamera collegata (indice di cv2.VideoCapture)."""
+
+    # Le immagini della webcam vengono specchiate per l'operatore
+    specchia = True
+
+    def __init__(self, indice=0):
+        self.descrizione = f"camera {indice}"
+        self.capture = cv2.VideoCapture(indice)
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self, image=None):
+        return self.capture.read(image)
+
+    def release(self):
+        self.capture.release()
+
+
+class SorgenteVideo:
+    """File video (o stream registrato) riprodotto alla sua cadenza oppure alla massima velocità."""
+
+    specchia = False
+
+    def __init__(self, percorso, tempo_reale=True, ripeti=False):
+        self.descrizione = percorso
+        self.capture = cv2.VideoCapture(percorso)
+        self.ripeti = ripeti
+        fps = self.capture.get(cv2.CAP_PROP_FPS) if self.capture.isOpened() else 0
+        self.cadenza = Cadenza(fps if fps and fps > 0 else FPS_DEFAULT, tempo_reale)
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def read(self, image=None):
+        self.cadenza.attendi()
+        ret, frame = self.capture.read(image)
+        if not ret and self.ripeti:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.capture.read(image)
+        return ret, frame
+
+    def release(self):
+        self.capture.release()
+
+
+class SorgenteCartella:
+    """Immagini di una cartella (o di un glob) in ordine alfabetico, come se fossero frame.
+
+    Le immagini passano dalla cache caricamento.IMMAGINI: ripetendo la
+    cartella non vengono decodificate di nuovo (i frame sono in sola lettura).
+    Se un giro della cartella non entra nella cache la sorgente smette di
+    usarla: percorrendo la cartella in ciclo una cache LRU troppo piccola
+    scarterebbe ogni immagine prima di rileggerla.
+    """
+
+    specchia = False
+
+    def __init__(self, percorso, fps=FPS_DEFAULT, tempo_reale=True, ripeti=False):
+        # Import locale: ispezione_batch importa il motore di analisi
+        from ispezione_batch import trova_immagini
+        self.descrizione = percorso
+        self.percorsi = trova_immagini(percorso)
+        self.ripeti = ripeti
+        self.cadenza = Cadenza(fps, tempo_reale)
+        self._indice = 0
+        self._usa_cache = True
+        # Byte decodificati nel primo giro della cartella (None dopo il primo giro)
+        self._byte_giro = 0
+
+    def isOpened(self):
+        return bool(self.percorsi)
+
+    def _carica(self, percorso):
+        # A colori: la vista "Originale" mostra il frame
+        if not self._usa_cache:
+            frame = decodifica(percorso, grigio=False)
+            if frame is not None:
+                frame.flags.writeable = False
+            return frame
+        frame = IMMAGINI.carica(percorso, grigio=False)
+        if frame is not None and self._byte_giro is not None:
+            self._byte_giro += frame.nbytes
+            if self._byte_giro > IMMAGINI.capacita:
+                self._usa_cache = False
+        return frame
+
+    def read(self, image=None):
+        # Le immagini vengono dalla cache: image viene ignorato
+        self.cadenza.attendi()
+        # Salta le immagini non decodificabili, al massimo un giro completo
+        for _ in range(len(self.percorsi)):
+            if self._indice >= len(self.percorsi):
+                if not self.ripeti:
+                    break
+                self._indice = 0
+                # La cartella è entrata tutta nella cache
+                self._byte_giro = None
+            percorso = self.percorsi[self._indice]
+            self._indice += 1
+            frame = self._carica(percorso)
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def release(self):
+        self.percorsi = []
+
+
+class SorgenteSintetica:
+    """Frame sintetici generati in memoria (per prove senza telecamera né file).
+
+    Alterna numero_varianti frame diversi; numero_frame=None genera all'infinito.
+    """
+
+    specchia = False
+
+    def __init__(self, larghezza=1280, altezza=720, fps=FPS_DEFAULT, tempo_reale=True,
+                 numero_frame=None, numero_varianti=4):
+        self.descrizione = f"{PREFISSO_SINTETICO}:{larghezza}x{altezza}"
+        # I frame vengono generati una volta sola: generarli a ogni lettura costerebbe più dell'analisi
+        self.varianti = [frame_sintetico(larghezza, altezza, seme) for seme in range(numero_varianti)]
+        self.numero_frame = numero_frame
+        self.cadenza = Cadenza(fps, tempo_reale)
+        self._letti = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self, image=None):
+        if self.numero_frame is not None and self._letti >= self.numero_frame:
+            return False, None
+        self.cadenza.attendi()
+        variante = self.varianti[self._letti % len(self.varianti)]
+        if image is not None and image.shape == variante.shape:
+            np.copyto(image, variante)
+            frame = image
+        else:
+            frame = variante.copy()
+        self._letti += 1
+        return True, frame
+
+    def release(self):
+        self.varianti = []
+
+
+def crea_sorgente(descrizione, tempo_reale=True, fps=FPS_DEFAULT, ripeti=False):
+    """Crea la sorgente indicata da un testo.
+
+    Un numero è l'indice di una telecamera, "sintetico[:LxA]" genera frame
+    sintetici, una cartella o un glob di immagini diventa una SorgenteCartella
+    e qualunque altro percorso viene aperto come video.
+    """
+    descrizione = str(descrizione).strip()
+    if descrizione.isdigit():
+        return SorgenteCamera(int(descrizione))
+    if descrizione.startswith(PREFISSO_SINTETICO):
+        larghezza, altezza = 1280, 720
+        if ":" in descrizione:
+            larghezza, altezza = (int(v) for v in descrizione.split(":", 1)[1].lower().split("x"))
+        return SorgenteSintetica(larghezza, altezza, fps, tempo_reale)
+    if os.path.isdir(descrizione) or any(c in descrizione for c in "*?["):
+        return SorgenteCartella(descrizione, fps, tempo_reale, ripeti)
+    return SorgenteVideo(descrizione, tempo_reale, ripeti)
+
+
+def esegui_riproduzione(sorgente, analizzatore, num_worker=2, capacita=2, durata=None, processi=False):
+    """Fa passare la sorgente per acquisizione e pipeline di analisi, come nella GUI.
+
+    Restituisce frame letti, analisi completate, frame scartati, frequenze,
+    latenze (dalla lettura del frame al risultato) e memoria occupata fino
+    alla fine della sorgente o allo scadere della durata in secondi. La
+    crescita della memoria è misurata durante la riproduzione, prima di
+    fermare acquisizione e pipeline. Con processi l'analisi gira in
+    processi worker (vedi processi.py).
+    """
+    # Import locali: questi moduli servono solo per la riproduzione
+    from acquisizione import AcquisitoreFrame
+    from memoria import BUFFER, memoria_processo_mb
+    from pipeline import PipelineAnalisi
+
+    latenze = []
+    terminata = threading.Event()
+    if processi:
+        from processi import PipelineProcessi
+        pipeline = PipelineProcessi(analizzatore, lambda r: latenze.append(r.latenza),
+                                    num_worker=num_worker, capacita=capacita)
+        # I frame vengono letti direttamente nella memoria condivisa con i worker
+        buffer = pipeline.anello
+    else:
+        pipeline = PipelineAnalisi(analizzatore.analizza, lambda r: latenze.append(r.latenza),
+                                   num_worker=num_worker, capacita=capacita)
+        buffer = BUFFER
+    acquisitore = AcquisitoreFrame(sorgente, specchia=False, al_termine=terminata.set, buffer=buffer)
+
+    inizio = time.perf_counter()
+    pipeline.avvia()
+    acquisitore.avvia()
+    ultima_sequenza = 0
+    # Memoria misurata dopo le prime analisi, quando i buffer sono già stati allocati,
+    # e poi campionata a intervalli finché la riproduzione è in corso
+    memoria_a_regime = None
+    campioni_memoria = []
+    prossimo_campione = 0.0
+    try:
+        while not terminata.is_set():
+            ora = time.perf_counter()
+            if memoria_a_regime is None:
+                if pipeline.completati >= ANALISI_RISCALDAMENTO:
+                    memoria_a_regime = memoria_processo_mb()
+                    prossimo_campione = ora + INTERVALLO_CAMPIONI_MEMORIA
+            elif ora >= prossimo_campione:
+                campioni_memoria.append(memoria_processo_mb())
+                prossimo_campione = ora + INTERVALLO_CAMPIONI_MEMORIA
+            if durata is not None and time.perf_counter() - inizio >= durata:
+                break
+            acquisito = acquisitore.attendi_nuovo(ultima_sequenza, timeout=0.5)
+            if acquisito is None:
+                continue
+            # Se l'analisi è più lenta, l'acquisizione salta frame: contano come non analizzati
+            ultima_sequenza = acquisito.sequenza
+            pipeline.invia(acquisito.frame, acquisito.timestamp)
+        # Ultimo campione prima dello smontaggio, che libera buffer e memoria condivisa
+        if memoria_a_regime is not None:
+            campioni_memoria.append(memoria_processo_mb())
+    finally:
+        acquisitore.ferma()
+        # Lascia terminare le analisi già in coda prima di misurare
+        while len(pipeline.coda):
+            time.sleep(0.01)
+        condivisa = pipeline.anello.statistiche() if processi else None
+        pipeline.ferma(timeout=5.0)
+        sorgente.release()
+
+    durata_effettiva = time.perf_counter() - inizio
+    letti = ultima_sequenza
+    completate = pipeline.completati
+    statistiche = {
+        "sorgente": getattr(sorgente, "descrizione", str(sorgente)),
+        "durata_s": durata_effettiva,
+        "frame_letti": letti,
+        "analisi_completate": completate,
+        "frame_non_analizzati": letti - completate,
+        "frame_letti_al_secondo": letti / durata_effettiva if durata_effettiva > 0 else 0.0,
+        "analisi_al_secondo": completate / durata_effettiva if durata_effettiva > 0 else 0.0,
+    }
+    statistiche["buffer_mb"] = BUFFER.byte_totali / (1024 * 1024)
+    statistiche["allocazioni_buffer"] = BUFFER.allocazioni
+    if condivisa is not None:
+        statistiche["memoria_condivisa_mb"] = condivisa["memoria_condivisa_mb"]
+    campioni_memoria = [m for m in campioni_memoria if m is not None]
+    if memoria_a_regime is not None and campioni_memoria:
+        statistiche["memoria_a_regime_mb"] = memoria_a_regime
+        statistiche["memoria_processo_mb"] = campioni_memoria[-1]
+        statistiche["crescita_memoria_mb"] = campioni_memoria[-1] - memoria_a_regime
+        statistiche["crescita_memoria_max_mb"] = max(campioni_memoria) - memoria_a_regime
+    if latenze:
+        latenze_ms = np.array(latenze) * 1000
+        statistiche["latenza_p50_ms"] = float(np.percentile(latenze_ms, 50))
+        statistiche["latenza_p95_ms"] = float(np.percentile(latenze_ms, 95))
+    return statistiche
+
+
+def main(argv=None):
+    """Riproduce una sorgente attraverso la pipeline e riporta la capacità di analisi."""
+    from analizzatore import AnalizzatoreDifetti
+
+    parser = argparse.ArgumentParser(
+        prog="riconoscitore.py riproduci",
+        description="Riproduce video, cartelle di immagini o frame sintetici attraverso la pipeline.")
+    parser.add_argument("sorgente",
+                        help="indice della telecamera, file video, cartella/glob di immagini "
+                             "oppure 'sintetico[:LxA]'")
+    parser.add_argument("--massima-velocita", action="store_true",
+                        help="legge i frame il più velocemente possibile invece che in tempo reale")
+    parser.add_argument("--fps", type=float, default=FPS_DEFAULT,
+                        help="cadenza in tempo reale di cartelle e frame sintetici")
+    parser.add_argument("--ripeti", action="store_true", help="ricomincia alla fine di video e cartelle")
+    parser.add_argument("--durata", type=float, default=None, help="secondi di riproduzione")
+    parser.add_argument("--worker", type=int, default=2)
+    parser.add_argument("--processi", action="store_true",
+                        help="analizza in processi worker separati, con i frame in memoria condivisa")
+    parser.add_argument("--thread-tasselli", type=int, default=1,
+                        help="thread per l'analisi a tasselli delle immagini grandi (default: 1, disattivata)")
+    args = parser.parse_args(argv)
+
+    sorgente = crea_sorgente(args.sorgente, not args.massima_velocita, args.fps, args.ripeti)
+    if not sorgente.isOpened():
+        print(f"Impossibile aprire la sorgente {args.sorgente}", file=sys.stderr)
+        return 1
+    if args.durata is None and isinstance(sorgente, (SorgenteCamera, SorgenteSintetica)):
+        args.durata = 10.0  # Sorgenti senza fine
+
+    analizzatore = AnalizzatoreDifetti(thread_tasselli=args.thread_tasselli)
+    statistiche = esegui_riproduzione(sorgente, analizzatore, args.worker, durata=args.durata,
+                                      processi=args.processi)
+    for chiave, valore in statistiche.items():
+        print(f"{chiave:<24}{valore:.2f}" if isinstance(valore, float) else f"{chiave:<24}{valore}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
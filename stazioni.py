@@ -0,0 +1,324 @@
+"""Ispezione di più stazioni (corsie con la propria telecamera) da un solo PC.
+
+Ogni stazione ha la sua sorgente, il suo thread di acquisizione e il suo
+analizzatore (soglie e profilo propri); tutte condividono un pool fisso di
+worker. I worker servono le stazioni a turno (round robin) e analizzano
+sempre l'ultimo frame di ciascuna, con al massimo un'analisi in corso per
+stazione: una telecamera veloce non può affamare le altre e la latenza di
+ogni stazione resta limitata a circa un giro del turno. Esempio:
+    python riconoscitore.py stazioni 0 1 corsia3.mp4=noce --worker 2 --durata 60
+"""
+import argparse
+import collections
+import sys
+import threading
+import time
+
+import numpy as np
+
+from acquisizione import AcquisitoreFrame
+from analizzatore import AnalizzatoreDifetti
+from memoria import PoolBuffer
+from pipeline import RisultatoPipeline
+from strumentazione import PROFILATORE
+
+# Latenze conservate per stazione (finestra mobile)
+FINESTRA_LATENZE = 500
+
+# Attesa massima dei worker prima di ricontrollare gli intervalli delle stazioni
+ATTESA_MASSIMA_WORKER = 0.05
+
+
+def interpreta_stazione(testo):
+    """Separa "sorgente=profilo" in (sorgente, profilo); il profilo è facoltativo."""
+    sorgente, _, profilo = testo.partition("=")
+    return sorgente.strip(), profilo.strip() or None
+
+
+class Stazione:
+    """Una corsia: sorgente, acquisizione, analizzatore e statistiche proprie.
+
+    intervallo è l'attesa minima in secondi tra due analisi della stazione
+    (0: appena un worker è libero). Ogni stazione ha il suo pool di buffer:
+    con un pool condiviso stazioni di risoluzioni diverse si scarterebbero
+    a vicenda i buffer degli stessi posti.
+    """
+
+    def __init__(self, nome, sorgente, analizzatore=None, intervallo=0.0):
+        self.nome = nome
+        self.sorgente = sorgente
+        self.analizzatore = analizzatore if analizzatore is not None else AnalizzatoreDifetti()
+        self.intervallo = intervallo
+        self.buffer = PoolBuffer()
+        self.analizzatore.buffer = self.buffer
+        self.acquisitore = None
+        self.terminata = False
+
+        # Ultimo risultato consegnato (RisultatoPipeline), letto dall'anteprima
+        self.ultimo_risultato = None
+        self.completate = 0
+        self.saltati = 0
+        self.difettati = 0
+        self.latenze = collections.deque(maxlen=FINESTRA_LATENZE)
+
+        # Stato del turno, protetto dal lock dello schedulatore
+        self._in_analisi = False
+        self._ultima_sequenza = 0
+        self._ultimo_avvio = 0.0
+
+    def statistiche(self, durata=None):
+        """Contatori e latenze (p50/p95 in ms) della stazione."""
+        latenze = np.array(self.latenze) * 1000
+        ultimo = self.acquisitore.ultimo() if self.acquisitore is not None else None
+        statistiche = {
+            "stazione": self.nome,
+            "frame_letti": ultimo.sequenza if ultimo is not None else 0,
+            "analisi_completate": self.completate,
+            "frame_saltati": self.saltati,
+            "difettati": self.difettati,
+            "allocazioni_buffer": self.buffer.allocazioni,
+            "riusi_buffer": self.buffer.riusi,
+        }
+        if durata:
+            statistiche["analisi_al_secondo"] = self.completate / durata
+        if latenze.size:
+            statistiche["latenza_p50_ms"] = float(np.percentile(latenze, 50))
+            statistiche["latenza_p95_ms"] = float(np.percentile(latenze, 95))
+        return statistiche
+
+
+class SchedulatoreStazioni:
+    """Pool fisso di worker condiviso dalle stazioni, con turni equi tra le stazioni.
+
+    al_risultato(stazione, RisultatoPipeline) viene chiamata dal worker che
+    ha terminato, fuori dai lock; i risultati di una stessa stazione arrivano
+    in ordine perché ogni stazione ha al massimo un'analisi in corso.
+    """
+
+    def __init__(self, num_worker=2, al_risultato=None, al_errore=None):
+        self.num_worker = num_worker
+        self.al_risultato = al_risultato
+        self.al_errore = al_errore
+        self.stazioni = []
+
+        self._condizione = threading.Condition()
+        self._prossima = 0
+        self._attivo = False
+        self._workers = []
+
+    def aggiungi(self, stazione):
+        """Aggiunge una stazione (prima di avvia())."""
+        stazione.acquisitore = AcquisitoreFrame(
+            stazione.sorgente, specchia=getattr(stazione.sorgente, "specchia", False),
+            al_termine=lambda: self._al_termine(stazione), al_frame=self._sveglia,
+            buffer=stazione.buffer)
+        self.stazioni.append(stazione)
+
+    def avvia(self):
+        """Avvia i worker e l'acquisizione di tutte le stazioni."""
+        self._attivo = True
+        for i in range(self.num_worker):
+            worker = threading.Thread(target=self._ciclo_worker, name=f"stazioni-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        for stazione in self.stazioni:
+            stazione.acquisitore.avvia()
+
+    def ferma(self, timeout=1.0):
+        """Ferma acquisizione e worker e rilascia le sorgenti."""
+        with self._condizione:
+            self._attivo = False
+            self._condizione.notify_all()
+        for stazione in self.stazioni:
+            stazione.acquisitore.ferma()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+        for stazione in self.stazioni:
+            stazione.sorgente.release()
+
+    @property
+    def tutte_terminate(self):
+        return all(stazione.terminata for stazione in self.stazioni)
+
+    def _sveglia(self):
+        with self._condizione:
+            self._condizione.notify()
+
+    def _al_termine(self, stazione):
+        stazione.terminata = True
+        self._sveglia()
+
+    def _scegli(self):
+        """Prossima stazione (in ordine di turno) con un frame nuovo e nessuna analisi in corso."""
+        adesso = time.monotonic()
+        numero = len(self.stazioni)
+        for passo in range(numero):
+            indice = (self._prossima + passo) % numero
+            stazione = self.stazioni[indice]
+            if stazione._in_analisi or adesso - stazione._ultimo_avvio < stazione.intervallo:
+                continue
+            acquisito = stazione.acquisitore.ultimo()
+            if acquisito is None or acquisito.sequenza <= stazione._ultima_sequenza:
+                continue
+            self._prossima = indice + 1
+            return stazione, acquisito
+        return None
+
+    def _ciclo_worker(self):
+        while True:
+            with self._condizione:
+                scelta = None
+                while self._attivo and scelta is None:
+                    scelta = self._scegli()
+                    if scelta is None:
+                        # Il timeout serve alle stazioni che attendono il loro intervallo
+                        self._condizione.wait(ATTESA_MASSIMA_WORKER)
+                if not self._attivo:
+                    return
+                stazione, acquisito = scelta
+                # I frame arrivati mentre la stazione aspettava il turno non vengono analizzati
+                stazione.saltati += acquisito.sequenza - stazione._ultima_sequenza - 1
+                stazione._ultima_sequenza = acquisito.sequenza
+                stazione._ultimo_avvio = time.monotonic()
+                stazione._in_analisi = True
+
+            try:
+                with PROFILATORE.stadio("analisi"):
+                    risultato = stazione.analizzatore.analizza(acquisito.frame)
+            except Exception as e:
+                risultato = None
+                if self.al_errore is not None:
+                    self.al_errore(stazione, e)
+
+            consegna = None
+            with self._condizione:
+                stazione._in_analisi = False
+                if risultato is not None:
+                    consegna = RisultatoPipeline(
+                        sequenza=acquisito.sequenza,
+                        timestamp=acquisito.timestamp,
+                        latenza=time.time() - acquisito.timestamp,
+                        frame=acquisito.frame,
+                        risultato=risultato,
+                    )
+                    stazione.ultimo_risultato = consegna
+                    stazione.completate += 1
+                    stazione.difettati += int(risultato.is_defective)
+                    stazione.latenze.append(consegna.latenza)
+                # La stazione può avere già un frame nuovo in attesa
+                self._condizione.notify()
+            if consegna is not None:
+                PROFILATORE.evento("analisi_completate")
+                if self.al_risultato is not None:
+                    self.al_risultato(stazione, consegna)
+
+
+def crea_stazioni(descrizioni, file_profili=None, tempo_reale=True, ripeti=False):
+    """Crea le stazioni da testi "sorgente[=profilo]" (vedi sorgenti.crea_sorgente).
+
+    Se una stazione non si può creare (sorgente non apribile, profilo
+    mancante o sconosciuto) le sorgenti già aperte vengono rilasciate.
+    """
+    from sorgenti import crea_sorgente
+
+    stazioni = []
+    sorgente = None
+    try:
+        for numero, descrizione in enumerate(descrizioni, start=1):
+            testo_sorgente, nome_profilo = interpreta_stazione(descrizione)
+            sorgente = crea_sorgente(testo_sorgente, tempo_reale=tempo_reale, ripeti=ripeti)
+            if not sorgente.isOpened():
+                raise ValueError(f"Impossibile aprire la sorgente {testo_sorgente}")
+
+            analizzatore = AnalizzatoreDifetti()
+            intervallo = 0.0
+            if nome_profilo is not None:
+                if file_profili is None:
+                    raise ValueError(f"Profilo {nome_profilo} indicato senza file dei profili")
+                profilo = file_profili.profilo(nome_profilo)
+                profilo.applica(analizzatore)
+                intervallo = profilo.intervallo_analisi
+            nome = f"{numero}: {sorgente.descrizione}" + (f" ({nome_profilo})" if nome_profilo else "")
+            stazioni.append(Stazione(nome, sorgente, analizzatore, intervallo))
+            sorgente = None
+    except Exception:
+        # Nessuna telecamera deve restare aperta per una configurazione non valida
+        if sorgente is not None:
+            sorgente.release()
+        for stazione in stazioni:
+            stazione.sorgente.release()
+        raise
+    return stazioni
+
+
+def main(argv=None):
+    """Esegue più stazioni senza GUI e riporta le statistiche di ciascuna."""
+    from profili import PERCORSO_PROFILI_DEFAULT, FileProfili
+
+    parser = argparse.ArgumentParser(
+        prog="riconoscitore.py stazioni",
+        description="Ispeziona più sorgenti in parallelo con un pool di worker condiviso.")
+    parser.add_argument("stazioni", nargs="+",
+                        help="una sorgente per stazione (come in 'riproduci'), "
+                             "con un profilo facoltativo: sorgente=profilo")
+    parser.add_argument("--worker", type=int, default=2, help="analisi eseguite in parallelo")
+    parser.add_argument("--durata", type=float, default=10.0, help="secondi di ispezione")
+    parser.add_argument("--massima-velocita", action="store_true",
+                        help="legge video e cartelle il più velocemente possibile")
+    parser.add_argument("--ripeti", action="store_true", help="ricomincia alla fine di video e cartelle")
+    parser.add_argument("--file-profili", default=PERCORSO_PROFILI_DEFAULT)
+    parser.add_argument("--registro", help="file SQLite in cui registrare le analisi")
+    args = parser.parse_args(argv)
+
+    try:
+        file_profili = FileProfili(args.file_profili)
+        file_profili.ricarica_se_modificato()
+        stazioni = crea_stazioni(args.stazioni, file_profili, not args.massima_velocita, args.ripeti)
+    except (ValueError, KeyError, OSError) as e:
+        print(e.args[0] if e.args else e, file=sys.stderr)
+        return 1
+
+    registro = None
+    if args.registro:
+        from registro import RegistroRisultati
+        registro = RegistroRisultati(args.registro)
+
+    def al_risultato(stazione, consegna):
+        if registro is not None:
+            registro.registra(consegna.risultato.come_dizionario(), consegna.timestamp,
+                              sorgente=stazione.nome, tempi=consegna.risultato.tempi)
+
+    def al_errore(stazione, errore):
+        print(f"Errore nella stazione {stazione.nome}: {errore}", file=sys.stderr)
+
+    schedulatore = SchedulatoreStazioni(args.worker, al_risultato, al_errore)
+    for stazione in stazioni:
+        schedulatore.aggiungi(stazione)
+
+    inizio = time.perf_counter()
+    schedulatore.avvia()
+    try:
+        while time.perf_counter() - inizio < args.durata and not schedulatore.tutte_terminate:
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        schedulatore.ferma()
+        if registro is not None:
+            registro.chiudi()
+    durata = time.perf_counter() - inizio
+
+    print(f"{'stazione':<40}{'letti':>8}{'analisi':>9}{'saltati':>9}{'analisi/s':>11}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'difettati':>11}")
+    for stazione in stazioni:
+        s = stazione.statistiche(durata)
+        print(f"{s['stazione']:<40}{s['frame_letti']:>8}{s['analisi_completate']:>9}"
+              f"{s['frame_saltati']:>9}{s['analisi_al_secondo']:>11.2f}"
+              f"{s.get('latenza_p50_ms', 0.0):>9.1f}{s.get('latenza_p95_ms', 0.0):>9.1f}"
+              f"{s['difettati']:>11}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""Misura leggera dei tempi per stadio della pipeline.
+
+Il profilatore globale PROFILATORE è disabilitato per default: in quel caso
+stadio() restituisce sempre lo stesso contesto vuoto e il costo è di una
+chiamata di funzione.
+
+    with PROFILATORE.stadio("soglia"):
+        ...
+"""
+import collections
+import contextlib
+import json
+import threading
+import time
+
+import numpy as np
+
+# Numero di campioni conservati per ogni stadio (finestra mobile)
+FINESTRA_DEFAULT = 500
+
+# Limiti (in ms) dei bucket dell'istogramma esportato
+BUCKET_ISTOGRAMMA_MS = [0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+_CONTESTO_NULLO = contextlib.nullcontext()
+
+
+class _Misura:
+    """Contesto che registra la durata del blocco nel profilatore."""
+
+    __slots__ = ("profilatore", "nome", "inizio")
+
+    def __init__(self, profilatore, nome):
+        self.profilatore = profilatore
+        self.nome = nome
+
+    def __enter__(self):
+        self.inizio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profilatore.registra(self.nome, time.perf_counter() - self.inizio)
+        return False
+
+
+class Profilatore:
+    """Raccoglie durate per stadio ed eventi (per calcolare le frequenze) su finestre mobili."""
+
+    def __init__(self, abilitato=False, finestra=FINESTRA_DEFAULT):
+        self.abilitato = abilitato
+        self.finestra = finestra
+        self._durate = {}
+        self._eventi = {}
+        self._lock = threading.Lock()
+
+    def stadio(self, nome):
+        """Contesto che misura il blocco come stadio "nome" (nullo se disabilitato)."""
+        if not self.abilitato:
+            return _CONTESTO_NULLO
+        return _Misura(self, nome)
+
+    def registra(self, nome, durata):
+        """Registra una durata in secondi per lo stadio indicato."""
+        if not self.abilitato:
+            return
+        campioni = self._durate.get(nome)
+        if campioni is None:
+            with self._lock:
+                campioni = self._durate.setdefault(nome, collections.deque(maxlen=self.finestra))
+        campioni.append(durata)
+
+    def evento(self, nome):
+        """Registra un evento (frame acquisito, analisi completata, frame scartato...)."""
+        if not self.abilitato:
+            return
+        istanti = self._eventi.get(nome)
+        if istanti is None:
+            with self._lock:
+                istanti = self._eventi.setdefault(nome, collections.deque(maxlen=self.finestra))
+        istanti.append(time.perf_counter())
+
+    def azzera(self):
+        """Cancella tutti i campioni raccolti."""
+        with self._lock:
+            self._durate = {}
+            self._eventi = {}
+
+    def frequenza(self, nome, intervallo=5.0):
+        """Eventi al secondo negli ultimi "intervallo" secondi."""
+        istanti = list(self._eventi.get(nome, ()))
+        if not istanti:
+            return 0.0
+        limite = time.perf_counter() - intervallo
+        recenti = [t for t in istanti if t >= limite]
+        return len(recenti) / intervallo
+
+    def riepilogo(self):
+        """Statistiche per stadio: numero di campioni, p50, p95 e massimo in ms."""
+        with self._lock:
+            stadi = list(self._durate.items())
+        riepilogo = {}
+        for nome, campioni in stadi:
+            valori = np.array(list(campioni)) * 1000
+            if valori.size == 0:
+                continue
+            riepilogo[nome] = {
+                "campioni": int(valori.size),
+                "p50_ms": float(np.percentile(valori, 50)),
+                "p95_ms": float(np.percentile(valori, 95)),
+                "max_ms": float(valori.max()),
+                "istogramma": self._istogramma(valori),
+            }
+        return riepilogo
+
+    @staticmethod
+    def _istogramma(valori_ms):
+        limiti = BUCKET_ISTOGRAMMA_MS + [float("inf")]
+        conteggi, _ = np.histogram(valori_ms, bins=[0] + limiti)
+        return {f"<={limite:g}ms" if limite != float("inf") else "oltre": int(n)
+                for limite, n in zip(limiti, conteggi)}
+
+    def scrivi_su_file(self, percorso, extra=None):
+        """Salva riepilogo, frequenze degli eventi ed eventuali dati extra in JSON."""
+        with self._lock:
+            nomi_eventi = list(self._eventi)
+        dati = {
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "stadi": self.riepilogo(),
+            "frequenze": {nome: self.frequenza(nome) for nome in nomi_eventi},
+        }
+        if extra:
+            dati.update(extra)
+        with open(percorso, "w", encoding="utf-8") as f:
+            json.dump(dati, f, indent=2)
+
+
+# Profilatore condiviso da acquisizione, analisi, visualizzazioni e GUI
+PROFILATORE = Profilatore()
@@ -0,0 +1,114 @@
+"""Rilevamento economico delle variazioni della scena davanti alla telecamera.
+
+Confronta miniature in scala di grigi dei frame: serve a non rianalizzare
+una scena invariata e a riconoscere l'arrivo di un nuovo vassoio (movimento
+seguito da alcuni frame fermi), così da emettere un solo verdetto per vassoio.
+"""
+import cv2
+
+from strumentazione import PROFILATORE
+
+# Larghezza delle miniature confrontate (l'altezza segue le proporzioni del frame)
+LARGHEZZA_MINIATURA = 64
+
+# Differenza minima di grigio perché un pixel della miniatura sia considerato cambiato
+SOGLIA_PIXEL_DEFAULT = 12
+
+# Frazione di pixel cambiati oltre la quale la scena è considerata diversa
+FRAZIONE_VARIAZIONE_DEFAULT = 0.02
+
+# Frame consecutivi fermi dopo un movimento per considerare il vassoio posato
+FRAME_STABILI_DEFAULT = 5
+
+# Eventi restituiti da RilevatoreVariazioni.aggiorna
+EVENTO_MOVIMENTO = "movimento"
+EVENTO_ASSESTAMENTO = "assestamento"
+EVENTO_NUOVO_VASSOIO = "nuovo_vassoio"
+EVENTO_INVARIATO = "invariato"
+
+
+def miniatura(frame, larghezza=LARGHEZZA_MINIATURA):
+    """Riduce il frame a una piccola immagine in grigio (la media per blocchi attenua il rumore)."""
+    height, width = frame.shape[:2]
+    altezza = max(1, round(height * larghezza / width))
+    small = cv2.resize(frame, (larghezza, altezza), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return small
+
+
+def frazione_cambiata(miniatura_a, miniatura_b, soglia_pixel=SOGLIA_PIXEL_DEFAULT):
+    """Frazione dei pixel che differiscono di più di soglia_pixel tra due miniature."""
+    diff = cv2.absdiff(miniatura_a, miniatura_b)
+    _, cambiati = cv2.threshold(diff, soglia_pixel, 255, cv2.THRESH_BINARY)
+    return cv2.countNonZero(cambiati) / cambiati.size
+
+
+class RilevatoreVariazioni:
+    """Tiene traccia della scena per evitare analisi ripetute dello stesso vassoio.
+
+    aggiorna(frame) va chiamata per ogni frame nuovo e segnala l'arrivo di un
+    vassoio; da_analizzare(frame) serve invece all'analisi periodica per
+    saltare i frame uguali all'ultimo analizzato. Non è thread-safe: va usato
+    da un solo thread (nella GUI, quello di Tk).
+    """
+
+    def __init__(self, soglia_pixel=SOGLIA_PIXEL_DEFAULT,
+                 frazione_variazione=FRAZIONE_VARIAZIONE_DEFAULT,
+                 frame_stabili=FRAME_STABILI_DEFAULT, larghezza=LARGHEZZA_MINIATURA):
+        self.soglia_pixel = soglia_pixel
+        self.frazione_variazione = frazione_variazione
+        self.frame_stabili = frame_stabili
+        self.larghezza = larghezza
+        self.azzera()
+
+    def azzera(self):
+        """Dimentica la scena: il prossimo frame fermo verrà analizzato di nuovo."""
+        self._precedente = None   # Miniatura del frame precedente
+        self._riferimento = None  # Miniatura dell'ultimo frame analizzato
+        self._stabili = 0
+        self._in_attesa = True    # Dopo un movimento si attende che la scena si fermi
+
+    def _diversa(self, miniatura_a, miniatura_b):
+        if miniatura_a.shape != miniatura_b.shape:
+            return True
+        return frazione_cambiata(miniatura_a, miniatura_b, self.soglia_pixel) > self.frazione_variazione
+
+    def aggiorna(self, frame):
+        """Aggiorna lo stato con un nuovo frame e restituisce l'evento corrispondente.
+
+        EVENTO_NUOVO_VASSOIO viene restituito una sola volta, quando dopo un
+        movimento la scena resta ferma per frame_stabili frame ed è diversa
+        da quella analizzata l'ultima volta.
+        """
+        with PROFILATORE.stadio("variazioni"):
+            corrente = miniatura(frame, self.larghezza)
+            precedente, self._precedente = self._precedente, corrente
+
+            if precedente is None or self._diversa(corrente, precedente):
+                self._stabili = 0
+                self._in_attesa = True
+                return EVENTO_MOVIMENTO
+
+            self._stabili += 1
+            if not self._in_attesa:
+                return EVENTO_INVARIATO
+            if self._stabili < self.frame_stabili:
+                return EVENTO_ASSESTAMENTO
+
+            # La scena si è fermata: è un nuovo vassoio solo se è cambiata
+            # rispetto all'ultima analisi (non, ad esempio, una mano di passaggio)
+            self._in_attesa = False
+            if self._riferimento is not None and not self._diversa(corrente, self._riferimento):
+                return EVENTO_INVARIATO
+            self._riferimento = corrente
+            return EVENTO_NUOVO_VASSOIO
+
+    def da_analizzare(self, frame):
+        """Indica se il frame è diverso dall'ultimo analizzato; in tal caso lo registra come tale."""
+        with PROFILATORE.stadio("variazioni"):
+            corrente = miniatura(frame, self.larghezza)
+            if self._riferimento is not None and not self._diversa(corrente, self._riferimento):
+                return False
+            self._riferimento = corrente
+            return True
@@ -0,0 +1,203 @@
+"""Visualizzazioni dei risultati dell'analisi (solo OpenCV, senza GUI)."""
+import threading
+from collections.abc import Mapping
+
+import cv2
+
+from analizzatore import STATO_DIFETTATO, STATO_OK
+from componenti import estrai_contorni
+from memoria import BUFFER
+from strumentazione import PROFILATORE
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+
+# Nomi delle visualizzazioni, nell'ordine in cui compaiono nel combobox
+VISTA_ORIGINALE = "Originale"
+VISTA_COLORMAP = "Colormap JET"
+VISTA_ZONE_SCURE = "Zone Scure"
+VISTA_ZONE_CHIARE = "Zone Chiare"
+VISTA_DIFETTI_COMBINATI = "Difetti Combinati"
+VISTA_MASCHERA_SCURE = "Maschera Zone Scure"
+VISTA_MASCHERA_CHIARE = "Maschera Zone Chiare"
+VISTA_MASCHERA_COMBINATA = "Maschera Combinata"
+
+NOMI_VISTE = [
+    VISTA_ORIGINALE,
+    VISTA_COLORMAP,
+    VISTA_ZONE_SCURE,
+    VISTA_ZONE_CHIARE,
+    VISTA_DIFETTI_COMBINATI,
+    VISTA_MASCHERA_SCURE,
+    VISTA_MASCHERA_CHIARE,
+    VISTA_MASCHERA_COMBINATA,
+]
+
+VISTA_PREDEFINITA = VISTA_DIFETTI_COMBINATI
+
+
+def disegna_zone_scure(gray_image, dark_mask, dark_percent, threshold, contours=None, dst=None):
+    """Crea un'immagine a colori che evidenzia le aree scure (in dst, se indicato)."""
+    if contours is None:
+        contours = estrai_contorni(dark_mask)
+    result_image = cv2.cvtColor(gray_image, cv2.COLOR_GRAY2BGR, dst=dst)
+    cv2.drawContours(result_image, contours, -1, (0, 0, 255), 2)  # Contorni rossi per zone scure
+
+    # Aggiungi testo con la percentuale e parametri
+    cv2.putText(result_image, f"Area scura: {dark_percent:.2f}%", (10, 30),
+                FONT, 0.7, (0, 0, 255), 2)
+    cv2.putText(result_image, f"Soglia scuro: {threshold}", (10, 60),
+                FONT, 0.7, (255, 255, 0), 2)
+    return result_image
+
+
+def disegna_zone_chiare(gray_image, bright_mask, bright_percent, threshold, contours=None, dst=None):
+    """Crea un'immagine a colori che evidenzia le aree chiare (in dst, se indicato)."""
+    if contours is None:
+        contours = estrai_contorni(bright_mask)
+    result_image = cv2.cvtColor(gray_image, cv2.COLOR_GRAY2BGR, dst=dst)
+    cv2.drawContours(result_image, contours, -1, (0, 255, 0), 2)  # Contorni verdi per zone chiare
+
+    # Aggiungi testo con la percentuale e parametri
+    cv2.putText(result_image, f"Area chiara: {bright_percent:.2f}%", (10, 30),
+                FONT, 0.7, (0, 255, 0), 2)
+    cv2.putText(result_image, f"Soglia chiaro: {threshold}", (10, 60),
+                FONT, 0.7, (255, 255, 0), 2)
+    return result_image
+
+
+def disegna_difetti_combinati(gray_image, dark_mask, bright_mask,
+                              dark_percent, bright_percent, total_percent, is_defective,
+                              contours_dark=None, contours_bright=None, dst=None, overlay=None):
+    """Crea un'immagine a colori che evidenzia tutte le aree difettate.
+
+    I contorni già estratti (ad esempio quelli del RisultatoAnalisi) vengono
+    riusati; altrimenti sono calcolati dalle maschere. dst e overlay sono
+    eventuali buffer BGR preallocati per l'immagine e per l'overlay.
+    """
+    result_image = cv2.cvtColor(gray_image, cv2.COLOR_GRAY2BGR, dst=dst)
+
+    if contours_dark is None:
+        contours_dark = estrai_contorni(dark_mask)
+    if contours_bright is None:
+        contours_bright = estrai_contorni(bright_mask)
+
+    # Disegna contorni per zone scure (rosso) e per zone chiare (verde)
+    cv2.drawContours(result_image, contours_dark, -1, (0, 0, 255), 2)
+    cv2.drawContours(result_image, contours_bright, -1, (0, 255, 0), 2)
+
+    with PROFILATORE.stadio("overlay"):
+        # Crea un overlay colorato per visualizzare meglio le aree difettate
+        if overlay is None:
+            overlay = result_image.copy()
+        else:
+            overlay[...] = result_image
+        # Colora aree scure in blu semi-trasparente
+        overlay[dark_mask > 0] = [255, 0, 0]  # BGR: blu
+        # Colora aree chiare in verde semi-trasparente
+        overlay[bright_mask > 0] = [0, 255, 0]  # BGR: verde
+
+        # Combina con l'immagine originale
+        alpha = 0.3  # Trasparenza dell'overlay
+        cv2.addWeighted(overlay, alpha, result_image, 1 - alpha, 0, result_image)
+
+    # Aggiungi testo con percentuali e parametri
+    cv2.putText(result_image, f"Area scura: {dark_percent:.2f}%", (10, 30),
+                FONT, 0.7, (0, 0, 255), 2)
+    cv2.putText(result_image, f"Area chiara: {bright_percent:.2f}%", (10, 60),
+                FONT, 0.7, (0, 255, 0), 2)
+    cv2.putText(result_image, f"Area totale difettata: {total_percent:.2f}%", (10, 90),
+                FONT, 0.7, (255, 255, 255), 2)
+
+    status_text = STATO_DIFETTATO if is_defective else STATO_OK
+    status_color = (0, 0, 255) if is_defective else (0, 255, 0)
+    cv2.putText(result_image, f"Stato: {status_text}", (10, 120),
+                FONT, 0.7, status_color, 2)
+    return result_image
+
+
+class VisteAnalisi(Mapping):
+    """Visualizzazioni di un frame analizzato, generate solo quando richieste.
+
+    Si usa come un dizionario nome -> immagine BGR: ogni vista viene creata
+    alla prima richiesta e conservata fino al frame successivo. buffer è il
+    pool (o un oggetto con lo stesso ottieni()) in cui scrivere le viste;
+    viste_pronte contiene quelle già generate altrove (ad esempio in un
+    processo worker).
+    """
+
+    def __init__(self, frame, risultato, buffer=BUFFER, viste_pronte=None):
+        self.frame = frame
+        self.risultato = risultato
+        self.buffer = buffer
+        self._cache = dict(viste_pronte) if viste_pronte else {}
+        self._lock = threading.Lock()
+
+    # Metodi che generano le viste: nomi e non metodi legati, così l'oggetto non ha
+    # riferimenti circolari e i suoi buffer tornano al pool appena non serve più
+    _GENERATORI = {
+        VISTA_ORIGINALE: "_originale",
+        VISTA_COLORMAP: "_colormap",
+        VISTA_ZONE_SCURE: "_zone_scure",
+        VISTA_ZONE_CHIARE: "_zone_chiare",
+        VISTA_DIFETTI_COMBINATI: "_difetti_combinati",
+        VISTA_MASCHERA_SCURE: "_maschera_scure",
+        VISTA_MASCHERA_CHIARE: "_maschera_chiare",
+        VISTA_MASCHERA_COMBINATA: "_maschera_combinata",
+    }
+
+    def __getitem__(self, nome):
+        generatore = getattr(self, self._GENERATORI[nome])
+        # Il lock evita di generare due volte la stessa vista da thread diversi
+        with self._lock:
+            if nome not in self._cache:
+                self._cache[nome] = generatore()
+            return self._cache[nome]
+
+    def __contains__(self, nome):
+        # Non usa __getitem__ per non generare la vista solo per verificarne l'esistenza
+        return nome in self._GENERATORI
+
+    def __iter__(self):
+        return iter(NOMI_VISTE)
+
+    def __len__(self):
+        return len(NOMI_VISTE)
+
+    def _buffer(self, posto="vista"):
+        # Le viste BGR hanno le dimensioni dell'immagine analizzata
+        return self.buffer.ottieni(posto, self.risultato.gray_image.shape + (3,))
+
+    def _originale(self):
+        return self.frame
+
+    def _colormap(self):
+        return cv2.applyColorMap(self.risultato.gray_image, cv2.COLORMAP_JET, dst=self._buffer())
+
+    def _maschera(self, mask):
+        return cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR, dst=self._buffer())
+
+    def _maschera_scure(self):
+        return self._maschera(self.risultato.dark_mask)
+
+    def _maschera_chiare(self):
+        return self._maschera(self.risultato.bright_mask)
+
+    def _maschera_combinata(self):
+        return self._maschera(self.risultato.combined_mask)
+
+    def _zone_scure(self):
+        r = self.risultato
+        return disegna_zone_scure(r.gray_image, r.dark_mask, r.dark_percent, r.soglia_colore_scuro,
+                                  r.contorni_scure, self._buffer())
+
+    def _zone_chiare(self):
+        r = self.risultato
+        return disegna_zone_chiare(r.gray_image, r.bright_mask, r.bright_percent, r.soglia_colore_chiaro,
+                                   r.contorni_chiare, self._buffer())
+
+    def _difetti_combinati(self):
+        r = self.risultato
+        return disegna_difetti_combinati(
+            r.gray_image, r.dark_mask, r.bright_mask, r.dark_percent, r.bright_percent,
+            r.total_percent, r.is_defective, r.contorni_scure, r.contorni_chiare,
+            self._buffer(), self._buffer("overlay"))